@@ -0,0 +1,417 @@
+"""
+Số liệu đặt bàn theo giờ/ngày, được cộng dồn tăng dần từ Reservations và ReservationHistory.
+
+Mỗi lần refresh_rollups() chỉ đọc các dòng có id lớn hơn watermark đã lưu, cộng vào các
+bảng rollup rồi dời watermark trong cùng giao dịch. Báo cáo cho admin chỉ đọc rollup.
+RollupBookings nhớ ô (ngày, giờ) và các bàn mà mỗi lượt đặt đã được cộng vào, để lượt sửa
+('modified', 'reassigned') chuyển lượt đặt từ ô cũ sang ô mới và lượt hủy/từ chối trừ đúng ô đó.
+Có thể chạy định kỳ (cron) để bắt kịp dữ liệu:
+    python analytics.py --refresh
+"""
+import argparse
+import sqlite3
+import sys
+from collections import defaultdict
+
+# Số dòng nguồn tối đa xử lý trong một giao dịch
+BATCH_SIZE = 5000
+# Mỗi lượt đặt giữ bàn 2 tiếng (giống find_available_table)
+BOOKING_MINUTES = 120
+# Số id tối đa trong một câu IN (...)
+ID_CHUNK_SIZE = 500
+
+ANALYTICS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS Watermarks (
+    name       TEXT PRIMARY KEY,
+    value      INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT (DATETIME('now'))
+);
+
+CREATE TABLE IF NOT EXISTS BookingRollupHourly (
+    restaurant_id INTEGER NOT NULL,
+    bucket_date   DATE NOT NULL,
+    bucket_hour   INTEGER NOT NULL,
+    bookings      INTEGER NOT NULL DEFAULT 0,
+    guests        INTEGER NOT NULL DEFAULT 0,
+    cancellations INTEGER NOT NULL DEFAULT 0,
+    rejections    INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (restaurant_id, bucket_date, bucket_hour)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS BookingRollupDaily (
+    restaurant_id INTEGER NOT NULL,
+    bucket_date   DATE NOT NULL,
+    bookings      INTEGER NOT NULL DEFAULT 0,
+    guests        INTEGER NOT NULL DEFAULT 0,
+    cancellations INTEGER NOT NULL DEFAULT 0,
+    rejections    INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (restaurant_id, bucket_date)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS TableRollupDaily (
+    table_id       INTEGER NOT NULL,
+    bucket_date    DATE NOT NULL,
+    restaurant_id  INTEGER NOT NULL,
+    bookings       INTEGER NOT NULL DEFAULT 0,
+    booked_minutes INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (table_id, bucket_date)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_table_rollup_restaurant_date ON TableRollupDaily (restaurant_id, bucket_date);
+
+-- Ô (ngày, giờ) và các bàn mà mỗi lượt đặt đang được cộng vào; lượt đặt bị sửa sau khi đã được cộng
+-- thì được trừ khỏi đúng ô/bàn cũ. released = 1: số phút của các bàn đã được trả lại (hủy/từ chối).
+CREATE TABLE IF NOT EXISTS RollupBookings (
+    reservation_id INTEGER PRIMARY KEY,
+    restaurant_id  INTEGER NOT NULL,
+    bucket_date    DATE NOT NULL,
+    bucket_hour    INTEGER NOT NULL,
+    guests         INTEGER NOT NULL,
+    table_ids      TEXT NOT NULL DEFAULT '',
+    cancellations  INTEGER NOT NULL DEFAULT 0,
+    rejections     INTEGER NOT NULL DEFAULT 0,
+    released       INTEGER NOT NULL DEFAULT 0
+);
+
+-- CSDL có rollup từ trước khi có RollupBookings: lượt đặt đã được cộng coi như nằm ở ô hiện tại
+INSERT OR IGNORE INTO RollupBookings (reservation_id, restaurant_id, bucket_date, bucket_hour, guests, table_ids,
+                                      released)
+SELECT r.reservation_id, r.restaurant_id, r.reservation_date, CAST(SUBSTR(r.reservation_time, 1, 2) AS INTEGER),
+       r.guests, COALESCE(CAST(r.table_id AS TEXT), ''), r.status IN ('cancelled', 'rejected')
+FROM Reservations r
+WHERE r.reservation_id <= (SELECT value FROM Watermarks WHERE name = 'rollup:reservations');
+"""
+
+# Hành động trong ReservationHistory được tính là hủy / bị từ chối
+CANCEL_ACTIONS = ('cancelled',)
+REJECT_ACTIONS = ('status:rejected',)
+# Hành động đổi ngày/giờ/số khách/bàn của lượt đặt (app.edit_reservation, assignment.reoptimize_day)
+MOVE_ACTIONS = ('modified', 'reassigned')
+
+
+def create_analytics_schema(db):
+    db.executescript(ANALYTICS_SCHEMA)
+
+
+def get_watermark(db, name):
+    row = db.execute("SELECT value FROM Watermarks WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else 0
+
+
+def set_watermark(db, name, value):
+    db.execute("""
+        INSERT INTO Watermarks (name, value, updated_at) VALUES (?, ?, DATETIME('now'))
+        ON CONFLICT(name) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at
+    """, (name, value))
+
+
+# Ô hiện tại của các lượt đặt: ngày, giờ, số khách, trạng thái và mọi bàn (kể cả bàn ghép)
+CURRENT_SLOTS = """
+    SELECT r.reservation_id, r.restaurant_id, CAST(r.reservation_date AS TEXT),
+           CAST(SUBSTR(r.reservation_time, 1, 2) AS INTEGER), r.guests,
+           COALESCE((SELECT GROUP_CONCAT(rt.table_id) FROM ReservationTables rt
+                     WHERE rt.reservation_id = r.reservation_id), CAST(r.table_id AS TEXT), ''),
+           r.status
+    FROM Reservations r
+"""
+
+CREDIT_COLUMNS = ("reservation_id, restaurant_id, bucket_date, bucket_hour, guests, table_ids, "
+                  "cancellations, rejections, released")
+
+
+class _Credit:
+    """Một dòng RollupBookings: phần lượt đặt đang đóng góp vào rollup."""
+
+    __slots__ = ('reservation_id', 'restaurant_id', 'bucket_date', 'bucket_hour', 'guests', 'table_ids',
+                 'cancellations', 'rejections', 'released')
+
+    def __init__(self, reservation_id, restaurant_id, bucket_date, bucket_hour, guests, table_ids,
+                 cancellations=0, rejections=0, released=0):
+        self.reservation_id = reservation_id
+        self.restaurant_id = restaurant_id
+        self.bucket_date = bucket_date
+        self.bucket_hour = bucket_hour
+        self.guests = guests
+        self.table_ids = table_ids
+        self.cancellations = cancellations
+        self.rejections = rejections
+        self.released = released
+
+    @property
+    def tables(self):
+        return [int(t) for t in self.table_ids.split(',') if t]
+
+    def row(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+
+class _Deltas:
+    """Thay đổi của các ô rollup, gom trong bộ nhớ rồi ghi một lần cho cả lô."""
+
+    def __init__(self):
+        # (restaurant_id, date, hour) -> [bookings, guests, cancellations, rejections]
+        self.hourly = defaultdict(lambda: [0, 0, 0, 0])
+        # (table_id, date, restaurant_id) -> [bookings, booked_minutes]
+        self.tables = defaultdict(lambda: [0, 0])
+
+    def booking(self, credit, sign):
+        """Cộng (sign=1) hoặc trừ (sign=-1) toàn bộ đóng góp của credit tại ô của nó."""
+        cell = self.hourly[(credit.restaurant_id, credit.bucket_date, credit.bucket_hour)]
+        cell[0] += sign
+        cell[1] += sign * credit.guests
+        cell[2] += sign * credit.cancellations
+        cell[3] += sign * credit.rejections
+        for table_id in credit.tables:
+            table = self.tables[(table_id, credit.bucket_date, credit.restaurant_id)]
+            table[0] += sign
+            if not credit.released:
+                table[1] += sign * BOOKING_MINUTES
+
+    def release(self, credit, cancelled):
+        """Lượt hủy/từ chối: tính vào ô của credit và trả lại (một lần) số phút của các bàn."""
+        cell = self.hourly[(credit.restaurant_id, credit.bucket_date, credit.bucket_hour)]
+        if cancelled:
+            credit.cancellations += 1
+            cell[2] += 1
+        else:
+            credit.rejections += 1
+            cell[3] += 1
+        if not credit.released:
+            for table_id in credit.tables:
+                self.tables[(table_id, credit.bucket_date, credit.restaurant_id)][1] -= BOOKING_MINUTES
+            credit.released = 1
+
+    def write(self, db):
+        daily = defaultdict(lambda: [0, 0, 0, 0])
+        for (rid, day, _hour), values in self.hourly.items():
+            daily[(rid, day)] = [a + b for a, b in zip(daily[(rid, day)], values)]
+        db.executemany("""
+            INSERT INTO BookingRollupHourly (restaurant_id, bucket_date, bucket_hour, bookings, guests,
+                                             cancellations, rejections)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(restaurant_id, bucket_date, bucket_hour) DO UPDATE SET
+                bookings = bookings + excluded.bookings,
+                guests = guests + excluded.guests,
+                cancellations = cancellations + excluded.cancellations,
+                rejections = rejections + excluded.rejections
+        """, [(*key, *values) for key, values in self.hourly.items() if any(values)])
+        db.executemany("""
+            INSERT INTO BookingRollupDaily (restaurant_id, bucket_date, bookings, guests, cancellations, rejections)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(restaurant_id, bucket_date) DO UPDATE SET
+                bookings = bookings + excluded.bookings,
+                guests = guests + excluded.guests,
+                cancellations = cancellations + excluded.cancellations,
+                rejections = rejections + excluded.rejections
+        """, [(*key, *values) for key, values in daily.items() if any(values)])
+        db.executemany("""
+            INSERT INTO TableRollupDaily (table_id, bucket_date, restaurant_id, bookings, booked_minutes)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(table_id, bucket_date) DO UPDATE SET
+                bookings = bookings + excluded.bookings,
+                booked_minutes = booked_minutes + excluded.booked_minutes
+        """, [(*key, *values) for key, values in self.tables.items() if any(values)])
+
+
+def _save_credits(db, credits):
+    db.executemany(f"INSERT OR REPLACE INTO RollupBookings ({CREDIT_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                   [credit.row() for credit in credits])
+
+
+def _by_ids(db, sql, ids):
+    """Các dòng của sql (kết thúc bằng '... IN') cho các id, chia nhỏ dưới giới hạn biến của SQLite."""
+    ids = sorted(ids)
+    for start in range(0, len(ids), ID_CHUNK_SIZE):
+        chunk = ids[start:start + ID_CHUNK_SIZE]
+        yield from db.execute(f"{sql} ({', '.join('?' * len(chunk))})", chunk)
+
+
+def _rollup_reservations(db, lo, hi):
+    """Cộng các lượt đặt có reservation_id trong (lo, hi] (chưa được cộng) vào ô hiện tại của chúng."""
+    credited = {row[0] for row in db.execute(
+        "SELECT reservation_id FROM RollupBookings WHERE reservation_id > ? AND reservation_id <= ?", (lo, hi))}
+    deltas, credits = _Deltas(), []
+    for rid, restaurant_id, day, hour, guests, tables, _status in db.execute(
+            CURRENT_SLOTS + " WHERE r.reservation_id > ? AND r.reservation_id <= ?", (lo, hi)):
+        if rid not in credited:
+            credit = _Credit(rid, restaurant_id, day, hour, guests, tables)
+            deltas.booking(credit, 1)
+            credits.append(credit)
+    deltas.write(db)
+    _save_credits(db, credits)
+
+
+def _rollup_history(db, lo, hi):
+    """
+    Áp các sự kiện ReservationHistory có history_id trong (lo, hi], theo thứ tự:
+      - sửa/xếp lại bàn: trừ khỏi ô và bàn đã được cộng, cộng vào ô và bàn hiện tại,
+      - hủy/từ chối: tính vào ô đã được cộng và trả lại số phút của các bàn đó.
+    """
+    actions = (*MOVE_ACTIONS, *CANCEL_ACTIONS, *REJECT_ACTIONS)
+    events = db.execute(f"""
+        SELECT reservation_id, action FROM ReservationHistory
+        WHERE history_id > ? AND history_id <= ? AND action IN ({', '.join('?' * len(actions))})
+        ORDER BY history_id
+    """, (lo, hi, *actions)).fetchall()
+    if not events:
+        return
+    ids = {res_id for res_id, _action in events}
+    credits = {row[0]: _Credit(*row) for row in _by_ids(
+        db, f"SELECT {CREDIT_COLUMNS} FROM RollupBookings WHERE reservation_id IN", ids)}
+    current = {row[0]: tuple(row) for row in _by_ids(db, CURRENT_SLOTS + " WHERE r.reservation_id IN", ids)}
+    deltas, changed = _Deltas(), {}
+    for res_id, action in events:
+        credit = credits.get(res_id)
+        now = current.get(res_id)
+        if credit is None:
+            if now is None:
+                continue  # lượt đặt đã bị xóa trước khi được cộng
+            # Sự kiện tới trước lượt đặt (refresh bị giới hạn max_rows): cộng lượt đặt ngay bây giờ
+            credit = credits[res_id] = _Credit(*now[:6])
+            deltas.booking(credit, 1)
+        if action in MOVE_ACTIONS:
+            if now is None:
+                continue  # đã được lưu trữ/xóa: giữ ô đã cộng
+            deltas.booking(credit, -1)
+            released = credit.released if now[6] in ('cancelled', 'rejected') else 0
+            credit = credits[res_id] = _Credit(*now[:6], credit.cancellations, credit.rejections, released)
+            deltas.booking(credit, 1)
+        else:
+            deltas.release(credit, cancelled=action in CANCEL_ACTIONS)
+        changed[res_id] = credit
+    deltas.write(db)
+    _save_credits(db, changed.values())
+
+
+def _refresh_source(db, name, table, id_column, rollup, batch_size, max_rows):
+    done = 0
+    while max_rows is None or done < max_rows:
+        lo = get_watermark(db, name)
+        top = db.execute(f"SELECT MAX({id_column}) FROM {table}").fetchone()[0] or 0
+        if top <= lo:
+            break
+        step = batch_size if max_rows is None else min(batch_size, max_rows - done)
+        hi = min(top, lo + step)
+        with db:
+            rollup(db, lo, hi)
+            set_watermark(db, name, hi)
+        done += hi - lo
+    return done
+
+
+def refresh_rollups(db, batch_size=BATCH_SIZE, max_rows=None):
+    """
+    Đưa rollup bắt kịp dữ liệu mới, mỗi lô là một giao dịch riêng.
+    max_rows giới hạn số id nguồn xử lý cho mỗi bảng (None = tới hết). Trả về số id đã xử lý.
+    """
+    processed = _refresh_source(db, 'rollup:reservations', 'Reservations', 'reservation_id',
+                                _rollup_reservations, batch_size, max_rows)
+    # Lượt đặt trước, lịch sử sau: sự kiện của một lượt đặt thường tìm thấy ô nó đã được cộng vào
+    processed += _refresh_source(db, 'rollup:history', 'ReservationHistory', 'history_id',
+                                 _rollup_history, batch_size, max_rows)
+    return processed
+
+
+def pending_rows(db):
+    """Số id nguồn chưa được đưa vào rollup (ước lượng theo khoảng id)."""
+    pending = 0
+    for name, table, id_column in (('rollup:reservations', 'Reservations', 'reservation_id'),
+                                   ('rollup:history', 'ReservationHistory', 'history_id')):
+        top = db.execute(f"SELECT MAX({id_column}) FROM {table}").fetchone()[0] or 0
+        pending += max(0, top - get_watermark(db, name))
+    return pending
+
+
+def booking_report(db, date_from, date_to, restaurant_id=None, granularity='day'):
+    """Lượt đặt, số khách, hủy, từ chối và tỉ lệ hủy theo từng ô thời gian."""
+    if granularity == 'hour':
+        sql = """
+            SELECT h.restaurant_id, rest.name AS restaurant_name, h.bucket_date,
+                   PRINTF('%02d:00', h.bucket_hour) AS bucket_hour,
+                   h.bookings, h.guests, h.cancellations, h.rejections
+            FROM BookingRollupHourly h
+            JOIN Restaurants rest ON rest.restaurant_id = h.restaurant_id
+            WHERE h.bucket_date >= ? AND h.bucket_date <= ?
+        """
+        order = " ORDER BY h.bucket_date, h.bucket_hour, rest.name"
+    else:
+        sql = """
+            SELECT h.restaurant_id, rest.name AS restaurant_name, h.bucket_date, NULL AS bucket_hour,
+                   h.bookings, h.guests, h.cancellations, h.rejections
+            FROM BookingRollupDaily h
+            JOIN Restaurants rest ON rest.restaurant_id = h.restaurant_id
+            WHERE h.bucket_date >= ? AND h.bucket_date <= ?
+        """
+        order = " ORDER BY h.bucket_date, rest.name"
+    params = [date_from, date_to]
+    if restaurant_id:
+        sql += " AND h.restaurant_id = ?"
+        params.append(restaurant_id)
+    rows = []
+    for row in db.execute(sql + order, params):
+        item = dict(row)
+        item['cancellation_rate'] = item['cancellations'] / item['bookings'] if item['bookings'] else 0.0
+        rows.append(item)
+    return rows
+
+
+def _open_minutes(opening_time, closing_time):
+    if not opening_time or not closing_time:
+        return 12 * 60
+    open_h, open_m = map(int, opening_time.split(':'))
+    close_h, close_m = map(int, closing_time.split(':'))
+    return max(0, (close_h * 60 + close_m) - (open_h * 60 + open_m))
+
+
+def occupancy_report(db, restaurant_id, date_from, date_to):
+    """Tỉ lệ lấp đầy từng bàn: số phút đã được đặt / số phút mở cửa trong khoảng ngày."""
+    restaurant = db.execute("SELECT opening_time, closing_time FROM Restaurants WHERE restaurant_id = ?",
+                            (restaurant_id,)).fetchone()
+    if not restaurant:
+        return []
+    days = db.execute("SELECT JULIANDAY(?) - JULIANDAY(?) + 1", (date_to, date_from)).fetchone()[0] or 0
+    available = max(days, 0) * _open_minutes(restaurant[0], restaurant[1])
+    rows = db.execute("""
+        SELECT t.table_id, t.table_number, t.capacity,
+               COALESCE(SUM(u.bookings), 0) AS bookings,
+               COALESCE(SUM(u.booked_minutes), 0) AS booked_minutes
+        FROM Tables t
+        LEFT JOIN TableRollupDaily u ON u.table_id = t.table_id AND u.bucket_date >= ? AND u.bucket_date <= ?
+        WHERE t.restaurant_id = ?
+        GROUP BY t.table_id
+        ORDER BY t.table_number
+    """, (date_from, date_to, restaurant_id)).fetchall()
+    report = []
+    for row in rows:
+        item = dict(row)
+        item['occupancy_rate'] = min(1.0, item['booked_minutes'] / available) if available else 0.0
+        report.append(item)
+    return report
+
+
+def main(argv=None):
+    # Import trong hàm: init_database import module này khi nạp
+    try:
+        from .init_database import DB_PATH
+    except ImportError:  # chạy trực tiếp: python analytics.py
+        from init_database import DB_PATH
+    parser = argparse.ArgumentParser(description="Bring the booking analytics rollups up to date.")
+    parser.add_argument('--db', default=DB_PATH, help="database file")
+    parser.add_argument('--refresh', action='store_true', help="process every new reservation/history row")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    db = sqlite3.connect(args.db)
+    try:
+        create_analytics_schema(db)
+        if args.refresh:
+            processed = refresh_rollups(db, batch_size=args.batch_size)
+            print(f"Processed {processed} source rows.")
+        print(f"Pending source rows: {pending_rows(db)}")
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,29 +1,551 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, g
+from flask import Flask, Blueprint, render_template, request, redirect, url_for, flash, session, g, Response, \
+    current_app, has_request_context, send_from_directory
+from flask import before_render_template, template_rendered
+from jinja2 import FileSystemBytecodeCache
 import sqlite3
 from werkzeug.security import generate_password_hash, check_password_hash
-from functools import wraps
+from functools import partial, wraps
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
 import re
-
-DB_PATH = "restaurant_reservation.db"
-
-app = Flask(__name__)
-app.secret_key = "replace_with_a_secure_secret"  # change in production
+import random
+import threading
+from time import perf_counter
+
+try:
+    from .init_database import ensure_schema, DB_PATH
+    from .stats import get_dashboard_stats, load_dashboard_stats, DashboardSnapshot
+    from .analytics import refresh_rollups, pending_rows, booking_report, occupancy_report
+    from .audit import AuditWriter, history_event, INSERT_HISTORY
+    from .background import PeriodicWorker
+    from .sweeper import sweep_database
+    from .archive import reservations_source
+    from .purge import schedule_deletion, purge_database, deletion_progress
+    from .layout import LayoutCache, parse_layout, diff_layout, apply_layout, affected_reservations, \
+        bump_layout_version, layout_csv
+    from .assignment import BUSY_TABLES, assign_tables, busy_tables, save_assignment, reoptimize_day
+    from .waitlist import join_waitlist, match_waitlist, accept_offer, leave_waitlist, customer_waitlist
+    from .metrics import Registry, TimedConnection, CONTENT_TYPE
+    from .sqltrace import SlowQueryLog, read_entries, summarize
+    from .profiling import RequestProfiler, start_profile, function_key
+    from .pool import Connection, ConnectionPool
+    from .assets import AssetManifest, BULMA_ASSET, BULMA_CDN_URL, ASSET_MAX_AGE
+    from .compression import GzipCache, compress_response
+    from .availability import AvailabilityService, Lookup
+    from .outbox import OutboxDispatcher, make_sink
+except ImportError:  # chạy trực tiếp: python app.py
+    from init_database import ensure_schema, DB_PATH
+    from stats import get_dashboard_stats, load_dashboard_stats, DashboardSnapshot
+    from analytics import refresh_rollups, pending_rows, booking_report, occupancy_report
+    from audit import AuditWriter, history_event, INSERT_HISTORY
+    from background import PeriodicWorker
+    from sweeper import sweep_database
+    from archive import reservations_source
+    from purge import schedule_deletion, purge_database, deletion_progress
+    from layout import LayoutCache, parse_layout, diff_layout, apply_layout, affected_reservations, \
+        bump_layout_version, layout_csv
+    from assignment import BUSY_TABLES, assign_tables, busy_tables, save_assignment, reoptimize_day
+    from waitlist import join_waitlist, match_waitlist, accept_offer, leave_waitlist, customer_waitlist
+    from metrics import Registry, TimedConnection, CONTENT_TYPE
+    from sqltrace import SlowQueryLog, read_entries, summarize
+    from profiling import RequestProfiler, start_profile, function_key
+    from pool import Connection, ConnectionPool
+    from assets import AssetManifest, BULMA_ASSET, BULMA_CDN_URL, ASSET_MAX_AGE
+    from compression import GzipCache, compress_response
+    from availability import AvailabilityService, Lookup
+    from outbox import OutboxDispatcher, make_sink
+
+
+class Routes(Blueprint):
+    """Blueprint đăng ký endpoint không kèm tiền tố, để url_for('login') ... giữ nguyên như với app.route."""
+
+    def add_url_rule(self, rule, endpoint=None, view_func=None, **options):
+        endpoint = endpoint or view_func.__name__
+        self.record(lambda state: state.app.add_url_rule(rule, endpoint, view_func, **options))
+
+
+web = Routes('web', __name__)
+
+
+def create_app(config=None):
+    """
+    Tạo app Flask. Cấu hình theo thứ tự ưu tiên tăng dần: giá trị mặc định bên dưới, biến môi trường
+    RESTAURANT_<KHÓA> (ví dụ RESTAURANT_DB_PATH=/srv/data/app.db, RESTAURANT_DB_POOL_SIZE=8; giá trị
+    đọc được như JSON thì được đọc như JSON), rồi dict config.
+    Hàm không mở kết nối CSDL hay luồng nào nên gọi được trước khi fork (gunicorn --preload, xem wsgi.py).
+    """
+    started = perf_counter()
+    app = Flask(__name__)
+    app.secret_key = "replace_with_a_secure_secret"  # change in production
+    # File CSDL SQLite
+    app.config['DB_PATH'] = DB_PATH
+    # Số kết nối rảnh được giữ lại cho request sau (0 = mở/đóng kết nối mỗi request, xem pool.py)
+    app.config['DB_POOL_SIZE'] = 4
+    # PRAGMA của kết nối: 'default' hoặc 'wal' (nên dùng khi chạy nhiều worker)
+    app.config['STORAGE_PROFILE'] = 'default'
+    # Page cache của mỗi kết nối (KiB); None = mặc định của SQLite
+    app.config['SQLITE_CACHE_KB'] = None
+    # Số nhà hàng tối đa trong cache danh sách bàn (xem layout.py)
+    app.config['LAYOUT_CACHE_SIZE'] = 512
+    # Số liệu dashboard được phục vụ từ bản chụp làm mới mỗi N giây (0 = tính trực tiếp mỗi request)
+    app.config['DASHBOARD_SNAPSHOT_SECONDS'] = 30
+    # Số dòng nguồn tối đa được cộng vào rollup mỗi lần admin bấm "Refresh" trên trang báo cáo
+    app.config['REPORT_REFRESH_ROWS'] = 2000
+    # Ghi ReservationHistory: 'sync' (trong giao dịch của request) hoặc 'async' (ghi theo lô, xem audit.py)
+    app.config['AUDIT_MODE'] = 'sync'
+    app.config['AUDIT_FLUSH_SECONDS'] = 1.0
+    # Chu kỳ (giây) chạy sweeper trong tiến trình web; 0 = tắt (chạy `python sweeper.py` bằng cron)
+    app.config['SWEEPER_INTERVAL_SECONDS'] = 0
+    # Khách/nhà hàng bị xóa được dọn dữ liệu liên quan theo khối trên luồng nền (xem purge.py);
+    # luồng được đánh thức ngay khi có yêu cầu xóa, ngoài ra kiểm tra lại mỗi N giây
+    app.config['PURGE_INTERVAL_SECONDS'] = 60
+    # Khi có bàn trống do hủy/từ chối: 'book' tự đặt cho khách trong danh sách chờ, 'offer' chỉ mời khách nhận
+    app.config['WAITLIST_MODE'] = 'book'
+    # Đo thời gian request/SQL/template và xuất tại /metrics (xem metrics.py). Tắt (và SLOW_QUERY_MS = 0)
+    # thì pool dùng kết nối thường, không bọc cursor; hai giá trị này được đọc lúc tạo pool
+    app.config['METRICS_ENABLED'] = True
+    # Ghi câu SQL chậm hơn N ms (kèm EXPLAIN QUERY PLAN lần đầu) vào file JSONL xoay vòng; 0 = tắt
+    app.config['SLOW_QUERY_MS'] = 0
+    app.config['SLOW_QUERY_LOG'] = 'slow_queries.jsonl'
+    # Profile cProfile theo request (xem profiling.py): lấy mẫu theo tỉ lệ 0..1, hoặc admin gửi header
+    # PROFILE_HEADER (None = tắt); file pstats được lưu trong PROFILE_DIR
+    app.config['PROFILE_SAMPLE_RATE'] = 0.0
+    app.config['PROFILE_HEADER'] = 'X-Profile'
+    app.config['PROFILE_DIR'] = 'profiles'
+    # Bytecode của template được lưu trên đĩa, dùng chung giữa các worker và các lần khởi động:
+    # None = thư mục tạm riêng của user hiện tại (Jinja tự chọn và kiểm tra quyền), False = tắt
+    app.config['TEMPLATE_CACHE_DIR'] = None
+    # Biên dịch mọi template ngay trong create_app (trước khi fork) thay vì ở request đầu tiên dùng tới
+    app.config['PRECOMPILE_TEMPLATES'] = False
+    # Nén gzip response dạng text từ N byte trở lên (0 = tắt); bản nén của file tĩnh được cache (xem compression.py)
+    app.config['COMPRESS_MIN_BYTES'] = 1024
+    app.config['COMPRESS_LEVEL'] = 6
+    app.config['COMPRESS_CACHE_SIZE'] = 128
+    # Trang /availability: số luồng/kết nối chỉ-đọc tra cứu song song, hạn chót (giây) và số ngày tối đa
+    app.config['AVAILABILITY_WORKERS'] = 4
+    app.config['AVAILABILITY_TIMEOUT'] = 2.0
+    app.config['AVAILABILITY_MAX_DAYS'] = 7
+    # Thông báo cho khách khi lượt đặt thay đổi (xem outbox.py). Luôn được ghi vào NotificationOutbox;
+    # NOTIFY_SINK chọn nơi gửi trong tiến trình web: 'file' (JSONL tại NOTIFY_FILE), 'smtp', hoặc None
+    # (không gửi trong tiến trình web, chạy `python outbox.py deliver` bằng cron)
+    app.config['NOTIFY_SINK'] = None
+    app.config['NOTIFY_FILE'] = 'notifications.jsonl'
+    app.config['NOTIFY_SMTP_HOST'] = 'localhost'
+    app.config['NOTIFY_SMTP_PORT'] = 25
+    app.config['NOTIFY_SENDER'] = 'reservations@localhost'
+    # Số luồng gửi, chu kỳ quét (giây) khi không được đánh thức, và số lần thử trước khi bỏ cuộc
+    app.config['NOTIFY_WORKERS'] = 2
+    app.config['NOTIFY_INTERVAL_SECONDS'] = 5.0
+    app.config['NOTIFY_MAX_ATTEMPTS'] = 8
+
+    app.config.from_prefixed_env('RESTAURANT')
+    if config:
+        app.config.update(config)
+    if app.config['TEMPLATE_CACHE_DIR'] is not False:
+        if app.config['TEMPLATE_CACHE_DIR']:
+            os.makedirs(app.config['TEMPLATE_CACHE_DIR'], exist_ok=True)
+        app.jinja_options = dict(app.jinja_options,
+                                 bytecode_cache=FileSystemBytecodeCache(app.config['TEMPLATE_CACHE_DIR']))
+    # Tài nguyên dùng chung của app (pool kết nối, luồng nền, cache), tạo khi cần bởi app_resource()
+    app.extensions['restaurant'] = {'lock': threading.RLock()}
+    app.register_blueprint(web)
+    if app.config['PRECOMPILE_TEMPLATES']:
+        for name in app.jinja_env.list_templates():
+            app.jinja_env.get_template(name)
+    app.extensions['restaurant']['startup_seconds'] = elapsed = perf_counter() - started
+    app.logger.info("App created in %.1f ms", elapsed * 1000)
+    return app
+
+
+def app_resource(kind, key, create):
+    """Tài nguyên app.extensions['restaurant'][kind][key] của app hiện tại; lần đầu được tạo bằng create()."""
+    resources = current_app.extensions['restaurant']
+    by_key = resources.get(kind)
+    if by_key is None or key not in by_key:
+        with resources['lock']:
+            by_key = resources.setdefault(kind, {})
+            if key not in by_key:
+                by_key[key] = create()
+    return by_key[key]
+
+
+def shutdown_app(app):
+    """
+    Dừng các luồng nền, ghi nốt lịch sử đang chờ và đóng kết nối của app
+    (cuối mỗi test, hoặc từ hook worker_exit của gunicorn).
+    """
+    resources = app.extensions['restaurant']
+    with resources['lock']:
+        for writer in resources.pop('audit_writers', {}).values():
+            writer.drain()
+        for kind in ('sweepers', 'purgers'):
+            for worker in resources.pop(kind, {}).values():
+                worker.stop()
+        for snapshot in resources.pop('dashboard_snapshots', {}).values():
+            snapshot.worker.stop()
+        for service in resources.pop('availability', {}).values():
+            service.close()
+        for dispatcher in resources.pop('notifiers', {}).values():
+            dispatcher.close()
+        for pool in resources.pop('pools', {}).values():
+            pool.close()
+        resources.pop('schema_checked', None)
+
+
+def get_pool():
+    config = current_app.config
+    timed = config['METRICS_ENABLED'] or config['SLOW_QUERY_MS']
+    return app_resource('pools', config['DB_PATH'], lambda: ConnectionPool(
+        config['DB_PATH'], config['DB_POOL_SIZE'], config['STORAGE_PROFILE'], config['SQLITE_CACHE_KB'],
+        factory=TimedConnection if timed else Connection))
 
 
 def get_db():
     if 'db' not in g:
-        g.db = sqlite3.connect(DB_PATH, detect_types=sqlite3.PARSE_DECLTYPES)
-        g.db.row_factory = sqlite3.Row
-        g.db.execute("PRAGMA foreign_keys = ON;")
+        started = perf_counter()
+        pool = get_pool()
+        db = pool.acquire()
+        db.reset()
+        g.db, g.db_pool = db, pool
+        # Kiểm tra/nâng cấp schema (theo PRAGMA user_version) một lần cho mỗi file CSDL trong tiến trình này
+        checked = app_resource('schema_checked', pool.db_path, lambda: [False])
+        if not checked[0]:
+            ensure_schema(db)
+            checked[0] = True
+            # Tiếp tục các yêu cầu xóa còn dang dở từ lần chạy trước
+            if db.execute("SELECT 1 FROM PendingDeletions WHERE finished_at IS NULL LIMIT 1").fetchone():
+                request_purge()
+        if current_app.config['SLOW_QUERY_MS'] and isinstance(db, TimedConnection):
+            db.tracer = get_slow_query_log()
+            if has_request_context():
+                rule = request.url_rule.rule if request.url_rule else request.path
+                db.trace_route = f"{request.method} {rule}"
+        if current_app.config['METRICS_ENABLED']:
+            DB_CONNECT_SECONDS.observe(perf_counter() - started)
     return g.db
 
-@app.teardown_appcontext
+
+def get_dashboard_snapshot():
+    """Bản chụp dashboard của file CSDL hiện tại."""
+    def create():
+        get_db()  # nâng cấp schema (nếu cần) trước khi bản chụp đọc bằng kết nối chỉ-đọc
+        return DashboardSnapshot(partial(load_dashboard_stats, db_path),
+                                 max_age=current_app.config['DASHBOARD_SNAPSHOT_SECONDS'])
+    db_path = current_app.config['DB_PATH']
+    return app_resource('dashboard_snapshots', db_path, create)
+
+
+def get_audit_writer():
+    """Bộ ghi lịch sử bất đồng bộ của file CSDL hiện tại."""
+    db_path = current_app.config['DB_PATH']
+    return app_resource('audit_writers', db_path, lambda: AuditWriter(
+        db_path, flush_interval=current_app.config['AUDIT_FLUSH_SECONDS']))
+
+
+def record_history(db, reservation_id, action, note, admin_id=None, customer_id=None):
+    """Ghi một dòng ReservationHistory theo AUDIT_MODE."""
+    event = history_event(reservation_id, action, note, admin_id=admin_id, customer_id=customer_id)
+    if current_app.config['AUDIT_MODE'] == 'async':
+        submit_after_commit(db, [event])
+    else:
+        db.execute(INSERT_HISTORY, event)
+
+
+def record_history_many(db, events):
+    """Ghi nhiều dòng ReservationHistory (đã tạo bằng history_event) theo AUDIT_MODE."""
+    if current_app.config['AUDIT_MODE'] == 'async':
+        submit_after_commit(db, events)
+    else:
+        db.executemany(INSERT_HISTORY, events)
+
+
+def submit_after_commit(db, events):
+    """
+    AUDIT_MODE 'async': đưa sự kiện vào hàng đợi của AuditWriter chỉ sau khi giao dịch của request
+    commit thành công (xem pool.Connection); request lỗi hay rollback thì sự kiện bị bỏ.
+    """
+    writer = get_audit_writer()
+
+    def submit():
+        for event in events:
+            writer.submit(event, db)
+        if db.in_transaction:  # hàng đợi đầy: các dòng đã được ghi thẳng bằng db
+            db.commit()
+    db.after_commit(submit)
+
+
+def release_slot(db, res):
+    """Khung giờ của lượt đặt res (trước khi đổi) vừa trống: ghép với danh sách chờ trong cùng giao dịch."""
+    if res['status'] in ('pending', 'confirmed'):
+        match_waitlist(db, res['restaurant_id'], res['reservation_date'], res['reservation_time'],
+                       current_app.config['WAITLIST_MODE'], record=record_history_many)
+
+
+@web.before_app_request
+def start_sweeper():
+    interval = current_app.config['SWEEPER_INTERVAL_SECONDS']
+    if not interval:
+        return
+    db_path = current_app.config['DB_PATH']
+    app_resource('sweepers', db_path, lambda: PeriodicWorker(
+        'reservation-sweeper', interval, partial(sweep_database, db_path))).ensure_started()
+
+
+def get_purge_worker():
+    """Luồng dọn dữ liệu của khách/nhà hàng đã xóa mềm, cho file CSDL hiện tại."""
+    db_path = current_app.config['DB_PATH']
+    return app_resource('purgers', db_path, lambda: PeriodicWorker(
+        'purge-worker', current_app.config['PURGE_INTERVAL_SECONDS'], partial(purge_database, db_path, pause=0.05)))
+
+
+def request_purge():
+    """Đánh thức luồng dọn (nếu được bật) sau khi đã commit một yêu cầu xóa."""
+    if current_app.config['PURGE_INTERVAL_SECONDS']:
+        get_purge_worker().wake()
+
+
+def get_notifier():
+    """Nhóm luồng gửi thông báo của file CSDL hiện tại; None nếu NOTIFY_SINK tắt."""
+    config = current_app.config
+    if not config['NOTIFY_SINK']:
+        return None
+
+    def create():
+        get_db()  # tạo bảng NotificationOutbox (nếu cần) trước khi các luồng gửi đọc nó
+        sink = make_sink(config['NOTIFY_SINK'], config['NOTIFY_FILE'], config['NOTIFY_SMTP_HOST'],
+                         config['NOTIFY_SMTP_PORT'], config['NOTIFY_SENDER'])
+        return OutboxDispatcher(config['DB_PATH'], sink, workers=config['NOTIFY_WORKERS'],
+                                interval=config['NOTIFY_INTERVAL_SECONDS'], max_attempts=config['NOTIFY_MAX_ATTEMPTS'],
+                                profile=config['STORAGE_PROFILE'])
+    return app_resource('notifiers', config['DB_PATH'], create)
+
+
+@web.before_app_request
+def start_notifier():
+    notifier = get_notifier()
+    if notifier:
+        notifier.ensure_started()
+
+
+def request_notify():
+    """Đánh thức các luồng gửi (nếu được bật) sau khi đã commit thay đổi lượt đặt."""
+    notifier = get_notifier()
+    if notifier:
+        notifier.wake()
+
+
+def get_availability():
+    """Dịch vụ tra cứu bàn trống song song của file CSDL hiện tại (xem availability.py)."""
+    config = current_app.config
+    return app_resource('availability', config['DB_PATH'], lambda: AvailabilityService(
+        config['DB_PATH'], config['AVAILABILITY_WORKERS'], config['STORAGE_PROFILE'], config['SQLITE_CACHE_KB']))
+
+
+def get_layout_cache():
+    """Danh sách bàn theo nhà hàng, làm mới theo Restaurants.layout_version (xem layout.py)."""
+    return app_resource('layout_caches', current_app.config['DB_PATH'],
+                        lambda: LayoutCache(current_app.config['LAYOUT_CACHE_SIZE']))
+
+
+# -----------------------
+# Metrics
+# -----------------------
+metrics_registry = Registry()
+REQUEST_SECONDS = metrics_registry.histogram(
+    'http_request_duration_seconds', 'Request latency by Flask endpoint, method and status code.',
+    ('endpoint', 'method', 'status'))
+REQUEST_SQL_SECONDS = metrics_registry.histogram(
+    'http_request_sql_seconds', 'Total SQL execute and fetch time per request.', ('endpoint',))
+SQL_STATEMENTS = metrics_registry.counter(
+    'db_statements_total', 'SQL statements executed, by Flask endpoint.', ('endpoint',))
+DB_CONNECT_SECONDS = metrics_registry.histogram(
+    'db_connect_seconds', 'Time to get the per-request SQLite connection (pool or new).')
+DB_LOCK_WAIT_SECONDS = metrics_registry.histogram(
+    'db_lock_wait_seconds', 'Time spent in BEGIN statements waiting for the write lock, per request.', ('endpoint',))
+TEMPLATE_SECONDS = metrics_registry.histogram(
+    'template_render_seconds', 'Jinja template render time.', ('template',))
+
+
+def _app_metrics():
+    """Số đo của các tài nguyên thuộc app hiện tại (gọi trong request /metrics)."""
+    resources = current_app.extensions['restaurant']
+    caches = list(resources.get('layout_caches', {}).values())
+    pools = list(resources.get('pools', {}).values())
+    gzip_caches = list(resources.get('gzip_caches', {}).values())
+    services = list(resources.get('availability', {}).values())
+    notifiers = list(resources.get('notifiers', {}).values())
+    yield ('layout_cache_hits_total', 'counter', 'Table layout cache hits.',
+           [({}, sum(c.hits for c in caches))])
+    yield ('layout_cache_misses_total', 'counter', 'Table layout cache misses.',
+           [({}, sum(c.misses for c in caches))])
+    yield ('db_pool_connections_opened_total', 'counter', 'SQLite connections opened by the pool.',
+           [({}, sum(p.opened for p in pools))])
+    yield ('db_pool_connections_reused_total', 'counter', 'Requests served by an idle pooled connection.',
+           [({}, sum(p.reused for p in pools))])
+    yield ('db_pool_idle_connections', 'gauge', 'Idle pooled SQLite connections.',
+           [({}, sum(p.idle for p in pools))])
+    yield ('gzip_cache_hits_total', 'counter', 'Compressed static responses served from the cache.',
+           [({}, sum(c.hits for c in gzip_caches))])
+    yield ('gzip_cache_misses_total', 'counter', 'Static responses compressed and added to the cache.',
+           [({}, sum(c.misses for c in gzip_caches))])
+    yield ('availability_lookups_total', 'counter', 'Restaurant/date availability lookups fanned out.',
+           [({}, sum(s.lookups for s in services))])
+    yield ('availability_timeouts_total', 'counter', 'Availability lookups dropped at the deadline.',
+           [({}, sum(s.timeouts for s in services))])
+    yield ('notifications_delivered_total', 'counter', 'Reservation notifications handed to the sink.',
+           [({}, sum(n.delivered for n in notifiers))])
+    yield ('notifications_failed_total', 'counter', 'Notification delivery attempts that failed and were rescheduled.',
+           [({}, sum(n.failed for n in notifiers))])
+    if notifiers:
+        backlogs = [n.backlog() for n in notifiers]
+        yield ('notification_outbox_pending', 'gauge', 'Notifications waiting in the outbox to be delivered.',
+               [({}, sum(b[0] for b in backlogs))])
+        yield ('notification_outbox_gave_up', 'gauge', 'Undelivered notifications that used up every attempt.',
+               [({}, sum(b[1] for b in backlogs))])
+        yield ('notification_outbox_oldest_age_seconds', 'gauge', 'Age of the oldest pending notification.',
+               [({}, max(b[2] for b in backlogs))])
+    yield ('app_startup_seconds', 'gauge', 'Time spent in create_app(), including template precompilation.',
+           [({}, resources['startup_seconds'])])
+
+
+metrics_registry.add_collector(_app_metrics)
+
+
+@web.before_app_request
+def start_request_timer():
+    if current_app.config['METRICS_ENABLED']:
+        g.request_started = perf_counter()
+
+
+@web.after_app_request
+def remember_status(response):
+    g.response_status = response.status_code
+    return response
+
+
+@web.teardown_app_request
+def record_request_metrics(exc):
+    started = g.pop('request_started', None)
+    if started is None:
+        return
+    endpoint = request.endpoint or 'unmatched'
+    status = g.pop('response_status', 500)
+    REQUEST_SECONDS.observe(perf_counter() - started, endpoint, request.method, str(status))
+    db = g.get('db')
+    if isinstance(db, TimedConnection):
+        REQUEST_SQL_SECONDS.observe(db.sql_seconds, endpoint)
+        SQL_STATEMENTS.inc(endpoint, amount=db.sql_statements)
+        if db.lock_wait_seconds:
+            DB_LOCK_WAIT_SECONDS.observe(db.lock_wait_seconds, endpoint)
+
+
+@before_render_template.connect
+def _start_template_timer(sender, template, context, **extra):
+    if sender.config['METRICS_ENABLED']:
+        g.setdefault('template_started', []).append(perf_counter())
+
+
+@template_rendered.connect
+def _record_template_time(sender, template, context, **extra):
+    stack = g.get('template_started')
+    if stack:
+        TEMPLATE_SECONDS.observe(perf_counter() - stack.pop(), template.name or 'string')
+
+
+def get_slow_query_log():
+    """Nhật ký câu SQL chậm theo file log và ngưỡng đang cấu hình (xem sqltrace.py)."""
+    path, threshold = current_app.config['SLOW_QUERY_LOG'], current_app.config['SLOW_QUERY_MS']
+    return app_resource('slow_query_logs', (path, threshold), lambda: SlowQueryLog(path, threshold))
+
+
+def get_profiler():
+    """Profiler theo thư mục lưu file pstats."""
+    directory = current_app.config['PROFILE_DIR']
+    return app_resource('profilers', directory, lambda: RequestProfiler(directory))
+
+
+@web.before_app_request
+def start_request_profile():
+    rate = current_app.config['PROFILE_SAMPLE_RATE']
+    header = current_app.config['PROFILE_HEADER']
+    sampled = rate and random.random() < rate
+    if not sampled and not (header and header in request.headers and session.get('role') == 'admin'):
+        return
+    g.profile = start_profile()
+    g.profile_started = perf_counter()
+
+
+@web.teardown_app_request
+def finish_request_profile(exc):
+    profile = g.pop('profile', None)
+    if profile is None:
+        return
+    view = current_app.view_functions.get(request.endpoint)
+    get_profiler().finish(profile, f"{request.method} {request.endpoint or request.path}",
+                          perf_counter() - g.pop('profile_started'),
+                          root=function_key(view) if view else None)
+
+
+@web.route('/metrics')
+def metrics():
+    if not current_app.config['METRICS_ENABLED']:
+        return "Not found", 404
+    return Response(metrics_registry.expose(), content_type=CONTENT_TYPE)
+
+
+# -----------------------
+# Static assets & compression
+# -----------------------
+def get_assets():
+    """Fingerprint các file trong thư mục static của app (xem assets.py)."""
+    folder = current_app.static_folder
+    return app_resource('assets', folder, lambda: AssetManifest(folder))
+
+
+@web.app_template_global()
+def asset_url(name, fallback=None):
+    """URL /assets/... có fingerprint của file tĩnh name; không có file thì trả về fallback hoặc /static/name."""
+    fingerprinted = get_assets().fingerprinted(name)
+    if fingerprinted is None:
+        return fallback or url_for('static', filename=name)
+    return url_for('asset', filename=fingerprinted)
+
+
+@web.app_template_global()
+def bulma_url():
+    """Bulma tải về bằng `python assets.py fetch`, chưa có thì dùng CDN."""
+    return asset_url(BULMA_ASSET, BULMA_CDN_URL)
+
+
+@web.route('/assets/<path:filename>')
+def asset(filename):
+    name = get_assets().resolve(filename)
+    if name is None:
+        return "Not found", 404
+    response = send_from_directory(current_app.static_folder, name, max_age=ASSET_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+@web.after_app_request
+def compress(response):
+    min_bytes = current_app.config['COMPRESS_MIN_BYTES']
+    if min_bytes:
+        level = current_app.config['COMPRESS_LEVEL']
+        cache = app_resource('gzip_caches', None, lambda: GzipCache(current_app.config['COMPRESS_CACHE_SIZE']))
+        compress_response(response, request, min_bytes, level, cache)
+    return response
+
+
 def close_db(exc):
+    """Trả kết nối của request về pool."""
     db = g.pop('db', None)
     if db is not None:
-        db.close()
+        g.pop('db_pool').release(db)
+
+
+web.record(lambda state: state.app.teardown_appcontext(close_db))
 
 
 # -----------------------
@@ -46,13 +568,13 @@ def login_required(role=None):
 # -----------------------
 # Public routes
 # -----------------------
-@app.route('/')
+@web.route('/')
 def index():
     return render_template('index.html')
 
 
 # Register (customer)
-@app.route('/register', methods=['GET', 'POST'])
+@web.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
         username = request.form['username'].strip()
@@ -105,7 +627,7 @@ def register():
     return render_template('register.html')
 
 # Login (customer or admin)
-@app.route('/login', methods=['GET', 'POST'])
+@web.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         who = request.form.get('who')  # 'customer' or 'admin'
@@ -125,7 +647,7 @@ def login():
             else:
                 flash('Invalid admin credentials.', 'danger')
         else:
-            cur = db.execute("SELECT * FROM Customers WHERE username = ?;", (username,))
+            cur = db.execute("SELECT * FROM Customers WHERE username = ? AND deleted_at IS NULL;", (username,))
             row = cur.fetchone()
             if row and check_password_hash(row['password_hash'], password):
                 session['user'] = row['customer_id']
@@ -138,14 +660,14 @@ def login():
 
     return render_template('login.html')
 
-@app.route('/logout')
+@web.route('/logout')
 def logout():
     session.clear()
     flash('Logged out.', 'info')
     return redirect(url_for('index'))
 
 # Profile & change password
-@app.route('/profile', methods=['GET', 'POST'])
+@web.route('/profile', methods=['GET', 'POST'])
 @login_required(role='customer')
 def profile():
     db = get_db()
@@ -182,7 +704,7 @@ def profile():
     user = cur.fetchone()
     return render_template('profile.html', user=user)
 
-@app.route('/change_password', methods=['GET', 'POST'])
+@web.route('/change_password', methods=['GET', 'POST'])
 @login_required(role='customer')
 def change_password():
     db = get_db()
@@ -205,13 +727,13 @@ def change_password():
 # -----------------------
 # Restaurant listing & search
 # -----------------------
-@app.route('/restaurants')
+@web.route('/restaurants')
 def restaurants():
     q_location = request.args.get('location', '').strip()
     q_cuisine = request.args.get('cuisine', '').strip()
     q_sort = request.args.get('sort', 'rating')  # rating or name
 
-    sql = "SELECT * FROM Restaurants WHERE 1=1"
+    sql = "SELECT * FROM Restaurants WHERE deleted_at IS NULL"
     params = []
     if q_location:
         sql += " AND location LIKE ?"
@@ -229,6 +751,47 @@ def restaurants():
     rows = cur.fetchall()
     return render_template('restaurants.html', restaurants=rows, q_location=q_location, q_cuisine=q_cuisine)
 
+@web.route('/availability')
+def availability():
+    """Nhà hàng nào còn bàn vào một giờ trong khoảng nhiều ngày; tra cứu song song có hạn chót."""
+    q_location = request.args.get('location', '').strip()
+    q_cuisine = request.args.get('cuisine', '').strip()
+    time = request.args.get('time', '19:00')
+    max_days = current_app.config['AVAILABILITY_MAX_DAYS']
+    try:
+        start = datetime.strptime(request.args.get('date') or datetime.now().strftime('%Y-%m-%d'), '%Y-%m-%d')
+        days = min(max(int(request.args.get('days', 3)), 1), max_days)
+        guests = max(int(request.args.get('guests', 2)), 1)
+        datetime.strptime(time, '%H:%M')
+    except ValueError:
+        flash('Invalid date, time, number of days or party size.', 'danger')
+        return redirect(url_for('availability'))
+    dates = [(start + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(days)]
+
+    sql = "SELECT * FROM Restaurants WHERE deleted_at IS NULL"
+    params = []
+    if q_location:
+        sql += " AND location LIKE ?"
+        params.append(f"%{q_location}%")
+    if q_cuisine:
+        sql += " AND cuisine LIKE ?"
+        params.append(f"%{q_cuisine}%")
+    sql += " ORDER BY rating DESC"
+    rows = [r for r in get_db().execute(sql, params) if is_reservation_time_valid(time, r)]
+
+    lookups = [Lookup(r['restaurant_id'], date, time, guests) for r in rows for date in dates
+               if is_reservation_date_valid(date)]
+    get_availability().check_many(lookups, current_app.config['AVAILABILITY_TIMEOUT'])
+    grid = {}
+    for lookup in lookups:
+        grid.setdefault(lookup.restaurant_id, {})[lookup.date] = lookup
+    if any(not lookup.done for lookup in lookups):
+        flash('Some restaurants did not answer in time; results are partial.', 'warning')
+    return render_template('availability.html', restaurants=rows, dates=dates, grid=grid, time=time,
+                           guests=guests, days=days, max_days=max_days, q_location=q_location,
+                           q_cuisine=q_cuisine)
+
+
 def is_reservation_date_valid(date_str):
     """Kiểm tra xem ngày đặt bàn có hợp lệ không (không phải quá khứ)."""
     return date_str >= datetime.now().strftime('%Y-%m-%d')
@@ -245,15 +808,9 @@ def find_available_table(db, rid, date, time, guests, selected_table_id=None):
     """Tìm một bàn trống phù hợp, ưu tiên bàn do người dùng chọn."""
     if selected_table_id:
         # Kiểm tra xem bàn người dùng chọn có còn trống không
-        is_available = db.execute("""
+        is_available = db.execute(f"""
             SELECT table_id FROM Tables
-            WHERE table_id = ? AND capacity >= ? AND table_id NOT IN (
-                SELECT r.table_id FROM Reservations r
-                WHERE r.table_id IS NOT NULL AND r.reservation_date = ?
-                AND r.status IN ('pending', 'confirmed')
-                AND STRFTIME('%H:%M', r.reservation_time, '+2 hours') > ?
-                AND r.reservation_time < STRFTIME('%H:%M', ?, '+2 hours')
-            )
+            WHERE table_id = ? AND capacity >= ? AND table_id NOT IN ({BUSY_TABLES})
         """, (selected_table_id, guests, date, time, time)).fetchone()
         if is_available:
             return is_available['table_id']
@@ -261,24 +818,18 @@ def find_available_table(db, rid, date, time, guests, selected_table_id=None):
             return None # Bàn đã chọn không hợp lệ hoặc không đủ chỗ
     else:
         # Tự động tìm bàn nhỏ nhất phù hợp
-        available_table = db.execute("""
+        available_table = db.execute(f"""
             SELECT t.table_id FROM Tables t
-            WHERE t.restaurant_id = ? AND t.capacity >= ? AND t.table_id NOT IN (
-                SELECT r.table_id FROM Reservations r
-                WHERE r.table_id IS NOT NULL AND r.reservation_date = ?
-                AND r.status IN ('pending', 'confirmed')
-                AND STRFTIME('%H:%M', r.reservation_time, '+2 hours') > ?
-                AND r.reservation_time < STRFTIME('%H:%M', ?, '+2 hours')
-            )
+            WHERE t.restaurant_id = ? AND t.capacity >= ? AND t.table_id NOT IN ({BUSY_TABLES})
             ORDER BY t.capacity ASC LIMIT 1
         """, (rid, guests, date, time, time)).fetchone()
         return available_table['table_id'] if available_table else None
 
 # Restaurant detail & reservation form
-@app.route('/restaurant/<int:rid>', methods=['GET', 'POST'])
+@web.route('/restaurant/<int:rid>', methods=['GET', 'POST'])
 def restaurant_detail(rid):
     db = get_db()
-    restaurant = db.execute("SELECT * FROM Restaurants WHERE restaurant_id = ?", (rid,)).fetchone()
+    restaurant = db.execute("SELECT * FROM Restaurants WHERE restaurant_id = ? AND deleted_at IS NULL", (rid,)).fetchone()
     if not restaurant:
         flash('Restaurant not found.', 'danger')
         return redirect(url_for('restaurants'))
@@ -303,53 +854,153 @@ def restaurant_detail(rid):
             flash(f"Sorry, the restaurant is only open from {restaurant['opening_time']} to {restaurant['closing_time']}.", 'danger')
             return redirect(url_for('restaurant_detail', rid=rid))
 
-        assigned_table_id = find_available_table(db, rid, date, time, guests, selected_table_id)
-
-        # --- Xử lý kết quả ---
-        if not assigned_table_id:
-            flash('No available table for that time and party size. Please try another time or select a different table.', 'danger')
-            return redirect(url_for('restaurant_detail', rid=rid))
-
-        # --- Lưu vào CSDL nếu mọi thứ hợp lệ ---
-        customer_id = session['user']
-        cur = db.execute("""
-            INSERT INTO Reservations (customer_id, restaurant_id, table_id, reservation_date, reservation_time, guests, status)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (customer_id, rid, assigned_table_id, date, time, guests, 'pending'))
-        db.commit()
+        # Giữ khóa ghi từ lúc chọn bàn tới lúc commit, để hai request cùng lúc không lấy cùng một bàn
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            if selected_table_id:
+                table_id = find_available_table(db, rid, date, time, guests, selected_table_id)
+                assigned_tables = [table_id] if table_id else None
+            else:
+                # Bộ xếp bàn (assignment.py) có thể ghép nhiều bàn cùng khu cho đoàn đông
+                assigned_tables = assign_tables(db, rid, date, time, guests)
+
+            # --- Xử lý kết quả ---
+            if not assigned_tables:
+                db.rollback()
+                flash('No available table for that time and party size. Please try another time or select a different table.', 'danger')
+                # Điền sẵn form danh sách chờ thay vì để khách thử lại liên tục
+                return redirect(url_for('restaurant_detail', rid=rid, date=date, time=time, guests=guests))
+
+            # --- Lưu vào CSDL nếu mọi thứ hợp lệ ---
+            customer_id = session['user']
+            cur = db.execute("""
+                INSERT INTO Reservations (customer_id, restaurant_id, table_id, reservation_date, reservation_time, guests, status)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (customer_id, rid, assigned_tables[0], date, time, guests, 'pending'))
+            if len(assigned_tables) > 1:
+                save_assignment(db, cur.lastrowid, assigned_tables)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        request_notify()
         
         flash('Reservation created and is pending confirmation.', 'success')
         return redirect(url_for('bookings'))
 
     # --- Xử lý cho GET request ---
     today_date = datetime.now().strftime('%Y-%m-%d')
-    tables = db.execute("SELECT * FROM Tables WHERE restaurant_id = ?", (rid,)).fetchall()
-    return render_template('restaurant_detail.html', restaurant=restaurant, tables=tables, today_date=today_date)
+    tables = get_layout_cache().get(db, rid, restaurant['layout_version'])
+    return render_template('restaurant_detail.html', restaurant=restaurant, tables=tables, today_date=today_date,
+                           waitlist_prefill=request.args)
+
+@web.route('/restaurant/<int:rid>/waitlist', methods=['POST'])
+@login_required(role='customer')
+def restaurant_waitlist(rid):
+    db = get_db()
+    restaurant = db.execute("SELECT * FROM Restaurants WHERE restaurant_id = ? AND deleted_at IS NULL", (rid,)).fetchone()
+    if not restaurant:
+        flash('Restaurant not found.', 'danger')
+        return redirect(url_for('restaurants'))
+
+    date = request.form['date']
+    earliest = request.form['earliest_time']
+    latest = request.form['latest_time']
+    guests = request.form.get('guests', type=int) or 0
+    if not is_reservation_date_valid(date):
+        flash("You cannot join the waitlist for a past date.", 'danger')
+        return redirect(url_for('restaurant_detail', rid=rid))
+    if guests <= 0 or latest < earliest:
+        flash('Choose a valid time window and party size.', 'danger')
+        return redirect(url_for('restaurant_detail', rid=rid))
+    if not (is_reservation_time_valid(earliest, restaurant) and is_reservation_time_valid(latest, restaurant)):
+        flash(f"Sorry, the restaurant is only open from {restaurant['opening_time']} to {restaurant['closing_time']}.", 'danger')
+        return redirect(url_for('restaurant_detail', rid=rid))
+
+    # Khóa ghi từ lúc chọn bàn tới lúc commit (như khi đặt mới): dòng chờ cũ không ghi gì trước match_waitlist
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        entry = join_waitlist(db, session['user'], rid, date, earliest, latest, guests)
+        # Có thể đã có bàn trống ngay trong khung giờ này
+        if entry['status'] == 'waiting':
+            match_waitlist(db, rid, date, earliest, current_app.config['WAITLIST_MODE'], record=record_history_many)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    status = db.execute("SELECT status FROM Waitlist WHERE waitlist_id = ?", (entry['waitlist_id'],)).fetchone()['status']
+    if status == 'booked':
+        flash('A table was available, so your reservation has been created and is pending confirmation.', 'success')
+    elif status == 'offered':
+        flash('A table is available in your time window. Accept the offer below to book it.', 'success')
+    else:
+        flash("You're on the waitlist. We'll book a table for you as soon as one frees up.", 'success')
+    return redirect(url_for('bookings'))
+
+@web.route('/waitlist/<int:wid>/accept', methods=['POST'])
+@login_required(role='customer')
+def accept_waitlist_offer(wid):
+    db = get_db()
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        res_id = accept_offer(db, wid, session['user'], record=record_history_many)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    request_notify()
+    if res_id:
+        flash('Reservation created and is pending confirmation.', 'success')
+    else:
+        flash('Sorry, that table has just been taken. You are still on the waitlist.', 'warning')
+    return redirect(url_for('bookings'))
+
+@web.route('/waitlist/<int:wid>/leave', methods=['POST'])
+@login_required(role='customer')
+def leave_waitlist_entry(wid):
+    db = get_db()
+    if leave_waitlist(db, wid, session['user']):
+        db.commit()
+        flash('You have left the waitlist.', 'info')
+    else:
+        flash('Waitlist entry not found.', 'danger')
+    return redirect(url_for('bookings'))
+
+# Tên các bàn ghép của lượt đặt (NULL nếu chỉ một bàn), dùng trong SELECT trên bí danh r
+COMBINED_TABLES = """(SELECT GROUP_CONCAT(ct.table_number, ' + ') FROM ReservationTables rt
+        JOIN Tables ct ON ct.table_id = rt.table_id WHERE rt.reservation_id = r.reservation_id) AS combined_tables"""
 
 # Customer bookings
-@app.route('/bookings')
+@web.route('/bookings')
 @login_required(role='customer')
 def bookings():
     db = get_db()
     uid = session['user']
-    cur = db.execute("""
-        SELECT r.*, rest.name as restaurant_name, t.table_number
-        FROM Reservations r
+    # Lượt đặt cũ đã lưu trữ (archive.py) chỉ hiện khi khách yêu cầu (?archived=1)
+    show_archived = request.args.get('archived') == '1'
+    cur = db.execute(f"""
+        SELECT r.*, rest.name as restaurant_name, t.table_number, {COMBINED_TABLES}
+        FROM {reservations_source(show_archived)} r
         JOIN Restaurants rest ON r.restaurant_id = rest.restaurant_id
         LEFT JOIN Tables t ON r.table_id = t.table_id
-        WHERE r.customer_id = ?
+        WHERE r.customer_id = ? AND rest.deleted_at IS NULL
         ORDER BY r.reservation_date DESC, r.reservation_time DESC
     """, (uid,))
     rows = cur.fetchall()
-    return render_template('bookings.html', bookings=rows)
+    waiting = customer_waitlist(db, uid, datetime.now().strftime('%Y-%m-%d'))
+    return render_template('bookings.html', bookings=rows, show_archived=show_archived, waitlist=waiting)
 
 # Modify or cancel reservation (customer)
-@app.route('/reservation/<int:res_id>/edit', methods=['GET', 'POST'])
+@web.route('/reservation/<int:res_id>/edit', methods=['GET', 'POST'])
 @login_required(role='customer')
 def edit_reservation(res_id):
     db = get_db()
     uid = session['user']
-    cur = db.execute("SELECT * FROM Reservations WHERE reservation_id = ? AND customer_id = ?", (res_id, uid))
+    cur = db.execute("""
+        SELECT r.* FROM Reservations r
+        JOIN Restaurants rest ON r.restaurant_id = rest.restaurant_id
+        WHERE r.reservation_id = ? AND r.customer_id = ? AND rest.deleted_at IS NULL
+    """, (res_id, uid))
     res = cur.fetchone()
     if not res:
         flash('Reservation not found or access denied.', 'danger')
@@ -358,9 +1009,10 @@ def edit_reservation(res_id):
     if request.method == 'POST':
         if request.form.get('action') == 'cancel':
             db.execute("UPDATE Reservations SET status = 'cancelled' WHERE reservation_id = ?", (res_id,))
-            db.execute("INSERT INTO ReservationHistory (reservation_id, action, action_by_customer, note) VALUES (?, 'cancelled', ?, ?)",
-                       (res_id, uid, 'Customer cancelled reservation'))
+            record_history(db, res_id, 'cancelled', 'Customer cancelled reservation', customer_id=uid)
+            release_slot(db, res)
             db.commit()
+            request_notify()
             flash('Reservation cancelled.', 'info')
             return redirect(url_for('bookings'))
 
@@ -374,34 +1026,38 @@ def edit_reservation(res_id):
             return redirect(url_for('edit_reservation', res_id=res_id))
         # --- KẾT THÚC VALIDATION NGÀY THÁNG ---
 
-        table_id = res['table_id']
-        if table_id:
-            cap = db.execute("SELECT capacity FROM Tables WHERE table_id = ?", (table_id,)).fetchone()['capacity']
-            if guests > cap:
-                table_id = None
-
-        if not table_id:
-            candidate = db.execute("""
-                SELECT t.table_id FROM Tables t
-                WHERE t.restaurant_id = ? AND t.capacity >= ?
-                AND t.table_id NOT IN (
-                    SELECT table_id FROM Reservations r
-                    WHERE r.reservation_date = ? AND r.reservation_time = ? AND r.status IN ('pending','confirmed') AND r.reservation_id != ?
-                )
-                ORDER BY t.capacity ASC
-                LIMIT 1
-            """, (res['restaurant_id'], guests, date, time, res_id)).fetchone()
-            if candidate:
-                table_id = candidate['table_id']
-            else:
-                flash('No available table for updated time/party size.', 'danger')
-                return redirect(url_for('edit_reservation', res_id=res_id))
-
-        db.execute("UPDATE Reservations SET reservation_date = ?, reservation_time = ?, guests = ?, table_id = ?, status = 'pending' WHERE reservation_id = ?",
-                   (date, time, guests, table_id, res_id))
-        db.execute("INSERT INTO ReservationHistory (reservation_id, action, action_by_customer, note) VALUES (?, 'modified', ?, ?)",
-                   (res_id, uid, 'Customer modified reservation'))
-        db.commit()
+        # Khóa ghi từ lúc chọn bàn tới lúc commit (như khi đặt mới)
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            # Giữ (các) bàn hiện tại nếu vẫn đủ chỗ và còn trống ở khung giờ mới, ngược lại xếp lại bằng assignment.py
+            table_ids = [row['table_id'] for row in db.execute(
+                "SELECT table_id FROM ReservationTables WHERE reservation_id = ?", (res_id,))]
+            if not table_ids and res['table_id']:
+                table_ids = [res['table_id']]
+            if table_ids:
+                cap = db.execute(f"SELECT SUM(capacity) FROM Tables WHERE table_id IN ({', '.join('?' * len(table_ids))})",
+                                 table_ids).fetchone()[0] or 0
+                if guests > cap or busy_tables(db, date, time, exclude_reservation=res_id) & set(table_ids):
+                    table_ids = None
+
+            if not table_ids:
+                table_ids = assign_tables(db, res['restaurant_id'], date, time, guests, exclude_reservation=res_id)
+                if not table_ids:
+                    db.rollback()
+                    flash('No available table for updated time/party size.', 'danger')
+                    return redirect(url_for('edit_reservation', res_id=res_id))
+
+            db.execute("UPDATE Reservations SET reservation_date = ?, reservation_time = ?, guests = ?, status = 'pending' WHERE reservation_id = ?",
+                       (date, time, guests, res_id))
+            save_assignment(db, res_id, table_ids)
+            record_history(db, res_id, 'modified', 'Customer modified reservation', customer_id=uid)
+            if (str(res['reservation_date']), res['reservation_time']) != (date, time):
+                release_slot(db, res)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        request_notify()
         flash('Reservation updated.', 'success')
         return redirect(url_for('bookings'))
 
@@ -412,56 +1068,60 @@ def edit_reservation(res_id):
 # -----------------------
 # Admin routes
 # -----------------------
-@app.route('/admin')
+@web.route('/admin')
 @login_required(role='admin')
 def admin_dashboard():
-    db = get_db()
-
-    # Thống kê số lượt đặt bàn mới trong ngày
-    new_bookings_today = db.execute(
-        "SELECT COUNT(*) as count FROM Reservations WHERE DATE(created_at) = DATE('now')"
-    ).fetchone()['count']
-
-    # Thống kê tổng số khách hàng
-    total_customers = db.execute(
-        "SELECT COUNT(*) as count FROM Customers"
-    ).fetchone()['count']
-    
-    # Thống kê tổng số nhà hàng
-    total_restaurants = db.execute(
-        "SELECT COUNT(*) as count FROM Restaurants"
-    ).fetchone()['count']
-
-    # Top 5 nhà hàng được đặt nhiều nhất
-    top_restaurants = db.execute("""
-        SELECT r.name, COUNT(res.reservation_id) as booking_count
-        FROM Restaurants r
-        LEFT JOIN Reservations res ON r.restaurant_id = res.restaurant_id
-        GROUP BY r.restaurant_id
-        ORDER BY booking_count DESC
-        LIMIT 5
-    """).fetchall()
-
-    stats = {
-        'new_bookings_today': new_bookings_today,
-        'total_customers': total_customers,
-        'total_restaurants': total_restaurants,
-        'top_restaurants': top_restaurants
-    }
+    # Đọc từ các bảng thống kê do trigger duy trì (xem stats.py), không quét Reservations.
+    # Mặc định lấy từ bản chụp dùng chung do luồng nền làm mới, request không phải chờ.
+    if current_app.config['DASHBOARD_SNAPSHOT_SECONDS']:
+        stats = get_dashboard_snapshot().get()
+    else:
+        stats = get_dashboard_stats(get_db())
 
     return render_template('admin_dashboard.html', stats=stats)
 
+# Admin: booking reports (chỉ đọc từ rollup, xem analytics.py)
+@web.route('/admin/reports')
+@login_required(role='admin')
+def admin_reports():
+    db = get_db()
+    now = datetime.now()
+    date_from = request.args.get('from') or (now - timedelta(days=30)).strftime('%Y-%m-%d')
+    date_to = request.args.get('to') or (now + timedelta(days=30)).strftime('%Y-%m-%d')
+    granularity = 'hour' if request.args.get('granularity') == 'hour' else 'day'
+    rid = request.args.get('restaurant_id', type=int)
+
+    rows = booking_report(db, date_from, date_to, rid, granularity)
+    totals = {key: sum(r[key] for r in rows) for key in ('bookings', 'guests', 'cancellations', 'rejections')}
+    totals['cancellation_rate'] = totals['cancellations'] / totals['bookings'] if totals['bookings'] else 0.0
+    occupancy = occupancy_report(db, rid, date_from, date_to) if rid else []
+    restaurants = db.execute("SELECT restaurant_id, name FROM Restaurants WHERE deleted_at IS NULL ORDER BY name").fetchall()
+    return render_template('admin_reports.html', rows=rows, totals=totals, occupancy=occupancy,
+                           restaurants=restaurants, restaurant_id=rid, date_from=date_from, date_to=date_to,
+                           granularity=granularity, pending=pending_rows(db))
+
+@web.route('/admin/reports/refresh', methods=['POST'])
+@login_required(role='admin')
+def admin_refresh_reports():
+    # Bắt kịp một lượng nhỏ dữ liệu mới; lượng lớn hơn do `python analytics.py --refresh` xử lý
+    processed = refresh_rollups(get_db(), max_rows=current_app.config['REPORT_REFRESH_ROWS'])
+    flash(f'Rolled up {processed} new rows.', 'success')
+    return redirect(url_for('admin_reports', **{key: request.form[key] for key in
+                                                 ('restaurant_id', 'from', 'to', 'granularity')
+                                                 if request.form.get(key)}))
+
 # Admin: list restaurants
-@app.route('/admin/restaurants')
+@web.route('/admin/restaurants')
 @login_required(role='admin')
 def admin_restaurants():
     db = get_db()
-    rows = db.execute("SELECT * FROM Restaurants ORDER BY name").fetchall()
-    return render_template('admin_restaurants.html', restaurants=rows)
+    rows = db.execute("SELECT * FROM Restaurants WHERE deleted_at IS NULL ORDER BY name").fetchall()
+    deleting = db.execute("SELECT COUNT(*) FROM PendingDeletions WHERE finished_at IS NULL").fetchone()[0]
+    return render_template('admin_restaurants.html', restaurants=rows, deleting=deleting)
 
 # Admin: add or edit restaurant
-@app.route('/admin/restaurant/new', methods=['GET', 'POST'])
-@app.route('/admin/restaurant/<int:rid>/edit', methods=['GET', 'POST'])
+@web.route('/admin/restaurant/new', methods=['GET', 'POST'])
+@web.route('/admin/restaurant/<int:rid>/edit', methods=['GET', 'POST'])
 @login_required(role='admin')
 def admin_restaurant_form(rid=None):
     db = get_db()
@@ -488,48 +1148,181 @@ def admin_restaurant_form(rid=None):
 
     restaurant = None
     if rid:
-        restaurant = db.execute("SELECT * FROM Restaurants WHERE restaurant_id = ?", (rid,)).fetchone()
+        restaurant = db.execute("SELECT * FROM Restaurants WHERE restaurant_id = ? AND deleted_at IS NULL", (rid,)).fetchone()
     return render_template('admin_restaurant_form.html', restaurant=restaurant)
 # Admin: delete
-@app.route('/admin/restaurant/<int:rid>/delete', methods=['POST'])
+@web.route('/admin/restaurant/<int:rid>/delete', methods=['POST'])
 @login_required(role='admin')
 def admin_restaurant_delete(rid):
     db = get_db()
-    db.execute("DELETE FROM Restaurants WHERE restaurant_id = ?", (rid,))
+    # Ẩn ngay, còn bàn/lượt đặt/lịch sử được purge.py xóa dần trên luồng nền
+    if schedule_deletion(db, 'restaurant', rid, session['user']) is None:
+        flash('Restaurant not found.', 'danger')
+        return redirect(url_for('admin_restaurants'))
     db.commit()
-    flash('Restaurant deleted.', 'info')
+    request_purge()
+    flash('Restaurant deleted. Its tables and reservations are being removed in the background.', 'info')
     return redirect(url_for('admin_restaurants'))
 
+# Admin: tiến độ các lần xóa khách/nhà hàng
+@web.route('/admin/deletions')
+@login_required(role='admin')
+def admin_deletions():
+    return render_template('admin_deletions.html', deletions=deletion_progress(get_db()))
+
+
+# Admin: nhật ký câu SQL chậm, gộp theo dạng câu lệnh
+@web.route('/admin/slow-queries')
+@login_required(role='admin')
+def admin_slow_queries():
+    entries = read_entries(current_app.config['SLOW_QUERY_LOG'])
+    return render_template('admin_slow_queries.html', shapes=summarize(entries), entries=entries[:50],
+                           threshold=current_app.config['SLOW_QUERY_MS'])
+
 # Admin: manage reservations
-@app.route('/admin/reservations')
+@web.route('/admin/reservations')
 @login_required(role='admin')
 def admin_reservations():
     db = get_db()
-    rows = db.execute("""
-        SELECT r.*, c.username, rest.name as restaurant_name, t.table_number
-        FROM Reservations r
+    where, params = reservation_filters(request.args)
+    show_archived = request.args.get('archived') == '1'
+    rows = db.execute(f"""
+        SELECT r.*, c.username, rest.name as restaurant_name, t.table_number, {COMBINED_TABLES}
+        FROM {reservations_source(show_archived)} r
         JOIN Customers c ON r.customer_id = c.customer_id
         JOIN Restaurants rest ON r.restaurant_id = rest.restaurant_id
         LEFT JOIN Tables t ON r.table_id = t.table_id
+        WHERE {where} AND c.deleted_at IS NULL AND rest.deleted_at IS NULL
         ORDER BY r.reservation_date DESC, r.reservation_time DESC
-    """).fetchall()
-    return render_template('admin_reservations.html', reservations=rows)
+    """, params).fetchall()
+    restaurants = db.execute("SELECT restaurant_id, name FROM Restaurants WHERE deleted_at IS NULL ORDER BY name").fetchall()
+    return render_template('admin_reservations.html', reservations=rows, restaurants=restaurants,
+                           filters=filter_args(request.args), bulk_statuses=BULK_STATUSES,
+                           show_archived=show_archived)
 
-@app.route('/admin/reservation/<int:res_id>/update', methods=['POST'])
+@web.route('/admin/reservation/<int:res_id>/update', methods=['POST'])
 @login_required(role='admin')
 def admin_update_reservation(res_id):
     new_status = request.form['status']
     admin_id = session['user']
     db = get_db()
+    # Chỉ hủy/từ chối mới làm trống bàn cho danh sách chờ
+    freed = None
+    if new_status in ('rejected', 'cancelled'):
+        freed = db.execute("SELECT * FROM Reservations WHERE reservation_id = ?", (res_id,)).fetchone()
     db.execute("UPDATE Reservations SET status = ? WHERE reservation_id = ?", (new_status, res_id))
-    db.execute("INSERT INTO ReservationHistory (reservation_id, action, action_by_admin, note) VALUES (?, ?, ?, ?)",
-               (res_id, f"status:{new_status}", admin_id, f"Admin set status to {new_status}"))
+    record_history(db, res_id, f"status:{new_status}", f"Admin set status to {new_status}", admin_id=admin_id)
+    if freed:
+        release_slot(db, freed)
     db.commit()
+    request_notify()
     flash('Reservation status updated.', 'success')
     return redirect(url_for('admin_reservations'))
 
+# Admin: đổi trạng thái hàng loạt
+BULK_STATUSES = ('confirmed', 'rejected', 'completed')
+# Số id tối đa trong một câu IN (...), dưới giới hạn biến của SQLite
+BULK_CHUNK_SIZE = 500
+
+def filter_args(args):
+    """Các bộ lọc đang dùng trên trang admin_reservations (để giữ lại qua form và redirect)."""
+    return {key: args.get(key) for key in ('restaurant_id', 'date', 'current_status') if args.get(key)}
+
+def reservation_filters(args):
+    """Điều kiện WHERE (trên bí danh r) và tham số tương ứng với bộ lọc restaurant_id/date/current_status."""
+    clauses, params = ["1=1"], []
+    rid = args.get('restaurant_id', type=int)
+    if rid:
+        clauses.append("r.restaurant_id = ?")
+        params.append(rid)
+    if args.get('date'):
+        clauses.append("r.reservation_date = ?")
+        params.append(args.get('date'))
+    if args.get('current_status'):
+        clauses.append("r.status = ?")
+        params.append(args.get('current_status'))
+    return " AND ".join(clauses), params
+
+def bulk_update_status(db, reservation_ids, new_status, admin_id):
+    """Đổi trạng thái các lượt đặt (bỏ qua lượt đã ở trạng thái đó), ghi lịch sử; trả về số dòng đã đổi."""
+    changed, freed = [], set()
+    for start in range(0, len(reservation_ids), BULK_CHUNK_SIZE):
+        chunk = reservation_ids[start:start + BULK_CHUNK_SIZE]
+        marks = ", ".join("?" * len(chunk))
+        for row in db.execute(f"""
+            SELECT reservation_id, restaurant_id, reservation_date, reservation_time, status FROM Reservations
+            WHERE reservation_id IN ({marks}) AND status != ?
+        """, (*chunk, new_status)):
+            changed.append(row['reservation_id'])
+            if new_status == 'rejected' and row['status'] in ('pending', 'confirmed'):
+                freed.add((row['restaurant_id'], str(row['reservation_date']), row['reservation_time']))
+    for start in range(0, len(changed), BULK_CHUNK_SIZE):
+        chunk = changed[start:start + BULK_CHUNK_SIZE]
+        marks = ", ".join("?" * len(chunk))
+        db.execute(f"UPDATE Reservations SET status = ? WHERE reservation_id IN ({marks})", (new_status, *chunk))
+    record_history_many(db, [
+        history_event(res_id, f"status:{new_status}", f"Admin set status to {new_status} (bulk)", admin_id=admin_id)
+        for res_id in changed
+    ])
+    # Mỗi khung giờ vừa trống được ghép với danh sách chờ một lần
+    for rid, date, time in sorted(freed):
+        match_waitlist(db, rid, date, time, current_app.config['WAITLIST_MODE'], record=record_history_many)
+    return len(changed)
+
+@web.route('/admin/reservations/bulk', methods=['POST'])
+@login_required(role='admin')
+def admin_bulk_update_reservations():
+    new_status = request.form.get('status')
+    filters = filter_args(request.form)
+    if new_status not in BULK_STATUSES:
+        flash('Invalid status for bulk update.', 'danger')
+        return redirect(url_for('admin_reservations', **filters))
+
+    db = get_db()
+    if request.form.get('scope') == 'filter':
+        if not filters:
+            flash('Choose at least one filter before updating every matching reservation.', 'danger')
+            return redirect(url_for('admin_reservations'))
+        where, params = reservation_filters(request.form)
+    else:
+        reservation_ids = [int(x) for x in request.form.getlist('reservation_ids') if x.isdigit()]
+        if not reservation_ids:
+            flash('No reservations selected.', 'warning')
+            return redirect(url_for('admin_reservations', **filters))
+
+    # Giữ khóa ghi từ lúc chọn dòng tới lúc commit, để tập dòng không đổi giữa chừng
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        if request.form.get('scope') == 'filter':
+            reservation_ids = [row[0] for row in db.execute(
+                f"SELECT r.reservation_id FROM Reservations r WHERE {where}", params)]
+        changed = bulk_update_status(db, reservation_ids, new_status, session['user'])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    request_notify()
+    flash(f'{changed} reservation(s) set to {new_status}.', 'success')
+    return redirect(url_for('admin_reservations', **filters))
+
+@web.route('/admin/reservations/reoptimize', methods=['POST'])
+@login_required(role='admin')
+def admin_reoptimize_tables():
+    """Xếp lại bàn cho các lượt 'pending' của một nhà hàng trong một ngày (theo bộ lọc đang chọn)."""
+    filters = filter_args(request.form)
+    rid = request.form.get('restaurant_id', type=int)
+    date = request.form.get('date')
+    if not rid or not date:
+        flash('Choose a restaurant and a date to re-optimize table assignments.', 'warning')
+        return redirect(url_for('admin_reservations', **filters))
+    result = reoptimize_day(get_db(), rid, date, record=record_history_many)
+    flash(f"Re-optimized {result['pending']} pending reservation(s): {result['moved']} moved, "
+          f"{result['seated_before']} -> {result['seated_after']} seated, "
+          f"{result['waste_before']} -> {result['waste_after']} spare seats.", 'success')
+    return redirect(url_for('admin_reservations', **filters))
+
 # # Admin: manage users (simple listing)
-# @app.route('/admin/users')
+# @web.route('/admin/users')
 # @login_required(role='admin')
 # def admin_users():
 #     db = get_db()
@@ -539,14 +1332,15 @@ def admin_update_reservation(res_id):
 # -----------------------
 # Admin: Manage Users
 # -----------------------
-@app.route('/admin/users')
+@web.route('/admin/users')
 @login_required(role='admin')
 def admin_manage_users():
     db = get_db()
-    users = db.execute("SELECT * FROM Customers ORDER BY username ASC").fetchall()
-    return render_template('admin_users.html', users=users)
+    users = db.execute("SELECT * FROM Customers WHERE deleted_at IS NULL ORDER BY username ASC").fetchall()
+    deleting = db.execute("SELECT COUNT(*) FROM PendingDeletions WHERE finished_at IS NULL").fetchone()[0]
+    return render_template('admin_users.html', users=users, deleting=deleting)
 
-@app.route('/admin/user/<int:uid>/edit', methods=['GET', 'POST'])
+@web.route('/admin/user/<int:uid>/edit', methods=['GET', 'POST'])
 @login_required(role='admin')
 def admin_edit_user(uid):
     db = get_db()
@@ -575,32 +1369,36 @@ def admin_edit_user(uid):
                 flash('That email is already in use by another account.', 'danger')
 
     # For GET request or if there was an error
-    user = db.execute("SELECT * FROM Customers WHERE customer_id = ?", (uid,)).fetchone()
+    user = db.execute("SELECT * FROM Customers WHERE customer_id = ? AND deleted_at IS NULL", (uid,)).fetchone()
     if not user:
         flash('User not found.', 'danger')
         return redirect(url_for('admin_manage_users'))
     return render_template('admin_edit_user.html', user=user)
 
-@app.route('/admin/user/<int:uid>/delete', methods=['POST'])
+@web.route('/admin/user/<int:uid>/delete', methods=['POST'])
 @login_required(role='admin')
 def admin_delete_user(uid):
     db = get_db()
 
-    db.execute("DELETE FROM Customers WHERE customer_id = ?", (uid,))
+    # Ẩn ngay, còn lượt đặt và lịch sử của khách được purge.py xóa dần trên luồng nền
+    if schedule_deletion(db, 'customer', uid, session['user']) is None:
+        flash('User not found.', 'danger')
+        return redirect(url_for('admin_manage_users'))
     db.commit()
+    request_purge()
     flash('User account has been deleted.', 'info')
     return redirect(url_for('admin_manage_users'))
 
 # -----------------------
 # Admin: Manage Tables
 # -----------------------
-@app.route('/admin/restaurant/<int:rid>/tables', methods=['GET', 'POST'])
+@web.route('/admin/restaurant/<int:rid>/tables', methods=['GET', 'POST'])
 @login_required(role='admin')
 def admin_manage_tables(rid):
     db = get_db()
     
     # Lấy thông tin nhà hàng để hiển thị tên
-    restaurant = db.execute("SELECT * FROM Restaurants WHERE restaurant_id = ?", (rid,)).fetchone()
+    restaurant = db.execute("SELECT * FROM Restaurants WHERE restaurant_id = ? AND deleted_at IS NULL", (rid,)).fetchone()
     if not restaurant:
         flash('Restaurant not found.', 'danger')
         return redirect(url_for('admin_restaurants'))
@@ -613,8 +1411,10 @@ def admin_manage_tables(rid):
         if not table_number or capacity <= 0:
             flash('Table number and capacity are required.', 'danger')
         else:
-            db.execute("INSERT INTO Tables (restaurant_id, table_number, capacity) VALUES (?, ?, ?)",
-                       (rid, table_number, capacity))
+            zone = request.form.get('zone', '').strip() or None
+            db.execute("INSERT INTO Tables (restaurant_id, table_number, capacity, zone) VALUES (?, ?, ?, ?)",
+                       (rid, table_number, capacity, zone))
+            bump_layout_version(db, rid)
             db.commit()
             flash('New table added successfully.', 'success')
         
@@ -625,7 +1425,7 @@ def admin_manage_tables(rid):
     
     return render_template('admin_manage_tables.html', tables=tables, restaurant=restaurant)
 
-@app.route('/admin/table/<int:tid>/delete', methods=['POST'])
+@web.route('/admin/table/<int:tid>/delete', methods=['POST'])
 @login_required(role='admin')
 def admin_delete_table(tid):
     db = get_db()
@@ -634,6 +1434,7 @@ def admin_delete_table(tid):
     table = db.execute("SELECT restaurant_id FROM Tables WHERE table_id = ?", (tid,)).fetchone()
     if table:
         db.execute("DELETE FROM Tables WHERE table_id = ?", (tid,))
+        bump_layout_version(db, table['restaurant_id'])
         db.commit()
         flash('Table deleted.', 'info')
         return redirect(url_for('admin_manage_tables', rid=table['restaurant_id']))
@@ -641,9 +1442,57 @@ def admin_delete_table(tid):
     flash('Table not found.', 'danger')
     return redirect(url_for('admin_restaurants'))
 
+@web.route('/admin/restaurant/<int:rid>/tables/layout', methods=['POST'])
+@login_required(role='admin')
+def admin_table_layout(rid):
+    """Nhập cả sơ đồ bàn từ CSV: action=preview chỉ hiển thị thay đổi, action=apply áp dụng trong một giao dịch."""
+    db = get_db()
+    restaurant = db.execute("SELECT * FROM Restaurants WHERE restaurant_id = ? AND deleted_at IS NULL", (rid,)).fetchone()
+    if not restaurant:
+        flash('Restaurant not found.', 'danger')
+        return redirect(url_for('admin_restaurants'))
+
+    upload = request.files.get('layout_file')
+    if upload and upload.filename:
+        text = upload.read().decode('utf-8-sig', errors='replace')
+    else:
+        text = request.form.get('layout', '')
+    try:
+        rows = parse_layout(text)
+    except ValueError as exc:
+        flash(f'Invalid layout: {exc}', 'danger')
+        return redirect(url_for('admin_manage_tables', rid=rid))
+    if not rows:
+        flash('The layout is empty. Paste or upload at least one table_number,capacity line.', 'danger')
+        return redirect(url_for('admin_manage_tables', rid=rid))
+
+    if request.form.get('action') == 'apply':
+        diff = apply_layout(db, rid, rows)
+        flash(f'Layout applied: {len(diff.insert)} added, {len(diff.update)} updated, '
+              f'{len(diff.delete)} removed.', 'success')
+        return redirect(url_for('admin_manage_tables', rid=rid))
+
+    diff = diff_layout(db, rid, rows)
+    affected = affected_reservations(db, diff, datetime.now().strftime('%Y-%m-%d'))
+    tables = db.execute("SELECT * FROM Tables WHERE restaurant_id = ? ORDER BY table_number", (rid,)).fetchall()
+    return render_template('admin_manage_tables.html', tables=tables, restaurant=restaurant,
+                           layout_text=text, diff=diff, affected=affected)
+
+@web.route('/admin/restaurant/<int:rid>/tables/layout.csv')
+@login_required(role='admin')
+def admin_table_layout_csv(rid):
+    db = get_db()
+    tables = db.execute("SELECT table_number, capacity FROM Tables WHERE restaurant_id = ? ORDER BY table_number",
+                        (rid,)).fetchall()
+    return current_app.response_class(layout_csv(tables), mimetype='text/csv', headers={
+        'Content-Disposition': f'attachment; filename=restaurant-{rid}-tables.csv'})
+
 
 # -----------------------
 # Run app
 # -----------------------
+# App mặc định (cấu hình từ biến môi trường); production chạy qua wsgi.py
+app = create_app()
+
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
@@ -0,0 +1,165 @@
+"""
+Chuyển các lượt đặt đã kết thúc và quá cũ ra khỏi bảng Reservations.
+
+Lượt đặt 'completed' / 'cancelled' / 'rejected' có ngày đặt cũ hơn ARCHIVE_AFTER_DAYS ngày được
+chuyển (kèm các dòng ReservationHistory của nó) sang ArchivedReservations /
+ArchivedReservationHistory trong cùng file CSDL. Mỗi khối tối đa chunk_size lượt đặt là một giao
+dịch ngắn, nên có thể chạy khi ứng dụng đang phục vụ:
+    python archive.py --days 365
+Bảng thống kê dashboard và rollup báo cáo vẫn tính cả các lượt đặt đã lưu trữ.
+"""
+import argparse
+import sqlite3
+import sys
+import time
+from datetime import date, timedelta
+
+try:
+    from .analytics import create_analytics_schema, refresh_rollups
+    from .stats import create_stats_schema
+except ImportError:  # chạy trực tiếp: python archive.py
+    from analytics import create_analytics_schema, refresh_rollups
+    from stats import create_stats_schema
+
+ARCHIVE_AFTER_DAYS = 365
+CHUNK_SIZE = 500
+# Chỉ lưu trữ lượt đặt không còn thay đổi được nữa
+FINISHED_STATUSES = ('completed', 'cancelled', 'rejected')
+
+RESERVATION_COLUMNS = ("reservation_id, customer_id, restaurant_id, table_id, reservation_date, "
+                       "reservation_time, guests, status, created_at")
+HISTORY_COLUMNS = "history_id, reservation_id, action, action_by_admin, action_by_customer, action_time, note"
+
+ARCHIVE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ArchivedReservations (
+    reservation_id  INTEGER PRIMARY KEY,
+    customer_id     INTEGER NOT NULL,
+    restaurant_id   INTEGER NOT NULL,
+    table_id        INTEGER,
+    reservation_date DATE NOT NULL,
+    reservation_time TEXT NOT NULL,
+    guests          INTEGER NOT NULL,
+    status          TEXT,
+    created_at      DATE,
+    archived_at     DATE DEFAULT (DATE('now')),
+    FOREIGN KEY (customer_id) REFERENCES Customers(customer_id) ON DELETE CASCADE,
+    FOREIGN KEY (restaurant_id) REFERENCES Restaurants(restaurant_id) ON DELETE CASCADE,
+    FOREIGN KEY (table_id) REFERENCES Tables(table_id) ON DELETE SET NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_archived_reservations_customer ON ArchivedReservations (customer_id, reservation_date);
+CREATE INDEX IF NOT EXISTS idx_archived_reservations_restaurant ON ArchivedReservations (restaurant_id, reservation_date);
+
+CREATE TABLE IF NOT EXISTS ArchivedReservationHistory (
+    history_id     INTEGER PRIMARY KEY,
+    reservation_id INTEGER NOT NULL,
+    action         TEXT NOT NULL,
+    action_by_admin INTEGER,
+    action_by_customer INTEGER,
+    action_time    TIMESTAMP,
+    note           TEXT,
+    FOREIGN KEY (reservation_id) REFERENCES ArchivedReservations(reservation_id) ON DELETE CASCADE,
+    FOREIGN KEY (action_by_admin) REFERENCES Admins(admin_id) ON DELETE SET NULL,
+    FOREIGN KEY (action_by_customer) REFERENCES Customers(customer_id) ON DELETE SET NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_archived_history_reservation ON ArchivedReservationHistory (reservation_id);
+"""
+
+
+def create_archive_schema(db):
+    db.executescript(ARCHIVE_SCHEMA)
+
+
+def reservations_source(include_archived=False):
+    """
+    Nguồn dữ liệu lượt đặt cho mệnh đề FROM (đặt bí danh phía sau, vd. "FROM {src} r").
+    Có thêm cột archived (0/1) để giao diện phân biệt dòng đã lưu trữ.
+    """
+    if not include_archived:
+        return "(SELECT *, 0 AS archived FROM Reservations)"
+    return (f"(SELECT {RESERVATION_COLUMNS}, 0 AS archived FROM Reservations"
+            f" UNION ALL SELECT {RESERVATION_COLUMNS}, 1 AS archived FROM ArchivedReservations)")
+
+
+def archive_chunk(db, cutoff, chunk_size=CHUNK_SIZE):
+    """Chuyển tối đa chunk_size lượt đặt đã kết thúc, có ngày < cutoff, trong một giao dịch. Trả về số lượt."""
+    marks = ", ".join("?" * len(FINISHED_STATUSES))
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        ids = [row[0] for row in db.execute(f"""
+            SELECT reservation_id FROM Reservations
+            WHERE reservation_date < ? AND status IN ({marks})
+            LIMIT ?
+        """, (cutoff, *FINISHED_STATUSES, chunk_size))]
+        if ids:
+            id_marks = ", ".join("?" * len(ids))
+            db.execute(f"""
+                INSERT INTO ArchivedReservations ({RESERVATION_COLUMNS})
+                SELECT {RESERVATION_COLUMNS} FROM Reservations WHERE reservation_id IN ({id_marks})
+            """, ids)
+            db.execute(f"""
+                INSERT INTO ArchivedReservationHistory ({HISTORY_COLUMNS})
+                SELECT {HISTORY_COLUMNS} FROM ReservationHistory WHERE reservation_id IN ({id_marks})
+            """, ids)
+            # ReservationHistory bị xóa theo ON DELETE CASCADE
+            db.execute(f"DELETE FROM Reservations WHERE reservation_id IN ({id_marks})", ids)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return len(ids)
+
+
+def archive_reservations(db, days=ARCHIVE_AFTER_DAYS, today=None, chunk_size=CHUNK_SIZE, pause=0.0, max_chunks=None):
+    """
+    Lưu trữ mọi lượt đặt đã kết thúc cũ hơn `days` ngày (hoặc tối đa max_chunks khối).
+    pause là số giây nghỉ giữa các khối. Trả về tổng số lượt đặt đã chuyển.
+    """
+    # Rollup phải thấy dòng (và lịch sử của nó) trước khi dòng rời bảng gốc
+    refresh_rollups(db)
+    cutoff = ((today or date.today()) - timedelta(days=days)).isoformat()
+    total = chunks = 0
+    while max_chunks is None or chunks < max_chunks:
+        moved = archive_chunk(db, cutoff, chunk_size)
+        total += moved
+        chunks += 1
+        if moved < chunk_size:
+            break
+        if pause:
+            time.sleep(pause)
+    return total
+
+
+def main(argv=None):
+    # Import trong hàm: init_database import module này khi nạp
+    try:
+        from .init_database import DB_PATH
+    except ImportError:  # chạy trực tiếp: python archive.py
+        from init_database import DB_PATH
+    parser = argparse.ArgumentParser(description="Move old finished reservations into the archive tables.")
+    parser.add_argument('--db', default=DB_PATH, help="database file")
+    parser.add_argument('--days', type=int, default=ARCHIVE_AFTER_DAYS, help="archive reservations older than DAYS")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--pause', type=float, default=0.05, help="seconds to sleep between chunks")
+    parser.add_argument('--max-chunks', type=int, help="stop after this many chunks")
+    args = parser.parse_args(argv)
+
+    db = sqlite3.connect(args.db, timeout=30)
+    db.execute("PRAGMA foreign_keys = ON;")
+    try:
+        # CSDL cũ: tạo bảng lưu trữ và trigger thống kê mới trước khi xóa dòng khỏi Reservations
+        create_archive_schema(db)
+        create_stats_schema(db)
+        create_analytics_schema(db)
+        started = time.perf_counter()
+        moved = archive_reservations(db, args.days, chunk_size=args.chunk_size, pause=args.pause,
+                                     max_chunks=args.max_chunks)
+    finally:
+        db.close()
+    print(f"Archived {moved} reservations in {time.perf_counter() - started:.2f}s.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""
+File tĩnh có dấu vân tay (fingerprint) để trình duyệt cache vô thời hạn.
+
+asset_url('css/app.css') trả về /assets/css/app.<12 ký tự sha256>.css; route /assets/... của app.py
+chỉ phục vụ URL có đúng hash của nội dung hiện tại, kèm Cache-Control: public, max-age=1 năm, immutable.
+Sửa file thì hash đổi, trang HTML trỏ sang URL mới nên không bao giờ dùng nhầm bản cũ.
+
+Bulma được phục vụ từ static/vendor/ nếu đã tải về (python assets.py fetch, chạy một lần khi triển khai);
+chưa có file thì trang vẫn dùng CDN như trước.
+"""
+import argparse
+import hashlib
+import os
+import re
+import sys
+import threading
+import urllib.request
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+BULMA_VERSION = '0.9.4'
+BULMA_ASSET = f'vendor/bulma-{BULMA_VERSION}.min.css'
+BULMA_CDN_URL = f'https://cdn.jsdelivr.net/npm/bulma@{BULMA_VERSION}/css/bulma.min.css'
+# Một năm: tối đa mà các trình duyệt/proxy tôn trọng
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+FINGERPRINTED = re.compile(r'^(?P<stem>.+)\.(?P<digest>[0-9a-f]{12})(?P<ext>\.[A-Za-z0-9]+)$')
+
+
+class AssetManifest:
+    """Ánh xạ tên file trong folder <-> tên có hash; hash được tính lại khi file đổi (mtime/size)."""
+
+    def __init__(self, folder=STATIC_DIR):
+        self.folder = folder
+        self._digests = {}
+        self._lock = threading.Lock()
+
+    def digest(self, name):
+        """12 ký tự đầu sha256 của file name; None nếu không có file."""
+        path = os.path.join(self.folder, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        stamp = (st.st_mtime_ns, st.st_size)
+        cached = self._digests.get(name)
+        if cached and cached[0] == stamp:
+            return cached[1]
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(65536), b''):
+                sha.update(chunk)
+        digest = sha.hexdigest()[:12]
+        with self._lock:
+            self._digests[name] = (stamp, digest)
+        return digest
+
+    def fingerprinted(self, name):
+        """'css/app.css' -> 'css/app.<hash>.css'; None nếu không có file."""
+        digest = self.digest(name)
+        if digest is None:
+            return None
+        stem, ext = os.path.splitext(name)
+        return f"{stem}.{digest}{ext}"
+
+    def resolve(self, fingerprinted):
+        """Tên file gốc nếu hash trong tên khớp nội dung hiện tại, ngược lại None."""
+        match = FINGERPRINTED.match(fingerprinted)
+        if not match:
+            return None
+        name = match['stem'] + match['ext']
+        if '..' in name.split('/') or self.digest(name) != match['digest']:
+            return None
+        return name
+
+
+def fetch_bulma(folder=STATIC_DIR, url=BULMA_CDN_URL, timeout=30):
+    """Tải Bulma về folder/BULMA_ASSET; trả về đường dẫn file."""
+    path = os.path.join(folder, BULMA_ASSET)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        data = response.read()
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage fingerprinted static assets.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('fetch', help=f"download Bulma {BULMA_VERSION} into static/ so pages stop using the CDN")
+    sub.add_parser('list', help="print every static file with its fingerprinted name")
+    args = parser.parse_args(argv)
+
+    manifest = AssetManifest()
+    if args.command == 'fetch':
+        path = fetch_bulma()
+        print(f"Saved {path} as {manifest.fingerprinted(BULMA_ASSET)}")
+        return 0
+    for root, _dirs, files in os.walk(manifest.folder):
+        for filename in sorted(files):
+            name = os.path.relpath(os.path.join(root, filename), manifest.folder).replace(os.sep, '/')
+            print(f"{name} -> {manifest.fingerprinted(name)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,382 @@
+"""
+Xếp bàn cho lượt đặt: chọn bàn đơn hoặc ghép 2-3 bàn cùng khu (Tables.zone, NULL = sảnh chính)
+cho đoàn đông, sao cho giữ lại nhiều sức chứa nhất cho các lượt đặt sau.
+
+Điểm của một phương án (nhỏ hơn là tốt hơn):
+  1. số ghế thừa + COMBINE_PENALTY ghế cho mỗi bàn ghép thêm;
+  2. số phút "chết" tạo ra trên các bàn đó (khoảng trống trước/sau ngắn hơn một lượt ngồi).
+
+Lượt đặt ghép bàn: Reservations.table_id là bàn lớn nhất, ReservationTables chứa đủ mọi bàn.
+reoptimize_day() xếp lại các lượt 'pending' của một nhà hàng trong một ngày (lượt 'confirmed'
+giữ nguyên bàn). So sánh với quy tắc cũ (bàn đơn nhỏ nhất còn trống):
+    python assignment.py --bench --tables 300
+"""
+import argparse
+import random
+import sqlite3
+import sys
+import time
+from bisect import bisect_left, insort
+
+try:
+    from .audit import history_event, insert_history
+except ImportError:  # chạy trực tiếp: python assignment.py
+    from audit import history_event, insert_history
+
+# Mỗi lượt đặt giữ bàn 2 giờ (giống find_available_table)
+SLOT_MINUTES = 120
+# Ghép thêm một bàn chỉ đáng khi tiết kiệm được hơn chừng này ghế
+COMBINE_PENALTY = 2
+
+ASSIGNMENT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ReservationTables (
+    reservation_id INTEGER NOT NULL,
+    table_id       INTEGER NOT NULL,
+    PRIMARY KEY (reservation_id, table_id),
+    FOREIGN KEY (reservation_id) REFERENCES Reservations(reservation_id) ON DELETE CASCADE,
+    FOREIGN KEY (table_id) REFERENCES Tables(table_id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_reservation_tables_table ON ReservationTables (table_id);
+"""
+
+# Bàn đang bận trong khung 2 giờ bắt đầu lúc time của ngày date (kể cả bàn ghép).
+# Dùng trong "table_id NOT IN (...)"; tham số: (date, time, time)
+BUSY_TABLES = """
+    SELECT COALESCE(rt.table_id, r.table_id) FROM Reservations r
+    LEFT JOIN ReservationTables rt ON rt.reservation_id = r.reservation_id
+    WHERE COALESCE(rt.table_id, r.table_id) IS NOT NULL AND r.reservation_date = ?
+    AND r.status IN ('pending', 'confirmed')
+    AND STRFTIME('%H:%M', r.reservation_time, '+2 hours') > ?
+    AND r.reservation_time < STRFTIME('%H:%M', ?, '+2 hours')
+"""
+
+
+def create_assignment_schema(db):
+    db.executescript(ASSIGNMENT_SCHEMA)
+
+
+def busy_tables(db, date, res_time, exclude_reservation=None):
+    """Tập table_id đang bận (BUSY_TABLES) trong khung 2 giờ bắt đầu lúc res_time, bỏ qua exclude_reservation."""
+    return {row[0] for row in db.execute(BUSY_TABLES + " AND r.reservation_id IS NOT ?",
+                                         (date, res_time, res_time, exclude_reservation))}
+
+
+def to_minutes(hhmm):
+    hours, minutes = str(hhmm)[:5].split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+def _capacity_combos(counts, guests):
+    """
+    Các bộ 2 hoặc 3 sức chứa (không dùng quá số bàn sẵn có của mỗi loại) đủ chỗ cho guests;
+    với mỗi tiền tố chỉ sinh bộ có tổng nhỏ nhất.
+    """
+    caps = sorted(counts)
+    n = len(caps)
+    for i in range(n):
+        for j in range(i, n):
+            if j == i and counts[caps[i]] < 2:
+                continue
+            pair = caps[i] + caps[j]
+            if pair >= guests:
+                yield caps[i], caps[j]
+                break  # j lớn hơn chỉ thừa thêm ghế
+            k = bisect_left(caps, guests - pair, j)
+            while k < n and 1 + (k == j) + (k == i) > counts[caps[k]]:
+                k += 1
+            if k < n:
+                yield caps[i], caps[j], caps[k]
+
+
+class DaySchedule:
+    """Bàn của một nhà hàng và các lượt đặt đã xếp trong một ngày (giờ tính bằng phút)."""
+
+    def __init__(self, tables, slot=SLOT_MINUTES):
+        self.slot = slot
+        self.capacity = {}
+        self.zone = {}
+        for table_id, capacity, zone in tables:
+            self.capacity[table_id] = capacity
+            self.zone[table_id] = zone or ''
+        self.busy = {table_id: [] for table_id in self.capacity}  # [(start, reservation_id)] đã sắp xếp
+        self.assigned = {}  # reservation_id -> (start, tables)
+
+    def is_free(self, table_id, start):
+        slots = self.busy[table_id]
+        i = bisect_left(slots, (start - self.slot + 1,))
+        return i == len(slots) or slots[i][0] >= start + self.slot
+
+    def book(self, reservation_id, table_ids, start):
+        for table_id in table_ids:
+            insort(self.busy[table_id], (start, reservation_id))
+        self.assigned[reservation_id] = (start, tuple(table_ids))
+
+    def release(self, reservation_id):
+        start, table_ids = self.assigned.pop(reservation_id)
+        for table_id in table_ids:
+            self.busy[table_id].remove((start, reservation_id))
+
+    def dead_minutes(self, table_id, start):
+        """Số phút trống trước/sau lượt mới quá ngắn để nhận thêm một lượt khác."""
+        slots = self.busy[table_id]
+        i = bisect_left(slots, (start,))
+        dead = 0
+        if i:
+            gap = start - slots[i - 1][0] - self.slot
+            if 0 < gap < self.slot:
+                dead += gap
+        if i < len(slots):
+            gap = slots[i][0] - start - self.slot
+            if 0 < gap < self.slot:
+                dead += gap
+        return dead
+
+    def greedy_fit(self, guests, start):
+        """Quy tắc cũ của find_available_table: bàn đơn nhỏ nhất còn trống."""
+        best = None
+        for table_id, capacity in self.capacity.items():
+            if capacity >= guests and (best is None or capacity < self.capacity[best]) \
+                    and self.is_free(table_id, start):
+                best = table_id
+        return None if best is None else (best,)
+
+    def best_fit(self, guests, start):
+        """Phương án tốt nhất (tuple table_id, bàn lớn nhất trước) hoặc None nếu không xếp được."""
+        best_score, best_tables = None, None
+        zones = {}  # zone -> {capacity: [(dead, table_id)]}
+        for table_id, capacity in self.capacity.items():
+            if not self.is_free(table_id, start):
+                continue
+            dead = self.dead_minutes(table_id, start)
+            if capacity >= guests:
+                score = (capacity - guests, dead)
+                if best_score is None or score < best_score:
+                    best_score, best_tables = score, (table_id,)
+            zones.setdefault(self.zone[table_id], {}).setdefault(capacity, []).append((dead, table_id))
+
+        for groups in zones.values():
+            for tables in groups.values():
+                tables.sort()
+            counts = {capacity: len(tables) for capacity, tables in groups.items()}
+            for combo in _capacity_combos(counts, guests):
+                waste = sum(combo) - guests + COMBINE_PENALTY * (len(combo) - 1)
+                if best_score is not None and waste > best_score[0]:
+                    continue
+                picked, used = [], {}
+                for capacity in combo:
+                    picked.append(groups[capacity][used.get(capacity, 0)])
+                    used[capacity] = used.get(capacity, 0) + 1
+                score = (waste, sum(dead for dead, _ in picked))
+                if best_score is None or score < best_score:
+                    best_score = score
+                    best_tables = tuple(table_id for _, table_id in
+                                        sorted(picked, key=lambda p: -self.capacity[p[1]]))
+        return best_tables
+
+
+def plan_day(schedule, reservations, fit=None):
+    """
+    Xếp lần lượt các (reservation_id, start, guests) vào schedule, đoàn đông trước.
+    Trả về {reservation_id: tuple bàn hoặc None}.
+    """
+    fit = fit or schedule.best_fit
+    plan = {}
+    for res_id, start, guests in sorted(reservations, key=lambda r: (-r[2], r[1], r[0])):
+        tables = fit(guests, start)
+        if tables:
+            schedule.book(res_id, tables, start)
+        plan[res_id] = tables
+    return plan
+
+
+def load_schedule(db, restaurant_id, date, exclude_reservation=None):
+    """DaySchedule của nhà hàng trong ngày và danh sách (reservation_id, status, start, guests, tables)."""
+    schedule = DaySchedule(db.execute(
+        "SELECT table_id, capacity, zone FROM Tables WHERE restaurant_id = ?", (restaurant_id,)))
+    rows = []
+    for res_id, status, res_time, guests, table_id, combined in db.execute("""
+        SELECT r.reservation_id, r.status, r.reservation_time, r.guests, r.table_id,
+               (SELECT GROUP_CONCAT(rt.table_id) FROM ReservationTables rt
+                WHERE rt.reservation_id = r.reservation_id)
+        FROM Reservations r
+        WHERE r.restaurant_id = ? AND r.reservation_date = ? AND r.status IN ('pending', 'confirmed')
+        ORDER BY r.reservation_id
+    """, (restaurant_id, date)):
+        if res_id == exclude_reservation:
+            continue
+        if combined:
+            tables = tuple(int(t) for t in combined.split(','))
+        else:
+            tables = (table_id,) if table_id is not None else ()
+        tables = tuple(t for t in tables if t in schedule.capacity)
+        rows.append((res_id, status, to_minutes(res_time), guests, tables))
+    return schedule, rows
+
+
+def assign_tables(db, restaurant_id, date, res_time, guests, exclude_reservation=None):
+    """Chọn bàn cho một lượt đặt mới (hoặc đang sửa: exclude_reservation). Trả về list table_id hoặc None."""
+    schedule, rows = load_schedule(db, restaurant_id, date, exclude_reservation)
+    for res_id, _, start, _, tables in rows:
+        if tables:
+            schedule.book(res_id, tables, start)
+    tables = schedule.best_fit(guests, to_minutes(res_time))
+    return list(tables) if tables else None
+
+
+def save_assignment(db, reservation_id, table_ids):
+    """Ghi bàn đã xếp cho lượt đặt (chưa commit). Bàn đơn: chỉ Reservations.table_id."""
+    table_ids = list(table_ids or [])
+    db.execute("UPDATE Reservations SET table_id = ? WHERE reservation_id = ?",
+               (table_ids[0] if table_ids else None, reservation_id))
+    db.execute("DELETE FROM ReservationTables WHERE reservation_id = ?", (reservation_id,))
+    if len(table_ids) > 1:
+        db.executemany("INSERT INTO ReservationTables (reservation_id, table_id) VALUES (?, ?)",
+                       [(reservation_id, table_id) for table_id in table_ids])
+
+
+def _plan_score(schedule, guests, plan):
+    """(số lượt đã có bàn, tổng số ghế thừa) của một phương án."""
+    seated = [res_id for res_id, tables in plan.items() if tables]
+    waste = sum(sum(schedule.capacity[t] for t in plan[res_id]) - guests[res_id] for res_id in seated)
+    return len(seated), waste
+
+
+def reoptimize_day(db, restaurant_id, date, record=insert_history):
+    """
+    Xếp lại bàn cho các lượt 'pending' của nhà hàng trong ngày, trong một giao dịch. Phương án mới chỉ
+    được ghi khi mọi lượt đang có bàn vẫn có bàn, và xếp được thêm lượt hoặc bớt ghế thừa.
+    Lịch sử 'reassigned' được ghi qua record(db, events) (app.py truyền record_history_many).
+    """
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        schedule, rows = load_schedule(db, restaurant_id, date)
+        pending, current, guests = [], {}, {}
+        for res_id, status, start, party, tables in rows:
+            if status == 'confirmed':
+                if tables:
+                    schedule.book(res_id, tables, start)
+                continue
+            pending.append((res_id, start, party))
+            current[res_id] = tables or None
+            guests[res_id] = party
+        plan = plan_day(schedule, pending)
+
+        before = _plan_score(schedule, guests, current)
+        after = _plan_score(schedule, guests, plan)
+        keeps_seated = all(plan[res_id] for res_id, tables in current.items() if tables)
+        better = after[0] > before[0] or (after[0] == before[0] and after[1] < before[1])
+        moved = 0
+        if keeps_seated and better:
+            events = []
+            for res_id, tables in plan.items():
+                if set(tables or ()) != set(current[res_id] or ()):
+                    save_assignment(db, res_id, tables)
+                    events.append(history_event(res_id, 'reassigned', 'Tables reassigned by optimizer'))
+            record(db, events)
+            moved = len(events)
+        else:
+            after = before
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return {'pending': len(pending), 'moved': moved,
+            'seated_before': before[0], 'seated_after': after[0],
+            'waste_before': before[1], 'waste_after': after[1]}
+
+
+# -----------------------
+# Benchmark: engine vs. quy tắc cũ
+# -----------------------
+def bench_layout(n_tables, zones=4):
+    mix = [2] * 4 + [4] * 3 + [6] * 2 + [8]
+    return [(i, mix[i % len(mix)], f"Z{i % zones}") for i in range(n_tables)]
+
+
+def bench_requests(rng, n_tables, turns=3.0):
+    """Luồng yêu cầu ngẫu nhiên đủ lấp khoảng `turns` lượt ngồi trên mỗi bàn (11:00-21:00, bước 15 phút)."""
+    parties = [1, 2, 2, 2, 3, 4, 4, 5, 6, 7, 8, 10, 12, 14]
+    return [(i, rng.randrange(11 * 60, 21 * 60 + 1, 15), rng.choice(parties))
+            for i in range(int(n_tables * turns))]
+
+
+def run_bench(n_tables=300, seed=42, turns=3.0):
+    """Trả về {tên: {seated, guests, utilization, us_per_request}} cho greedy, engine, engine + reoptimize."""
+    rng = random.Random(seed)
+    layout = bench_layout(n_tables)
+    requests = bench_requests(rng, n_tables, turns)
+    open_minutes = 21 * 60 + SLOT_MINUTES - 11 * 60
+    total_seats = sum(capacity for _, capacity, _ in layout)
+    results = {}
+
+    def measure(name, schedule, plan, elapsed):
+        seated = [r for r in requests if plan.get(r[0])]
+        results[name] = {
+            'seated': len(seated),
+            'requests': len(requests),
+            'guests': sum(r[2] for r in seated),
+            'utilization': round(sum(r[2] for r in seated) * SLOT_MINUTES / (total_seats * open_minutes), 4),
+            'us_per_request': round(elapsed / len(requests) * 1e6, 1),
+        }
+
+    for name in ('greedy', 'engine'):
+        schedule = DaySchedule(layout)
+        fit = schedule.greedy_fit if name == 'greedy' else schedule.best_fit
+        plan = {}
+        started = time.perf_counter()
+        for res_id, start, guests in requests:  # theo thứ tự đến
+            tables = fit(guests, start)
+            if tables:
+                schedule.book(res_id, tables, start)
+            plan[res_id] = tables
+        measure(name, schedule, plan, time.perf_counter() - started)
+
+    # Xếp lại cả ngày (mọi lượt coi như 'pending'), đoàn đông trước
+    schedule = DaySchedule(layout)
+    started = time.perf_counter()
+    plan = plan_day(schedule, requests)
+    measure('engine+reoptimize', schedule, plan, time.perf_counter() - started)
+    return results
+
+
+def main(argv=None):
+    # Import trong hàm: init_database import module này khi nạp
+    try:
+        from .init_database import DB_PATH
+    except ImportError:  # chạy trực tiếp: python assignment.py
+        from init_database import DB_PATH
+    parser = argparse.ArgumentParser(description="Re-optimize table assignments, or benchmark the engine against the greedy rule.")
+    parser.add_argument('--db', default=DB_PATH, help="database file")
+    parser.add_argument('--restaurant', type=int, help="restaurant id to re-optimize")
+    parser.add_argument('--date', help="reservation date (YYYY-MM-DD) to re-optimize")
+    parser.add_argument('--bench', action='store_true', help="run the simulated benchmark instead")
+    parser.add_argument('--tables', type=int, default=300, help="benchmark: number of tables")
+    parser.add_argument('--turns', type=float, default=3.0, help="benchmark: requests per table")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    if args.bench:
+        results = run_bench(args.tables, args.seed, args.turns)
+        print(f"{'rule':<20}{'seated':>14}{'guests':>8}{'utilization':>13}{'us/request':>12}")
+        for name, r in results.items():
+            print(f"{name:<20}{r['seated']:>7}/{r['requests']:<6}{r['guests']:>8}"
+                  f"{r['utilization']:>13.1%}{r['us_per_request']:>12}")
+        return 0
+
+    if args.restaurant is None or not args.date:
+        parser.error("--restaurant and --date are required unless --bench is given")
+    db = sqlite3.connect(args.db, timeout=30)
+    db.execute("PRAGMA foreign_keys = ON;")
+    try:
+        result = reoptimize_day(db, args.restaurant, args.date)
+    finally:
+        db.close()
+    print(f"{result['pending']} pending reservations, {result['moved']} moved; "
+          f"seated {result['seated_before']} -> {result['seated_after']}, "
+          f"spare seats {result['waste_before']} -> {result['waste_after']}.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
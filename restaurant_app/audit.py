@@ -0,0 +1,124 @@
+"""
+Ghi ReservationHistory (nhật ký thao tác trên lượt đặt).
+
+Hai chế độ bền vững (app.config['AUDIT_MODE']):
+  - 'sync'  : ghi ngay trong giao dịch của request (mặc định, như trước đây).
+  - 'async' : sau khi giao dịch của request commit thành công (app.submit_after_commit), đưa sự
+              kiện vào hàng đợi trong tiến trình; một luồng nền gom lại và ghi theo lô
+              mỗi AUDIT_FLUSH_SECONDS giây. Request lỗi hay rollback thì sự kiện bị bỏ.
+              Khi tiến trình thoát bình thường, drain() ghi nốt phần còn lại nên không mất sự
+              kiện; nếu tiến trình bị kill đột ngột thì các sự kiện còn trong hàng đợi sẽ mất.
+"""
+import atexit
+import logging
+import queue
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+try:
+    from .background import PeriodicWorker
+except ImportError:  # chạy trực tiếp
+    from background import PeriodicWorker
+
+log = logging.getLogger(__name__)
+
+AUDIT_MODES = ('sync', 'async')
+
+INSERT_HISTORY = """
+    INSERT INTO ReservationHistory (reservation_id, action, action_by_admin, action_by_customer, action_time, note)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+
+def history_event(reservation_id, action, note, admin_id=None, customer_id=None):
+    """Một dòng ReservationHistory; thời điểm được lấy lúc sự kiện xảy ra, không phải lúc ghi."""
+    action_time = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    return (reservation_id, action, admin_id, customer_id, action_time, note)
+
+
+def insert_history(db, events):
+    """Ghi thẳng các sự kiện bằng db trong giao dịch hiện tại (mặc định khi không có callback của app)."""
+    db.executemany(INSERT_HISTORY, events)
+
+
+class AuditWriter:
+    """Hàng đợi sự kiện lịch sử và luồng nền ghi chúng theo lô vào db_path."""
+
+    def __init__(self, db_path, flush_interval=1.0, batch_size=500, max_queue=10000):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._flush_lock = threading.Lock()
+        self.worker = PeriodicWorker('audit-writer', flush_interval, self.flush)
+        self.written = 0
+        self.dropped = 0
+        atexit.register(self.drain)
+
+    @property
+    def pending(self):
+        return self._queue.qsize()
+
+    def submit(self, event, db=None):
+        """
+        Đưa một sự kiện vào hàng đợi. Nếu hàng đợi đầy và có db (kết nối của request),
+        ghi thẳng bằng kết nối đó thay vì làm mất sự kiện.
+        """
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            if db is None:
+                raise
+            db.execute(INSERT_HISTORY, event)
+            return
+        self.worker.ensure_started()
+
+    def _take_batch(self):
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def flush(self):
+        """Ghi mọi sự kiện đang chờ, mỗi lô một giao dịch. Trả về số dòng đã ghi."""
+        written = 0
+        with self._flush_lock:
+            batch = self._take_batch()
+            if not batch:
+                return 0
+            db = sqlite3.connect(self.db_path, timeout=30)
+            db.execute("PRAGMA foreign_keys = ON;")
+            try:
+                while batch:
+                    written += self._write_batch(db, batch)
+                    batch = self._take_batch()
+            finally:
+                db.close()
+        self.written += written
+        return written
+
+    def _write_batch(self, db, batch):
+        try:
+            with db:
+                db.executemany(INSERT_HISTORY, batch)
+            return len(batch)
+        except sqlite3.IntegrityError:
+            # Thường là lượt đặt đã bị xóa trước khi kịp ghi; ghi từng dòng để không làm mất cả lô
+            written = 0
+            for event in batch:
+                try:
+                    with db:
+                        db.execute(INSERT_HISTORY, event)
+                    written += 1
+                except sqlite3.IntegrityError:
+                    self.dropped += 1
+                    log.warning("Dropped history event for missing reservation %s", event[0])
+            return written
+
+    def drain(self, timeout=10):
+        """Dừng luồng nền và ghi nốt hàng đợi (gọi khi tắt ứng dụng)."""
+        self.worker.stop(timeout)
+        return self.flush()
@@ -0,0 +1,101 @@
+"""
+Tra cứu bàn trống cho nhiều nhà hàng x nhiều ngày cùng lúc ("còn bàn nào cuối tuần này không").
+
+Mỗi lượt tra cứu (nhà hàng, ngày, giờ, số khách) gọi assign_tables như lúc đặt thật (kể cả ghép bàn
+cho đoàn đông, nhưng không ghi gì) trên ThreadPoolExecutor nhỏ của AvailabilityService; mỗi luồng
+mượn một kết nối chỉ-đọc từ ConnectionPool riêng (sqlite3 nhả GIL khi thực thi nên các câu lệnh
+chạy song song thật sự). asyncio gom kết quả với hạn chót:
+hết giờ thì trả về các lượt đã xong, lượt chưa xong giữ done=False, câu lệnh còn đang chạy bị ngắt
+bằng Connection.interrupt() để trả luồng về cho request sau.
+
+Route Flask (đồng bộ) gọi check_many(); code async có thể await gather().
+"""
+import asyncio
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from .assignment import assign_tables
+    from .pool import ConnectionPool
+except ImportError:  # chạy trực tiếp
+    from assignment import assign_tables
+    from pool import ConnectionPool
+
+
+class Lookup:
+    """Một lượt tra cứu. done=True khi đã có kết quả; table_ids là các bàn sẽ được xếp (None = hết bàn)."""
+
+    __slots__ = ('restaurant_id', 'date', 'time', 'guests', 'table_ids', 'done', 'cancelled', 'db')
+
+    def __init__(self, restaurant_id, date, time, guests):
+        self.restaurant_id = restaurant_id
+        self.date = date
+        self.time = time
+        self.guests = guests
+        self.table_ids = None
+        self.done = False
+        self.cancelled = False
+        self.db = None
+
+
+class AvailabilityService:
+    """Executor + pool kết nối chỉ-đọc cho một file CSDL; tạo sau khi fork (xem app.get_availability)."""
+
+    def __init__(self, db_path, workers=4, profile='default', cache_kb=None):
+        self.pool = ConnectionPool(db_path, size=workers, profile=profile, cache_kb=cache_kb, read_only=True)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='availability')
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.timeouts = 0
+
+    def _run(self, lookup):
+        with self._lock:
+            if lookup.cancelled:
+                return lookup
+            db = lookup.db = self.pool.acquire()
+        try:
+            lookup.table_ids = assign_tables(db, lookup.restaurant_id, lookup.date, lookup.time, lookup.guests)
+            lookup.done = True
+        except sqlite3.OperationalError:
+            if not lookup.cancelled:
+                raise
+        finally:
+            with self._lock:
+                lookup.db = None
+            self.pool.release(db)
+        return lookup
+
+    def _cancel(self, lookups):
+        """Đánh dấu các lượt chưa xong là hết hạn và ngắt câu lệnh đang chạy của chúng."""
+        with self._lock:
+            for lookup in lookups:
+                if not lookup.done:
+                    lookup.cancelled = True
+                    self.timeouts += 1
+                    if lookup.db is not None:
+                        lookup.db.interrupt()
+
+    async def gather(self, lookups, timeout):
+        """Chạy các lượt song song, chờ tối đa timeout giây; trả về lookups (lượt hết hạn có done=False)."""
+        self.lookups += len(lookups)
+        if not lookups:
+            return lookups
+        loop = asyncio.get_running_loop()
+        futures = [loop.run_in_executor(self.executor, self._run, lookup) for lookup in lookups]
+        done, pending = await asyncio.wait(futures, timeout=timeout)
+        if pending:
+            self._cancel(lookups)
+            for future in pending:
+                future.cancel()
+        for future in done:
+            future.result()
+        return lookups
+
+    def check_many(self, lookups, timeout):
+        """Bản đồng bộ của gather() cho route Flask."""
+        return asyncio.run(self.gather(lookups, timeout))
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        self.pool.close()
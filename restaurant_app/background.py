@@ -0,0 +1,63 @@
+"""
+Luồng nền chạy định kỳ trong tiến trình web.
+
+Luồng chỉ được khởi động khi cần (ensure_started) và được khởi động lại nếu tiến trình
+là con của một fork, vì luồng của tiến trình cha không tồn tại trong tiến trình con.
+"""
+import logging
+import os
+import threading
+
+log = logging.getLogger(__name__)
+
+
+class PeriodicWorker:
+    """Gọi func() mỗi interval giây trên một luồng daemon; wake() để chạy ngay."""
+
+    def __init__(self, name, interval, func):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive() and self._pid == os.getpid()
+
+    def ensure_started(self):
+        if self.running:
+            return
+        with self._lock:
+            if self.running:
+                return
+            self._stop.clear()
+            self._wake.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def wake(self):
+        self.ensure_started()
+        self._wake.set()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        if self.running:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self.func()
+            except Exception:
+                log.exception("Background worker %s failed", self.name)
@@ -0,0 +1,264 @@
+"""
+Microbenchmark các hàm nóng trên CSDL nhiều cỡ (số lượt đặt mỗi nhà hàng mỗi ngày).
+
+Mỗi cỡ dựng một CSDL riêng (BENCH_RESTAURANTS nhà hàng có lượt đặt trong 3 ngày quanh BENCH_DAY,
+cộng thêm các nhà hàng không có lượt đặt cho trang tìm kiếm), rồi đo:
+    find_available_table  truy vấn bàn trống (chọn tự động)
+    assign_tables         bộ xếp bàn của assignment.py (đường đặt bàn tự động hiện tại)
+    restaurants_search    GET /restaurants?cuisine=...&location=... (truy vấn + render)
+    dashboard_stats       get_dashboard_stats (truy vấn của admin_dashboard)
+    login_hash            SELECT khách theo username + check_password_hash
+    cold_start            create_app() + request đầu tiên (GET /restaurants) như một worker mới khởi động
+
+Kết quả (JSON) là median/min/p95 theo ms cho từng (hàm, cỡ). Chế độ hồi quy:
+    python benchmark.py --out base.json
+    python benchmark.py --baseline base.json --threshold 0.25   # exit 1 nếu chậm hơn > 25%
+Dùng --workdir để giữ lại các CSDL đã dựng giữa các lần chạy.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+try:
+    from . import app as webapp
+    from .assignment import assign_tables
+    from .init_database import init_db
+    from .stats import get_dashboard_stats
+except ImportError:  # chạy trực tiếp: python benchmark.py
+    import app as webapp
+    from assignment import assign_tables
+    from init_database import init_db
+    from stats import get_dashboard_stats
+
+SIZES = (10, 1000, 100000)
+BENCH_DAY = '2030-06-15'
+DAYS = ('2030-06-14', BENCH_DAY, '2030-06-16')
+BENCH_RESTAURANTS = 2
+SEARCH_RESTAURANTS = 200
+CUSTOMERS = 1000
+PASSWORD = 'password123'
+# Không tính là hồi quy nếu chậm hơn ít hơn mức này (nhiễu đo với các hàm dưới 0.1 ms)
+MIN_DELTA_MS = 0.05
+
+CUISINES = ["Italian", "Japanese", "Vietnamese", "French", "Mexican"]
+CITIES = ["New York, NY", "Chicago, IL", "Hanoi, Vietnam", "Paris, France", "Tokyo, Japan"]
+TIMES = [f"{h:02d}:{m:02d}" for h in range(10, 22) for m in (0, 30)]
+STATUSES = ['confirmed'] * 5 + ['pending'] * 2 + ['cancelled', 'completed', 'rejected']
+
+
+def tables_for(per_day):
+    """Số bàn mỗi nhà hàng: đủ để tải trong ngày trải ra nhiều bàn, tối đa 2000 (giới hạn của layout.py)."""
+    return min(max(10, per_day // 10), 2000)
+
+
+def build_database(path, per_day, seed=42):
+    """Dựng CSDL benchmark với per_day lượt đặt mỗi nhà hàng mỗi ngày (BENCH_RESTAURANTS nhà hàng x 3 ngày)."""
+    rng = random.Random(seed)
+    if os.path.exists(path):
+        os.remove(path)
+    init_db(path, sample_data=False)
+    db = sqlite3.connect(path)
+    db.execute("PRAGMA journal_mode = MEMORY")
+    db.execute("PRAGMA synchronous = OFF")
+    password_hash = generate_password_hash(PASSWORD)
+    db.executemany("INSERT INTO Customers (username, password_hash, full_name, email) VALUES (?, ?, ?, ?)",
+                   [(f"user{i}", password_hash, f"User {i}", f"user{i}@example.com") for i in range(1, CUSTOMERS + 1)])
+    db.executemany("""
+        INSERT INTO Restaurants (name, location, cuisine, rating, opening_time, closing_time)
+        VALUES (?, ?, ?, ?, '10:00', '23:00')
+    """, [(f"Restaurant {i}", CITIES[i % len(CITIES)], CUISINES[i % len(CUISINES)], round(rng.uniform(3, 5), 1))
+          for i in range(1, SEARCH_RESTAURANTS + 1)])
+    n_tables = tables_for(per_day)
+    table_ids = {}
+    for rid in range(1, BENCH_RESTAURANTS + 1):
+        db.executemany("INSERT INTO Tables (restaurant_id, table_number, capacity) VALUES (?, ?, ?)",
+                       [(rid, f"T{n}", rng.choice((2, 4, 4, 6, 8))) for n in range(1, n_tables + 1)])
+        table_ids[rid] = [row[0] for row in db.execute("SELECT table_id FROM Tables WHERE restaurant_id = ?", (rid,))]
+    rows = []
+    for day in DAYS:
+        for rid in range(1, BENCH_RESTAURANTS + 1):
+            for _ in range(per_day):
+                rows.append((rng.randint(1, CUSTOMERS), rid, rng.choice(table_ids[rid]), day, rng.choice(TIMES),
+                             rng.choice((2, 2, 3, 4)), rng.choice(STATUSES)))
+    db.executemany("""
+        INSERT INTO Reservations (customer_id, restaurant_id, table_id, reservation_date, reservation_time, guests, status)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+    db.commit()
+    db.execute("ANALYZE")
+    db.close()
+
+
+def measure(func, min_runs=5, max_runs=200, budget=1.0):
+    """Gọi func (sau một lần khởi động) tới khi đủ max_runs hoặc hết budget giây; tối thiểu min_runs lần."""
+    func()
+    timings = []
+    deadline = time.perf_counter() + budget
+    while len(timings) < max_runs and (len(timings) < min_runs or time.perf_counter() < deadline):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        'runs': len(timings),
+        'median_ms': round(timings[len(timings) // 2], 4),
+        'min_ms': round(timings[0], 4),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 4),
+    }
+
+
+@contextmanager
+def app_database(path):
+    """Test client của một app dùng CSDL path; luồng nền và pool kết nối được dừng/đóng khi ra khỏi with."""
+    app = webapp.create_app({'DB_PATH': path})
+    try:
+        yield app.test_client()
+    finally:
+        webapp.shutdown_app(app)
+
+
+def _connect(path):
+    db = sqlite3.connect(path, detect_types=sqlite3.PARSE_DECLTYPES)
+    db.row_factory = sqlite3.Row
+    return db
+
+
+def bench_find_available_table(db, client):
+    return lambda: webapp.find_available_table(db, 1, BENCH_DAY, '19:00', 4)
+
+
+def bench_assign_tables(db, client):
+    return lambda: assign_tables(db, 1, BENCH_DAY, '19:00', 4)
+
+
+def bench_restaurants_search(db, client):
+    def run():
+        response = client.get('/restaurants?cuisine=Italian&location=New')
+        assert response.status_code == 200
+    return run
+
+
+def bench_dashboard_stats(db, client):
+    return lambda: get_dashboard_stats(db)
+
+
+def bench_login_hash(db, client):
+    def run():
+        row = db.execute("SELECT * FROM Customers WHERE username = ? AND deleted_at IS NULL;", ('user500',)).fetchone()
+        assert check_password_hash(row['password_hash'], PASSWORD)
+    return run
+
+
+def bench_cold_start(db, client):
+    path = client.application.config['DB_PATH']
+
+    def run():
+        app = webapp.create_app({'DB_PATH': path})
+        try:
+            assert app.test_client().get('/restaurants').status_code == 200
+        finally:
+            webapp.shutdown_app(app)
+    return run
+
+
+BENCHMARKS = {
+    'find_available_table': bench_find_available_table,
+    'assign_tables': bench_assign_tables,
+    'restaurants_search': bench_restaurants_search,
+    'dashboard_stats': bench_dashboard_stats,
+    'login_hash': bench_login_hash,
+    'cold_start': bench_cold_start,
+}
+
+
+def run_benchmarks(workdir, sizes=SIZES, names=None, seed=42, budget=1.0, log=print):
+    """Trả về {'sizes': [...], 'results': {tên: {str(cỡ): số liệu}}}; CSDL đã có trong workdir được dùng lại."""
+    names = names or list(BENCHMARKS)
+    results = {name: {} for name in names}
+    for size in sizes:
+        path = os.path.join(workdir, f"bench_{size}_{seed}.db")
+        if not os.path.exists(path):
+            started = time.perf_counter()
+            build_database(path, size, seed)
+            if log:
+                log(f"built {path} in {time.perf_counter() - started:.1f}s")
+        db = _connect(path)
+        try:
+            with app_database(path) as client:
+                for name in names:
+                    results[name][str(size)] = stats = measure(BENCHMARKS[name](db, client), budget=budget)
+                    if log:
+                        log(f"{name:>22} @ {size:>6}/day: median {stats['median_ms']:9.3f} ms  "
+                            f"p95 {stats['p95_ms']:9.3f} ms  ({stats['runs']} runs)")
+        finally:
+            db.close()
+    return {'sizes': list(sizes), 'results': results}
+
+
+def regressions(baseline, current, threshold):
+    """Các (tên, cỡ, median cũ, median mới) chậm hơn baseline quá threshold (tỉ lệ) và quá MIN_DELTA_MS."""
+    slower = []
+    for name, by_size in current['results'].items():
+        for size, stats in by_size.items():
+            before = baseline.get('results', {}).get(name, {}).get(size)
+            if not before:
+                continue
+            old, new = before['median_ms'], stats['median_ms']
+            if new > old * (1 + threshold) and new - old > MIN_DELTA_MS:
+                slower.append((name, size, old, new))
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the hot functions on databases of several sizes.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES),
+                        help="reservations per restaurant per day (default: %(default)s)")
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), help="run only these benchmarks")
+    parser.add_argument('--budget', type=float, default=1.0, help="seconds spent timing each benchmark per size")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workdir', help="keep built databases here and reuse them (default: temp dir)")
+    parser.add_argument('--out', help="write results JSON to this file")
+    parser.add_argument('--baseline', help="results JSON to compare against; exit 1 on regressions")
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="allowed slowdown of the median vs. the baseline (default: 0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='bench-')
+    os.makedirs(workdir, exist_ok=True)
+    try:
+        result = run_benchmarks(workdir, args.sizes, args.only, args.seed, args.budget)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir)
+    result = dict(created_at=datetime.now().isoformat(timespec='seconds'), python=platform.python_version(),
+                  sqlite=sqlite3.sqlite_version, seed=args.seed, **result)
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"Results written to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            slower = regressions(json.load(f), result, args.threshold)
+        for name, size, old, new in slower:
+            print(f"REGRESSION {name} @ {size}/day: {old:.3f} ms -> {new:.3f} ms ({new / old - 1:+.0%})")
+        if slower:
+            return 1
+        print(f"No regressions above {args.threshold:.0%}.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
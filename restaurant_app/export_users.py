@@ -1,46 +1,216 @@
 import sqlite3
 import csv
+import gzip
+import json
+import argparse
+import sys
+from datetime import date
+
+try:
+    from .init_database import DB_PATH
+except ImportError:  # chạy trực tiếp: python export_users.py
+    from init_database import DB_PATH
 
 # Đường dẫn tới các tệp
-DB_PATH = "restaurant_reservation.db"
 CSV_PATH = "users_150.csv" # Tệp CSV sẽ được tạo ra ở cùng thư mục
 
-def export_users_to_csv():
+# Số dòng lấy ra mỗi lần fetchmany, giữ bộ nhớ ổn định bất kể bảng lớn cỡ nào
+CHUNK_SIZE = 1000
+
+# Các bảng được phép xuất, kèm cột ngày dùng cho bộ lọc --from/--to
+EXPORTABLE_TABLES = {
+    'Customers': 'created_at',
+    'Reservations': 'reservation_date',
+    'ReservationHistory': 'action_time',
+    'ArchivedReservations': 'reservation_date',
+    'ArchivedReservationHistory': 'action_time',
+}
+
+# Các cột không bao giờ được xuất ra ngoài
+EXCLUDED_COLUMNS = {
+    'Customers': {'password_hash'},
+}
+
+FORMATS = ('csv', 'jsonl')
+
+
+def table_columns(db, table):
+    """Trả về danh sách cột của bảng (theo thứ tự khai báo)."""
+    return [row[1] for row in db.execute(f"PRAGMA table_info({table})")]
+
+
+def build_export_query(db, table, filters=None, date_from=None, date_to=None):
     """
-    Truy vấn CSDL và xuất username của 400 người dùng mẫu ra tệp CSV.
+    Dựng câu SELECT cho bảng cần xuất.
+    filters là dict {cột: giá trị} (so sánh bằng); date_from/date_to là 'YYYY-MM-DD', tính cả hai đầu.
     """
-    print("Connecting to the database...")
-    db = sqlite3.connect(DB_PATH)
-    cur = db.cursor()
+    if table not in EXPORTABLE_TABLES:
+        raise ValueError(f"Table {table!r} cannot be exported.")
+
+    all_columns = table_columns(db, table)
+    columns = [c for c in all_columns if c not in EXCLUDED_COLUMNS.get(table, set())]
+
+    sql = f"SELECT {', '.join(columns)} FROM {table} WHERE 1=1"
+    params = []
+    for column, value in (filters or {}).items():
+        # Cột bị loại cũng không được lọc, nếu không có thể dò giá trị qua số dòng trả về
+        if column not in columns:
+            raise ValueError(f"Unknown column {column!r} for table {table}.")
+        sql += f" AND {column} = ?"
+        params.append(value)
 
+    # So sánh trực tiếp trên cột (không bọc DATE()) để vẫn dùng được index
+    date_column = EXPORTABLE_TABLES[table]
+    if date_from:
+        sql += f" AND {date_column} >= ?"
+        params.append(date_from)
+    if date_to:
+        sql += f" AND {date_column} < DATE(?, '+1 day')"
+        params.append(date_to)
+
+    # Duyệt theo rowid: SQLite đọc tuần tự, không phải sắp xếp trong bộ nhớ
+    sql += " ORDER BY rowid"
+    return sql, params, columns
+
+
+def iter_rows(cur, chunk_size=CHUNK_SIZE):
+    """Đọc con trỏ theo từng khối fetchmany thay vì fetchall."""
+    while True:
+        rows = cur.fetchmany(chunk_size)
+        if not rows:
+            break
+        yield from rows
+
+
+def open_output(path, compress=False):
+    """Mở tệp đầu ra dạng text; '-' là stdout, compress hoặc đuôi .gz sẽ ghi gzip."""
+    if path == '-':
+        return sys.stdout
+    if compress or path.endswith('.gz'):
+        return gzip.open(path, 'wt', newline='', encoding='utf-8')
+    return open(path, 'w', newline='', encoding='utf-8')
+
+
+def write_rows(out, columns, rows, fmt='csv'):
+    """Ghi từng dòng ra out theo định dạng csv hoặc jsonl, trả về số dòng đã ghi."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format {fmt!r}.")
+    count = 0
+    if fmt == 'csv':
+        writer = csv.writer(out)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    else:
+        for row in rows:
+            out.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False, default=str))
+            out.write('\n')
+            count += 1
+    return count
+
+
+def export_table(db, table, out_path, fmt='csv', filters=None, date_from=None, date_to=None,
+                 compress=False, chunk_size=CHUNK_SIZE):
+    """Xuất một bảng ra tệp theo kiểu streaming, trả về số dòng đã xuất."""
+    sql, params, columns = build_export_query(db, table, filters, date_from, date_to)
+    cur = db.execute(sql, params)
+    out = open_output(out_path, compress)
     try:
-        # Lấy username của các tài khoản từ user1 đến user400
-        cur.execute("SELECT username FROM Customers WHERE username LIKE 'user%' LIMIT 150;")
-        users = cur.fetchall()
-        
-        if not users:
-            print("No sample users (user1, user2, ...) found in the database.")
-            return
+        return write_rows(out, columns, iter_rows(cur, chunk_size), fmt)
+    finally:
+        if out is not sys.stdout:
+            out.close()
 
-        print(f"Found {len(users)} users. Exporting to {CSV_PATH}...")
 
-        with open(CSV_PATH, 'w', newline='', encoding='utf-8') as csvfile:
+def export_users_to_csv(db_path=DB_PATH, csv_path=CSV_PATH, limit=150, password='password123',
+                        prefix='user'):
+    """
+    Xuất username của các tài khoản mẫu (user1, user2, ...) ra tệp CSV đăng nhập cho kiểm thử hiệu năng.
+    password là mật khẩu chung đã dùng khi tạo các tài khoản đó; limit=None để xuất tất cả.
+    """
+    print("Connecting to the database...")
+    db = sqlite3.connect(db_path)
+
+    try:
+        sql = "SELECT username FROM Customers WHERE username LIKE ? ORDER BY customer_id"
+        params = [f"{prefix}%"]
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        cur = db.execute(sql, params)
+
+        with open_output(csv_path) as csvfile:
             writer = csv.writer(csvfile)
-            
-            # Ghi dòng tiêu đề
             writer.writerow(['username', 'password'])
-            
-            # Ghi dữ liệu cho mỗi người dùng
-            for user in users:
-                # Mật khẩu chung mà chúng ta đã đặt khi tạo user
-                writer.writerow([user[0], 'password123'])
-        
-        print("Successfully exported users to users.csv")
+            count = 0
+            for (username,) in iter_rows(cur):
+                writer.writerow([username, password])
+                count += 1
+
+        if not count:
+            print(f"No sample users ({prefix}1, {prefix}2, ...) found in the database.")
+        else:
+            print(f"Successfully exported {count} users to {csv_path}")
+        return count
 
     except sqlite3.Error as e:
         print(f"An error occurred: {e}")
     finally:
         db.close()
 
+
+def parse_filter(item):
+    """Kiểu (type=) của --filter: 'cột=giá trị' -> (cột, giá trị); argparse báo lỗi nếu sai dạng."""
+    column, sep, value = item.partition('=')
+    if not sep:
+        raise argparse.ArgumentTypeError(f"Filter must look like column=value, got {item!r}.")
+    return column.strip(), value
+
+
+def parse_date(value):
+    """Kiểu (type=) của --from/--to: 'YYYY-MM-DD' hợp lệ, giữ nguyên chuỗi để so sánh với cột ngày."""
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Date must look like YYYY-MM-DD, got {value!r}.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export reservation data to CSV or JSONL.")
+    parser.add_argument('table', choices=list(EXPORTABLE_TABLES) + ['logins'],
+                        help="table to export, or 'logins' for the load-test username/password CSV")
+    parser.add_argument('-o', '--output', default='-', help="output file ('-' for stdout)")
+    parser.add_argument('--db', default=DB_PATH, help="database file")
+    parser.add_argument('--format', choices=FORMATS, default='csv')
+    parser.add_argument('--filter', action='append', type=parse_filter, metavar='COLUMN=VALUE',
+                        help="equality filter, repeatable")
+    parser.add_argument('--from', dest='date_from', type=parse_date, metavar='YYYY-MM-DD')
+    parser.add_argument('--to', dest='date_to', type=parse_date, metavar='YYYY-MM-DD')
+    parser.add_argument('--gzip', action='store_true', help="gzip the output")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--limit', type=int, default=150, help="logins only: number of users (0 = all)")
+    parser.add_argument('--password', default='password123', help="logins only: shared password of sample users")
+    args = parser.parse_args(argv)
+
+    if args.table == 'logins':
+        output = CSV_PATH if args.output == '-' else args.output
+        export_users_to_csv(args.db, output, limit=args.limit or None, password=args.password)
+        return 0
+
+    db = sqlite3.connect(args.db)
+    try:
+        count = export_table(db, args.table, args.output, fmt=args.format,
+                             filters=dict(args.filter or []), date_from=args.date_from,
+                             date_to=args.date_to, compress=args.gzip, chunk_size=args.chunk_size)
+    except (ValueError, sqlite3.Error) as e:
+        print(f"An error occurred: {e}", file=sys.stderr)
+        return 1
+    finally:
+        db.close()
+    print(f"Exported {count} rows from {args.table}.", file=sys.stderr)
+    return 0
+
+
 if __name__ == '__main__':
-    export_users_to_csv()
\ No newline at end of file
+    sys.exit(main())
@@ -2,16 +2,54 @@ import sqlite3
 from werkzeug.security import generate_password_hash
 import os
 
-# Đường dẫn tới file CSDL, đảm bảo nó giống với trong app.py
-DB_PATH = "restaurant_reservation.db"
+try:
+    from .archive import create_archive_schema
+    from .stats import create_stats_schema
+    from .analytics import create_analytics_schema
+    from .purge import create_purge_schema
+    from .assignment import create_assignment_schema
+    from .waitlist import create_waitlist_schema
+    from .outbox import create_outbox_schema
+except ImportError:  # chạy trực tiếp: python init_database.py
+    from archive import create_archive_schema
+    from stats import create_stats_schema
+    from analytics import create_analytics_schema
+    from purge import create_purge_schema
+    from assignment import create_assignment_schema
+    from waitlist import create_waitlist_schema
+    from outbox import create_outbox_schema
+
+# File CSDL mặc định của app.py và các công cụ dòng lệnh; đổi bằng biến môi trường RESTAURANT_DB_PATH
+DB_PATH = os.environ.get("RESTAURANT_DB_PATH", "restaurant_reservation.db")
+
+# Tăng mỗi khi create_schema thay đổi (bảng, cột, index, trigger mới); lưu trong PRAGMA user_version
+SCHEMA_VERSION = 3
+
+# action_time là thời điểm UTC 'YYYY-MM-DD HH:MM:SS'
+HISTORY_TABLE = """
+    CREATE TABLE IF NOT EXISTS {name} (
+        history_id     INTEGER PRIMARY KEY AUTOINCREMENT,
+        reservation_id INTEGER NOT NULL,
+        action         TEXT NOT NULL,
+        action_by_admin INTEGER,
+        action_by_customer INTEGER,
+        action_time    TIMESTAMP DEFAULT (DATETIME('now')),
+        note           TEXT,
+        FOREIGN KEY (reservation_id) REFERENCES Reservations(reservation_id) ON DELETE CASCADE,
+        FOREIGN KEY (action_by_admin) REFERENCES Admins(admin_id) ON DELETE SET NULL,
+        FOREIGN KEY (action_by_customer) REFERENCES Customers(customer_id) ON DELETE SET NULL
+    );
+"""
+
 
 # -----------------------
 # DB initialization
 # -----------------------
-def init_db():
-    db = sqlite3.connect(DB_PATH)
+def create_schema(db):
+    """Tạo (nếu chưa có) toàn bộ bảng, index và trigger trên một kết nối đang mở."""
+    # Chỉ có hiệu lực với file mới (hoặc sau VACUUM); cho phép retention.py trả lại dung lượng từng phần
+    db.execute("PRAGMA auto_vacuum = INCREMENTAL;")
     cur = db.cursor()
-    cur.execute("PRAGMA foreign_keys = ON;")
 
     # Customers
     cur.execute("""
@@ -22,7 +60,8 @@ def init_db():
         full_name     TEXT,
         email         TEXT UNIQUE NOT NULL,
         phone         TEXT,
-        created_at    DATE DEFAULT (DATE('now'))
+        created_at    DATE DEFAULT (DATE('now')),
+        deleted_at    TIMESTAMP
     );
     """)
 
@@ -49,10 +88,18 @@ def init_db():
         description   TEXT,
         opening_time  TEXT,
         closing_time  TEXT,
-        created_at    DATE DEFAULT (DATE('now'))
+        created_at    DATE DEFAULT (DATE('now')),
+        deleted_at    TIMESTAMP,
+        layout_version INTEGER NOT NULL DEFAULT 0
     );
     """)
 
+    # deleted_at: đã xóa mềm, đang chờ purge.py dọn dữ liệu liên quan (CSDL cũ chưa có cột này)
+    add_column_if_missing(db, 'Customers', 'deleted_at', 'TIMESTAMP')
+    add_column_if_missing(db, 'Restaurants', 'deleted_at', 'TIMESTAMP')
+    # layout_version: tăng mỗi lần sơ đồ bàn thay đổi, dùng để làm mới LayoutCache (layout.py)
+    add_column_if_missing(db, 'Restaurants', 'layout_version', 'INTEGER NOT NULL DEFAULT 0')
+
     # Tables
     cur.execute("""
     CREATE TABLE IF NOT EXISTS Tables (
@@ -60,9 +107,13 @@ def init_db():
         restaurant_id INTEGER NOT NULL,
         table_number  TEXT,
         capacity      INTEGER NOT NULL,
+        zone          TEXT,
         FOREIGN KEY (restaurant_id) REFERENCES Restaurants(restaurant_id) ON DELETE CASCADE
     );
     """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_tables_restaurant ON Tables (restaurant_id);")
+    # zone: các bàn cùng khu có thể ghép cho đoàn đông (assignment.py), NULL = sảnh chính
+    add_column_if_missing(db, 'Tables', 'zone', 'TEXT')
 
     # Reservations
     cur.execute("""
@@ -82,24 +133,88 @@ def init_db():
     );
     """)
 
+    # Tra cứu bàn trống và sweeper đều lọc theo ngày đặt rồi theo trạng thái
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_reservations_date_status ON Reservations (reservation_date, status);")
+    # Khóa ngoại tới Customers/Restaurants: lịch sử đặt của khách, xóa từng phần khách/nhà hàng
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_reservations_customer ON Reservations (customer_id);")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_reservations_restaurant ON Reservations (restaurant_id, reservation_date);")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_reservations_table ON Reservations (table_id);")
+
     # ReservationHistory
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS ReservationHistory (
-        history_id     INTEGER PRIMARY KEY AUTOINCREMENT,
-        reservation_id INTEGER NOT NULL,
-        action         TEXT NOT NULL,
-        action_by_admin INTEGER,
-        action_by_customer INTEGER,
-        action_time    DATE DEFAULT (DATE('now')),
-        note           TEXT,
-        FOREIGN KEY (reservation_id) REFERENCES Reservations(reservation_id) ON DELETE CASCADE,
-        FOREIGN KEY (action_by_admin) REFERENCES Admins(admin_id) ON DELETE SET NULL,
-        FOREIGN KEY (action_by_customer) REFERENCES Customers(customer_id) ON DELETE SET NULL
-    );
-    """)
+    cur.execute(HISTORY_TABLE.format(name='ReservationHistory'))
+    upgrade_history_timestamps(db)
+
+    # Khóa ngoại tới Reservations: xóa/lưu trữ lượt đặt cần tìm lịch sử theo reservation_id
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_history_reservation ON ReservationHistory (reservation_id);")
+
+    # Trigger thống kê tham chiếu tới bảng lưu trữ nên phải tạo bảng lưu trữ trước
+    create_archive_schema(db)
+    create_stats_schema(db)
+    create_analytics_schema(db)
+    create_purge_schema(db)
+    create_assignment_schema(db)
+    create_waitlist_schema(db)
+    create_outbox_schema(db)
+    db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+
+def ensure_schema(db):
+    """
+    Chạy create_schema nếu CSDL chưa ở SCHEMA_VERSION; trả về True nếu đã chạy.
+    CSDL đã cập nhật chỉ tốn một câu PRAGMA (worker khởi động lại không phải chạy lại toàn bộ DDL).
+    """
+    if db.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+        return False
+    create_schema(db)
+    return True
+
 
-    # --- BẮT ĐẦU THÊM DỮ LIỆU MẪU ---
+def add_column_if_missing(db, table, column, declaration):
+    columns = [row[1] for row in db.execute(f"PRAGMA table_info({table})")]
+    if column not in columns:
+        db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
 
+
+def upgrade_history_timestamps(db):
+    """
+    CSDL cũ khai báo action_time là DATE (chỉ có ngày): dựng lại bảng với kiểu TIMESTAMP,
+    giá trị cũ được coi là 00:00:00 của ngày đó.
+    """
+    row = db.execute("SELECT type FROM pragma_table_info('ReservationHistory') WHERE name = 'action_time'").fetchone()
+    if not row or row[0].upper() != 'DATE':
+        return
+    try:
+        db.execute("BEGIN IMMEDIATE")
+        db.execute(HISTORY_TABLE.format(name='ReservationHistory_new'))
+        db.execute("""
+            INSERT INTO ReservationHistory_new
+            SELECT history_id, reservation_id, action, action_by_admin, action_by_customer,
+                   CASE WHEN LENGTH(action_time) = 10 THEN action_time || ' 00:00:00' ELSE action_time END, note
+            FROM ReservationHistory
+        """)
+        db.execute("DROP TABLE ReservationHistory")
+        db.execute("ALTER TABLE ReservationHistory_new RENAME TO ReservationHistory")
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+
+def init_db(db_path=None, sample_data=True):
+    """Tạo schema và dữ liệu mẫu; CSDL đã ở SCHEMA_VERSION thì bỏ qua cả hai."""
+    db = sqlite3.connect(db_path or DB_PATH)
+    db.execute("PRAGMA foreign_keys = ON;")
+    if ensure_schema(db) and sample_data:
+        seed_sample_data(db.cursor())
+    db.commit()
+    db.close()
+
+
+# -----------------------
+# Sample data
+# -----------------------
+def seed_sample_data(cur):
+    """Thêm dữ liệu mẫu (admin, khách, nhà hàng, bàn) nếu các bảng còn trống."""
     cur.execute("SELECT COUNT(*) FROM Admins;")
     if cur.fetchone()[0] == 0:
         cur.execute("INSERT INTO Admins (adminname, password_hash, full_name, email) VALUES (?, ?, ?, ?);",
@@ -163,8 +278,6 @@ def init_db():
         # cur.executemany("INSERT INTO Tables (restaurant_id, table_number, capacity) VALUES (?, ?, ?);", pizza_palace_tables)
         # print("Finished adding tables.")
 
-    db.commit()
-    db.close()
 
 if __name__ == '__main__':
     # Xóa file database cũ nếu có để tạo lại từ đầu
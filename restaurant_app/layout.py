@@ -0,0 +1,154 @@
+"""
+Sơ đồ bàn của nhà hàng: nhập hàng loạt từ CSV (table_number,capacity), so sánh với bàn hiện có
+và áp dụng thêm/sửa/xóa trong một giao dịch.
+
+Mỗi lần sơ đồ thay đổi, Restaurants.layout_version tăng đúng một lần (dù đổi 1 hay 400 bàn).
+LayoutCache giữ danh sách bàn theo nhà hàng và chỉ đọc lại khi layout_version khác bản đã cache,
+nên mọi tiến trình (kể cả các worker gunicorn) đều thấy sơ đồ mới mà không cần báo cho nhau.
+"""
+import csv
+import io
+import threading
+from collections import OrderedDict, namedtuple
+
+MAX_TABLES = 2000
+
+LayoutDiff = namedtuple('LayoutDiff', 'insert update delete unchanged')
+
+
+def parse_layout(text):
+    """
+    Đọc CSV 'table_number,capacity' (dòng tiêu đề tùy chọn). Trả về danh sách (table_number, capacity).
+    ValueError nếu có dòng sai hoặc số bàn bị trùng.
+    """
+    rows, seen = [], set()
+    for line_no, fields in enumerate(csv.reader(io.StringIO(text)), start=1):
+        fields = [f.strip() for f in fields]
+        if not any(fields):
+            continue
+        if line_no == 1 and fields[0].lower() == 'table_number':
+            continue
+        if len(fields) != 2 or not fields[0]:
+            raise ValueError(f"Line {line_no}: expected 'table_number,capacity'.")
+        number, capacity = fields
+        if not capacity.isdigit() or int(capacity) <= 0:
+            raise ValueError(f"Line {line_no}: capacity must be a positive whole number.")
+        if number in seen:
+            raise ValueError(f"Line {line_no}: table {number!r} appears more than once.")
+        seen.add(number)
+        rows.append((number, int(capacity)))
+    if len(rows) > MAX_TABLES:
+        raise ValueError(f"A layout can have at most {MAX_TABLES} tables.")
+    return rows
+
+
+def layout_csv(tables):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(['table_number', 'capacity'])
+    writer.writerows((t['table_number'], t['capacity']) for t in tables)
+    return out.getvalue()
+
+
+def diff_layout(db, restaurant_id, rows):
+    """So sánh sơ đồ mới (rows) với bàn hiện có theo table_number."""
+    existing = {}
+    duplicates = []
+    for table_id, number, capacity in db.execute(
+            "SELECT table_id, table_number, capacity FROM Tables WHERE restaurant_id = ? ORDER BY table_id",
+            (restaurant_id,)):
+        if number in existing:
+            duplicates.append((table_id, number, capacity))
+        else:
+            existing[number] = (table_id, capacity)
+
+    insert, update, unchanged = [], [], 0
+    for number, capacity in rows:
+        if number not in existing:
+            insert.append((number, capacity))
+            continue
+        table_id, old_capacity = existing.pop(number)
+        if old_capacity != capacity:
+            update.append((table_id, number, old_capacity, capacity))
+        else:
+            unchanged += 1
+    delete = [(table_id, number, capacity) for number, (table_id, capacity) in existing.items()] + duplicates
+    return LayoutDiff(insert, update, delete, unchanged)
+
+
+def affected_reservations(db, diff, today):
+    """Số lượt đặt còn hiệu lực từ hôm nay bị ảnh hưởng: bàn bị xóa, hoặc bàn bị giảm sức chứa dưới số khách."""
+    count = 0
+    for table_id, _, _ in diff.delete:
+        count += db.execute("""
+            SELECT COUNT(*) FROM Reservations
+            WHERE table_id = ? AND reservation_date >= ? AND status IN ('pending', 'confirmed')
+        """, (table_id, today)).fetchone()[0]
+    for table_id, _, _, capacity in diff.update:
+        count += db.execute("""
+            SELECT COUNT(*) FROM Reservations
+            WHERE table_id = ? AND reservation_date >= ? AND status IN ('pending', 'confirmed') AND guests > ?
+        """, (table_id, today, capacity)).fetchone()[0]
+    return count
+
+
+def bump_layout_version(db, restaurant_id):
+    db.execute("UPDATE Restaurants SET layout_version = layout_version + 1 WHERE restaurant_id = ?",
+               (restaurant_id,))
+
+
+def apply_layout(db, restaurant_id, rows):
+    """
+    Đưa bàn của nhà hàng về đúng sơ đồ rows trong một giao dịch (so sánh lại bên trong giao dịch để
+    không lệch với thay đổi đồng thời). Trả về LayoutDiff đã áp dụng.
+    """
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        diff = diff_layout(db, restaurant_id, rows)
+        if diff.delete:
+            db.executemany("DELETE FROM Tables WHERE table_id = ?", [(d[0],) for d in diff.delete])
+        if diff.update:
+            db.executemany("UPDATE Tables SET capacity = ? WHERE table_id = ?", [(u[3], u[0]) for u in diff.update])
+        if diff.insert:
+            db.executemany("INSERT INTO Tables (restaurant_id, table_number, capacity) VALUES (?, ?, ?)",
+                           [(restaurant_id, number, capacity) for number, capacity in diff.insert])
+        if diff.insert or diff.update or diff.delete:
+            bump_layout_version(db, restaurant_id)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return diff
+
+
+class LayoutCache:
+    """Danh sách bàn theo nhà hàng (LRU), hợp lệ chừng nào layout_version chưa đổi."""
+
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, db, restaurant_id, version):
+        with self._lock:
+            entry = self._entries.get(restaurant_id)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(restaurant_id)
+                self.hits += 1
+                return entry[1]
+        tables = tuple(dict(table_id=row[0], table_number=row[1], capacity=row[2]) for row in db.execute(
+            "SELECT table_id, table_number, capacity FROM Tables WHERE restaurant_id = ? ORDER BY table_id",
+            (restaurant_id,)))
+        with self._lock:
+            self.misses += 1
+            self._entries[restaurant_id] = (version, tables)
+            self._entries.move_to_end(restaurant_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return tables
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,326 @@
+"""
+Kiểm thử tải chạy cục bộ, thay cho các file JMeter tests/PT_*.jmx (vốn trỏ vào máy chủ thật và
+đọc CSV từ đường dẫn Windows).
+
+Mặc định: sinh CSDL giả lập bằng seed_data.py, khởi động app trong một tiến trình con
+(werkzeug, đa luồng) rồi chạy kịch bản với N người dùng ảo, khởi động dần trong --ramp giây.
+Dùng --url để bắn vào một máy chủ đang chạy sẵn (ví dụ gunicorn) thay vì tự khởi động.
+
+Các kịch bản có sẵn khớp với các plan JMeter cũ:
+    PT_LOAD_01  150 người, ramp 30s, đăng nhập (users_150.csv) + đặt bàn 19:30 tại /restaurant/1
+    PT_RESP_01  100 người, ramp 10s, tìm nhà hàng Italian ở New York
+    PT_RESP_02  100 người, ramp 10s, đăng nhập (users_100.csv) + đặt bàn 14:00
+    PT_STRS_01  400 người, chạy lặp trong --duration giây, đăng nhập (users_400.csv) + đặt bàn 17:00
+    mixed       đăng nhập, duyệt /restaurants, xem /restaurant/1 rồi đặt bàn
+
+Ví dụ:
+    python loadtest.py PT_LOAD_01 --out results/load.json
+    python loadtest.py PT_STRS_01 --users 100 --duration 60 --compare results/load.json
+
+Kết quả (JSON) gồm thông lượng, tỉ lệ lỗi và p50/p95/p99 theo từng bước và tổng.
+"""
+import argparse
+import csv
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import date, datetime, timedelta
+from http.cookiejar import CookieJar
+
+try:
+    from .seed_data import generate
+except ImportError:  # chạy trực tiếp: python loadtest.py
+    from seed_data import generate
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REQUEST_TIMEOUT = 30
+
+
+def _tomorrow():
+    return (date.today() + timedelta(days=1)).isoformat()
+
+
+# Mỗi bước: (tên, method, path, dữ liệu form hoặc query, chuỗi mà nếu có trong trang thì tính là lỗi,
+# chuỗi bắt buộc có trong trang để tính là thành công). Lỗi nghiệp vụ (hết bàn, sai ngày...) vẫn trả về
+# 200 sau redirect kèm thông báo flash, nên chỉ mã HTTP là không đủ.
+def login_step():
+    return ('login', 'POST', '/login', lambda user: {'who': 'customer', 'username': user[0], 'password': user[1]},
+            'Invalid username or password', None)
+
+
+def book_step(time_str, restaurant_id=1):
+    return ('book', 'POST', f'/restaurant/{restaurant_id}',
+            lambda user: {'date': _tomorrow(), 'time': time_str, 'guests': '2'}, None, 'Reservation created')
+
+
+BROWSE_STEP = ('browse', 'GET', '/restaurants', lambda user: {'cuisine': 'Italian', 'location': 'New York'}, None,
+               None)
+DETAIL_STEP = ('detail', 'GET', '/restaurant/1', None, None, None)
+
+SCENARIOS = {
+    'PT_LOAD_01': dict(users=150, ramp=30, iterations=1, users_csv='users_150.csv',
+                       steps=[login_step(), book_step('19:30')]),
+    'PT_RESP_01': dict(users=100, ramp=10, iterations=1, users_csv=None, steps=[BROWSE_STEP]),
+    'PT_RESP_02': dict(users=100, ramp=10, iterations=1, users_csv='users_100.csv',
+                       steps=[login_step(), book_step('14:00')]),
+    'PT_STRS_01': dict(users=400, ramp=30, iterations=0, duration=60, users_csv='users_400.csv',
+                       steps=[login_step(), book_step('17:00')]),
+    'mixed': dict(users=50, ramp=10, iterations=5, users_csv='users_150.csv',
+                  steps=[login_step(), BROWSE_STEP, DETAIL_STEP, book_step('19:00')]),
+}
+
+
+def load_users(path):
+    """Các dòng (username, password) của file CSV dạng users_*.csv (có dòng tiêu đề)."""
+    with open(path, newline='') as f:
+        return [(row['username'], row['password']) for row in csv.DictReader(f)]
+
+
+def percentile(sorted_values, pct):
+    """Phân vị theo thứ hạng gần nhất trên danh sách đã sắp xếp."""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarize_samples(samples, elapsed):
+    """samples: [(ms, ok)] -> dict số liệu của một bước (hoặc tổng)."""
+    latencies = sorted(ms for ms, _ in samples)
+    errors = sum(1 for _, ok in samples if not ok)
+    count = len(samples)
+    return {
+        'requests': count,
+        'errors': errors,
+        'error_rate': round(errors / count, 4) if count else 0.0,
+        'throughput_rps': round(count / elapsed, 2) if elapsed else 0.0,
+        'mean_ms': round(sum(latencies) / count, 2) if count else None,
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+        'max_ms': latencies[-1] if latencies else None,
+    }
+
+
+class VirtualUser(threading.Thread):
+    """Một người dùng ảo: có cookie riêng, chạy các bước của kịch bản iterations lần (0 = tới deadline)."""
+
+    def __init__(self, base_url, steps, user, iterations, deadline, record):
+        super().__init__(daemon=True)
+        self.base_url = base_url
+        self.steps = steps
+        self.user = user
+        self.iterations = iterations
+        self.deadline = deadline
+        self.record = record
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()))
+
+    def run(self):
+        done = 0
+        while (not self.iterations or done < self.iterations) and time.monotonic() < self.deadline:
+            for step in self.steps:
+                self.record(step[0], *self.request(step))
+            done += 1
+
+    def request(self, step):
+        _name, method, path, make_data, fail_text, ok_text = step
+        url = self.base_url + path
+        data = make_data(self.user) if make_data else None
+        body = None
+        if data and method == 'GET':
+            url += '?' + urllib.parse.urlencode(data)
+        elif data:
+            body = urllib.parse.urlencode(data).encode()
+        started = time.perf_counter()
+        try:
+            # Redirect sau POST được theo luôn và tính vào cùng một mẫu, như JMeter
+            with self.opener.open(urllib.request.Request(url, data=body, method=method),
+                                  timeout=REQUEST_TIMEOUT) as response:
+                page = response.read()
+            ok = not (fail_text and fail_text.encode() in page) and (not ok_text or ok_text.encode() in page)
+        except (urllib.error.URLError, OSError):
+            ok = False
+        return round((time.perf_counter() - started) * 1000, 2), ok
+
+
+def run_load(base_url, steps, users, ramp=0, iterations=1, duration=None, user_rows=None):
+    """
+    Chạy users người dùng ảo (khởi động đều trong ramp giây). Trả về dict kết quả
+    {'elapsed_s', 'steps': {tên bước: số liệu}, 'total': số liệu}.
+    """
+    samples = {step[0]: [] for step in steps}
+    lock = threading.Lock()
+
+    def record(name, ms, ok):
+        with lock:
+            samples[name].append((ms, ok))
+
+    user_rows = user_rows or [('guest', '')]
+    started = time.monotonic()
+    deadline = started + duration if duration else float('inf')
+    threads = []
+    for i in range(users):
+        if ramp and users > 1:
+            time.sleep(max(0.0, started + ramp * i / (users - 1) - time.monotonic()))
+        if time.monotonic() >= deadline:
+            break
+        thread = VirtualUser(base_url, steps, user_rows[i % len(user_rows)], iterations, deadline, record)
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    all_samples = [s for step_samples in samples.values() for s in step_samples]
+    return {
+        'elapsed_s': round(elapsed, 3),
+        'steps': {name: summarize_samples(step_samples, elapsed) for name, step_samples in samples.items()},
+        'total': summarize_samples(all_samples, elapsed),
+    }
+
+
+def compare(previous, current):
+    """Các dòng so sánh p50/p95/p99, thông lượng và tỉ lệ lỗi với một lần chạy trước."""
+    lines = []
+    for name, now in list(current['steps'].items()) + [('total', current['total'])]:
+        before = previous['total'] if name == 'total' else previous.get('steps', {}).get(name)
+        if not before:
+            continue
+        parts = []
+        for key in ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps', 'error_rate'):
+            if before.get(key) and now.get(key) is not None:
+                parts.append(f"{key} {before[key]} -> {now[key]} ({(now[key] - before[key]) / before[key]:+.0%})")
+        lines.append(f"{name:>8}: " + ', '.join(parts))
+    return lines
+
+
+# -----------------------
+# Máy chủ cục bộ
+# -----------------------
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def serve(db_path, port):
+    """Chạy app trên 127.0.0.1:port với CSDL db_path (gọi trong tiến trình con)."""
+    from werkzeug.serving import make_server
+    try:
+        from . import app as webapp
+    except ImportError:
+        import app as webapp
+    app = webapp.create_app({'DB_PATH': db_path})
+    app.logger.disabled = True
+    make_server('127.0.0.1', port, app, threaded=True).serve_forever()
+
+
+def start_server(db_path, port, timeout=30):
+    """Khởi động serve() trong tiến trình con và chờ tới khi cổng nhận kết nối."""
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', db_path, '--port', str(port)],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("The app server exited during startup.")
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("The app server did not start in time.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a load scenario against a locally started (or given) app.")
+    parser.add_argument('scenario', nargs='?', choices=sorted(SCENARIOS), default='PT_LOAD_01')
+    parser.add_argument('--users', type=int, help="virtual users (default: scenario's)")
+    parser.add_argument('--ramp', type=float, help="seconds over which users are started")
+    parser.add_argument('--iterations', type=int, help="scenario loops per user; 0 = until --duration")
+    parser.add_argument('--duration', type=float, help="stop starting requests after N seconds")
+    parser.add_argument('--users-csv', help="username,password CSV (default: scenario's users_*.csv)")
+    parser.add_argument('--url', help="target an already running server instead of starting one")
+    parser.add_argument('--db', help="database for the local server (default: freshly seeded temp file)")
+    parser.add_argument('--restaurants', type=int, default=20, help="restaurants in the seeded database")
+    parser.add_argument('--reservations-per-day', type=int, default=20, help="per restaurant, seeded database")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out', help="write results JSON to this file")
+    parser.add_argument('--compare', help="previous results JSON to compare against")
+    parser.add_argument('--max-error-rate', type=float, default=0.01,
+                        help="exit with status 1 when the overall error rate is higher (default: 0.01)")
+    parser.add_argument('--serve', metavar='DB', help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.serve:
+        serve(args.serve, args.port)
+        return 0
+
+    scenario = SCENARIOS[args.scenario]
+    users = args.users or scenario['users']
+    ramp = scenario['ramp'] if args.ramp is None else args.ramp
+    iterations = scenario['iterations'] if args.iterations is None else args.iterations
+    duration = args.duration or scenario.get('duration')
+    if not iterations and not duration:
+        parser.error("--iterations 0 needs --duration.")
+    users_csv = args.users_csv or (scenario['users_csv'] and os.path.join(HERE, scenario['users_csv']))
+    user_rows = load_users(users_csv) if users_csv else None
+
+    process = tmpdir = None
+    base_url = args.url
+    try:
+        if not base_url:
+            db_path = args.db
+            if not db_path:
+                tmpdir = tempfile.mkdtemp(prefix='loadtest-')
+                db_path = os.path.join(tmpdir, 'load.db')
+                customers = max(len(user_rows or ()), 100)
+                print(f"Seeding {db_path} ({args.restaurants} restaurants, {customers} customers) ...")
+                generate(db_path, restaurants=args.restaurants, tables_per_restaurant=20, customers=customers,
+                         reservations_per_day=args.reservations_per_day, days=30, seed=args.seed, log=None)
+            port = free_port()
+            process = start_server(db_path, port)
+            base_url = f"http://127.0.0.1:{port}"
+
+        print(f"{args.scenario}: {users} users, ramp {ramp}s, "
+              f"{f'{iterations} iteration(s)' if iterations else 'looping'}"
+              f"{f', {duration}s max' if duration else ''} -> {base_url}")
+        result = run_load(base_url, scenario['steps'], users, ramp, iterations, duration, user_rows)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+        if tmpdir:
+            for name in os.listdir(tmpdir):
+                os.remove(os.path.join(tmpdir, name))
+            os.rmdir(tmpdir)
+
+    result = dict(scenario=args.scenario, started_at=datetime.now().isoformat(timespec='seconds'),
+                  config=dict(users=users, ramp=ramp, iterations=iterations, duration=duration,
+                              users_csv=users_csv and os.path.basename(users_csv), url=args.url), **result)
+    for name, stats in list(result['steps'].items()) + [('total', result['total'])]:
+        print(f"{name:>8}: {stats['requests']:6d} req  {stats['throughput_rps']:8.1f} req/s  "
+              f"err {stats['error_rate']:6.2%}  p50 {stats['p50_ms']} ms  p95 {stats['p95_ms']} ms  "
+              f"p99 {stats['p99_ms']} ms")
+    if args.compare:
+        with open(args.compare) as f:
+            for line in compare(json.load(f), result):
+                print(line)
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"Results written to {args.out}")
+    return 1 if result['total']['error_rate'] > args.max_error_rate else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
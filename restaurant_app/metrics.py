@@ -0,0 +1,283 @@
+"""
+Số đo hiệu năng trong tiến trình, xuất ra dạng văn bản Prometheus (text format 0.0.4) tại /metrics.
+
+Không phụ thuộc prometheus_client: mỗi Histogram chỉ là các mảng đếm theo bucket cho từng bộ nhãn,
+observe() là một bisect và vài phép cộng dưới một lock, đủ rẻ để bật thường trực.
+
+TimedConnection (factory của sqlite3.connect) cộng dồn thời gian execute/fetch của mọi câu lệnh
+trên kết nối; app.py đọc tổng này khi kết thúc request để ghi thời gian SQL của request đó.
+Mỗi worker (tiến trình) có số đo riêng; Prometheus gom theo nhãn instance.
+"""
+import sqlite3
+import threading
+from bisect import bisect_left
+from time import perf_counter
+
+try:
+    from .pool import Connection
+except ImportError:  # chạy trực tiếp
+    from pool import Connection
+
+# Giây; đủ mịn cho câu SQL ~1ms lẫn request chậm vài giây
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Histogram có nhãn: observe(giá_trị, *nhãn) theo đúng thứ tự labelnames."""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # [đếm theo bucket..., đếm +Inf, tổng]
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[i] += 1
+            series[-1] += value
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def lines(self):
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} histogram'
+        for labels, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series):
+                cumulative += count
+                le = _labels(self.labelnames, labels, f'le="{_number(float(bound))}"')
+                yield f'{self.name}_bucket{le} {cumulative}'
+            name_labels = _labels(self.labelnames, labels)
+            yield f'{self.name}_sum{name_labels} {_number(series[-1])}'
+            yield f'{self.name}_count{name_labels} {cumulative}'
+
+
+class Counter:
+    """Bộ đếm chỉ tăng, có nhãn."""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def lines(self):
+        with self._lock:
+            snapshot = dict(self._values)
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} counter'
+        for labels, value in sorted(snapshot.items()):
+            yield f'{self.name}{_labels(self.labelnames, labels)} {_number(value)}'
+
+
+class Registry:
+    """Tập các metric của tiến trình; collectors là hàm trả về (tên, kiểu, mô tả, [(nhãn, giá trị)])."""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, func):
+        self._collectors.append(func)
+
+    def clear(self):
+        for metric in self._metrics:
+            metric.clear()
+
+    def expose(self):
+        out = []
+        for metric in self._metrics:
+            out.extend(metric.lines())
+        for collect in self._collectors:
+            for name, kind, documentation, samples in collect():
+                out.append(f'# HELP {name} {documentation}')
+                out.append(f'# TYPE {name} {kind}')
+                for labels, value in samples:
+                    label_text = '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + '}' \
+                        if labels else ''
+                    out.append(f'{name}{label_text} {_number(value)}')
+        return '\n'.join(out) + '\n'
+
+
+# -----------------------
+# SQL timing
+# -----------------------
+class TimedCursor(sqlite3.Cursor):
+    """
+    Cursor cộng thời gian execute và fetch vào kết nối tạo ra nó.
+    Khi kết nối có tracer (xem sqltrace.py), thời gian của từng câu lệnh được giữ trên cursor và
+    chuyển cho tracer khi đã đọc hết kết quả, khi cursor chạy câu khác hoặc khi cursor bị hủy.
+    """
+    _trace = None
+
+    def _executed(self, sql, parameters, started):
+        elapsed = perf_counter() - started
+        conn = self.connection
+        conn.record_statement(sql, elapsed)
+        if conn.tracer is not None:
+            self._trace = [sql, parameters, elapsed, conn.trace_route]
+
+    def _fetched(self, started, done):
+        elapsed = perf_counter() - started
+        self.connection.sql_seconds += elapsed
+        if self._trace is not None:
+            self._trace[2] += elapsed
+            if done:
+                self.finish_trace()
+
+    def finish_trace(self):
+        trace, self._trace = self._trace, None
+        tracer = self.connection.tracer
+        if trace is not None and tracer is not None:
+            tracer.statement_finished(self.connection, *trace)
+
+    def execute(self, sql, parameters=()):
+        self.finish_trace()
+        started = perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._executed(sql, parameters, started)
+
+    def executemany(self, sql, seq_of_parameters):
+        self.finish_trace()
+        started = perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._executed(sql, None, started)
+
+    def executescript(self, sql_script):
+        self.finish_trace()
+        started = perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            self._executed(sql_script, None, started)
+
+    def fetchone(self):
+        started = perf_counter()
+        row = None
+        try:
+            row = super().fetchone()
+            return row
+        finally:
+            self._fetched(started, row is None)
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        started = perf_counter()
+        rows = []
+        try:
+            rows = super().fetchmany(size)
+            return rows
+        finally:
+            self._fetched(started, len(rows) < size)
+
+    def fetchall(self):
+        started = perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            self._fetched(started, True)
+
+    def __next__(self):
+        started = perf_counter()
+        done = True
+        try:
+            row = super().__next__()
+            done = False
+            return row
+        finally:
+            self._fetched(started, done)
+
+    def __del__(self):
+        if self._trace is not None:
+            self.finish_trace()
+
+
+class TimedConnection(Connection):
+    """
+    Kết nối đếm số câu lệnh và tổng thời gian SQL (sql_statements, sql_seconds).
+    Thời gian chờ khóa ghi (BEGIN IMMEDIATE bị busy_timeout giữ lại) được tách riêng vào lock_wait_seconds.
+    tracer (mặc định None) nhận từng câu lệnh kèm thời gian; trace_route là route gán cho các câu đó.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.reset()
+
+    def reset(self):
+        """Xóa số đo và tracer (kết nối được dùng lại cho request khác)."""
+        super().reset()
+        self.sql_statements = 0
+        self.sql_seconds = 0.0
+        self.lock_wait_seconds = 0.0
+        self.tracer = None
+        self.trace_route = None
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+    def record_statement(self, sql, seconds):
+        self.sql_statements += 1
+        self.sql_seconds += seconds
+        if sql.lstrip()[:5].upper() == 'BEGIN':
+            self.lock_wait_seconds += seconds
@@ -0,0 +1,427 @@
+"""
+Thông báo cho khách khi lượt đặt thay đổi (transactional outbox).
+
+Trigger trên Reservations ghi một dòng NotificationOutbox ngay trong giao dịch của thay đổi: tạo mới
+(kể cả danh sách chờ tự đặt), sửa ngày/giờ/số khách, đổi trạng thái (khách hủy, admin xác nhận/từ
+chối/hoàn tất, sweeper). Request chỉ tốn thêm một INSERT, và không thể commit thay đổi mà mất thông
+báo hay ngược lại. Mọi code ghi Reservations (app.py, waitlist.py, sweeper.py) đều được bao phủ.
+
+OutboxDispatcher gửi các dòng đến hạn tới một sink (FileSink: file JSONL; SmtpSink: máy chủ SMTP)
+trên một nhóm luồng nền. Mỗi luồng nhận một lô bằng cách đặt locked_until (lease) trong giao dịch
+ngắn, gửi từng dòng rồi ghi delivered_at. Gửi lỗi: thử lại sau backoff tăng gấp đôi mỗi lần; sau
+max_attempts lần dòng được giữ lại (last_error) để xem xét. Tiến trình chết giữa lúc gửi và lúc ghi
+delivered_at thì lease hết hạn và dòng được gửi lại: giao ít nhất một lần, bên nhận khử trùng theo
+outbox_id (Message-ID của email).
+
+Trong app bật bằng app.config['NOTIFY_SINK']; hoặc chạy riêng bằng cron:
+    python outbox.py --db restaurant_reservation.db deliver --file notifications.jsonl
+    python outbox.py deliver --smtp-host mail.example.com --smtp-port 25 --sender reservations@example.com
+    python outbox.py status
+    python outbox.py prune --days 30
+"""
+import argparse
+import json
+import logging
+import smtplib
+import sqlite3
+import sys
+import threading
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+
+try:
+    from .background import PeriodicWorker
+    from .pool import ConnectionPool
+except ImportError:  # chạy trực tiếp: python outbox.py
+    from background import PeriodicWorker
+    from pool import ConnectionPool
+
+log = logging.getLogger(__name__)
+
+BATCH_SIZE = 20
+MAX_ATTEMPTS = 8
+# Lần thử lại thứ n chờ BACKOFF_SECONDS * 2^(n-1) giây, tối đa MAX_BACKOFF_SECONDS
+BACKOFF_SECONDS = 30
+MAX_BACKOFF_SECONDS = 3600
+# Thời gian một luồng được giữ lô đã nhận; hết hạn mà chưa ghi kết quả thì luồng khác gửi lại
+LEASE_SECONDS = 120
+KEEP_DELIVERED_DAYS = 30
+
+# Ảnh chụp lượt đặt lúc thay đổi; email người nhận được lấy lúc gửi (khách có thể đã đổi email)
+_PAYLOAD = """json_object(
+        'restaurant_id', NEW.restaurant_id,
+        'restaurant', (SELECT name FROM Restaurants WHERE restaurant_id = NEW.restaurant_id),
+        'date', NEW.reservation_date, 'time', NEW.reservation_time,
+        'guests', NEW.guests, 'status', NEW.status{extra})"""
+
+# Thời điểm là UTC 'YYYY-MM-DD HH:MM:SS' như ReservationHistory.action_time
+OUTBOX_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS NotificationOutbox (
+    outbox_id       INTEGER PRIMARY KEY AUTOINCREMENT,
+    reservation_id  INTEGER NOT NULL,
+    customer_id     INTEGER NOT NULL,
+    event           TEXT NOT NULL,
+    payload         TEXT NOT NULL,
+    created_at      TIMESTAMP NOT NULL DEFAULT (DATETIME('now')),
+    attempts        INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP NOT NULL DEFAULT (DATETIME('now')),
+    locked_until    TIMESTAMP,
+    delivered_at    TIMESTAMP,
+    last_error      TEXT
+);
+
+-- Chỉ các dòng chưa gửi; dòng đã gửi không làm chậm việc tìm dòng đến hạn
+CREATE INDEX IF NOT EXISTS idx_outbox_due
+    ON NotificationOutbox (next_attempt_at) WHERE delivered_at IS NULL;
+
+CREATE TRIGGER IF NOT EXISTS trg_outbox_reservations_insert AFTER INSERT ON Reservations
+BEGIN
+    INSERT INTO NotificationOutbox (reservation_id, customer_id, event, payload)
+    VALUES (NEW.reservation_id, NEW.customer_id, 'created', {_PAYLOAD.format(extra='')});
+END;
+
+-- Đổi bàn (assignment.py) không báo khách; sửa ngày/giờ/số khách là 'modified', còn lại là trạng thái mới
+CREATE TRIGGER IF NOT EXISTS trg_outbox_reservations_update
+AFTER UPDATE OF status, reservation_date, reservation_time, guests ON Reservations
+WHEN OLD.status IS NOT NEW.status OR OLD.reservation_date IS NOT NEW.reservation_date
+     OR OLD.reservation_time IS NOT NEW.reservation_time OR OLD.guests IS NOT NEW.guests
+BEGIN
+    INSERT INTO NotificationOutbox (reservation_id, customer_id, event, payload)
+    VALUES (NEW.reservation_id, NEW.customer_id,
+            CASE WHEN OLD.reservation_date IS NOT NEW.reservation_date
+                      OR OLD.reservation_time IS NOT NEW.reservation_time
+                      OR OLD.guests IS NOT NEW.guests THEN 'modified' ELSE NEW.status END,
+            {_PAYLOAD.format(extra=", 'previous_date', OLD.reservation_date, 'previous_time', OLD.reservation_time, 'previous_status', OLD.status")});
+END;
+"""
+
+OUTBOX_TRIGGERS = ('trg_outbox_reservations_insert', 'trg_outbox_reservations_update')
+
+# Khách đã bị xóa (mềm) thì email là NULL: dòng được đóng lại mà không gửi
+CLAIM_ROWS = """
+    SELECT o.outbox_id, o.reservation_id, o.event, o.payload, o.attempts,
+           CASE WHEN c.deleted_at IS NULL THEN c.email END AS email, c.full_name
+    FROM NotificationOutbox o
+    LEFT JOIN Customers c ON c.customer_id = o.customer_id
+    WHERE o.delivered_at IS NULL AND o.next_attempt_at <= ? AND o.attempts < ?
+      AND (o.locked_until IS NULL OR o.locked_until <= ?)
+    ORDER BY o.next_attempt_at, o.outbox_id
+    LIMIT ?
+"""
+
+SUBJECTS = {
+    'created': "Reservation received",
+    'modified': "Reservation updated",
+    'pending': "Reservation pending confirmation",
+    'confirmed': "Reservation confirmed",
+    'rejected': "Reservation declined",
+    'cancelled': "Reservation cancelled",
+    'completed': "Thank you for dining with us",
+}
+
+
+def create_outbox_schema(db):
+    db.executescript(OUTBOX_SCHEMA)
+
+
+def _now(offset=0):
+    return (datetime.now(timezone.utc) + timedelta(seconds=offset)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def build_message(row):
+    """Thông báo (dict) cho một dòng outbox đã nhận: người nhận, tiêu đề, nội dung và ảnh chụp lượt đặt."""
+    reservation = json.loads(row['payload'])
+    event = row['event']
+    subject = f"{SUBJECTS.get(event, 'Reservation ' + event)}: {reservation['restaurant']}"
+    when = f"{reservation['date']} at {reservation['time']}"
+    if event == 'modified':
+        detail = (f"Your reservation has been moved from {reservation['previous_date']} at "
+                  f"{reservation['previous_time']} to {when} for {reservation['guests']} guest(s). "
+                  f"It is now {reservation['status']}.")
+    else:
+        detail = (f"Your reservation on {when} for {reservation['guests']} guest(s) "
+                  f"is {reservation['status']}.")
+    return {
+        'id': row['outbox_id'],
+        'reservation_id': row['reservation_id'],
+        'event': event,
+        'to': row['email'],
+        'name': row['full_name'],
+        'subject': subject,
+        'body': f"Hello {row['full_name'] or 'there'},\n\n{detail}\n\n{reservation['restaurant']}\n",
+        'reservation': reservation,
+    }
+
+
+# -----------------------
+# Sinks
+# -----------------------
+class FileSink:
+    """Ghi mỗi thông báo thành một dòng JSON (môi trường dev/test, hoặc cho tiến trình khác đọc tiếp)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def send(self, message):
+        line = json.dumps(message, ensure_ascii=False, sort_keys=True) + '\n'
+        with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line)
+
+    def close(self):
+        pass
+
+
+class SmtpSink:
+    """Gửi email qua SMTP; mỗi luồng giữ một kết nối và mở lại khi máy chủ đã ngắt."""
+
+    def __init__(self, host='localhost', port=25, sender='reservations@localhost', timeout=10,
+                 starttls=False, username=None, password=None):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.timeout = timeout
+        self.starttls = starttls
+        self.username = username
+        self.password = password
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.starttls:
+            smtp.starttls()
+        if self.username:
+            smtp.login(self.username, self.password)
+        self._local.smtp = smtp
+        with self._lock:
+            self._connections.append(smtp)
+        return smtp
+
+    def _drop(self, smtp):
+        self._local.smtp = None
+        with self._lock:
+            if smtp in self._connections:
+                self._connections.remove(smtp)
+        try:
+            smtp.close()
+        except OSError:
+            pass
+
+    def send(self, message):
+        email = EmailMessage()
+        email['From'] = self.sender
+        email['To'] = message['to']
+        email['Subject'] = message['subject']
+        domain = self.sender.rpartition('@')[2] or 'localhost'
+        email['Message-ID'] = f"<outbox-{message['id']}@{domain}>"
+        email.set_content(message['body'])
+        smtp = getattr(self._local, 'smtp', None)
+        if smtp is not None:
+            try:
+                smtp.send_message(email)
+                return
+            except smtplib.SMTPServerDisconnected:
+                self._drop(smtp)
+        smtp = self._connect()
+        try:
+            smtp.send_message(email)
+        except (smtplib.SMTPServerDisconnected, OSError):
+            self._drop(smtp)
+            raise
+
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for smtp in connections:
+            try:
+                smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                smtp.close()
+
+
+# -----------------------
+# Dispatcher
+# -----------------------
+class OutboxDispatcher:
+    """Nhóm workers luồng nền gửi NotificationOutbox của db_path tới sink; wake() sau khi commit để gửi ngay."""
+
+    def __init__(self, db_path, sink, workers=2, interval=5.0, batch_size=BATCH_SIZE, max_attempts=MAX_ATTEMPTS,
+                 backoff=BACKOFF_SECONDS, lease=LEASE_SECONDS, profile='default'):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.lease = lease
+        self.pool = ConnectionPool(db_path, size=workers + 1, profile=profile)
+        self.workers = [PeriodicWorker(f'outbox-{n}', interval, self.deliver_pending) for n in range(workers)]
+        self._lock = threading.Lock()
+        self.delivered = 0
+        self.failed = 0
+
+    def ensure_started(self):
+        for worker in self.workers:
+            worker.ensure_started()
+
+    def wake(self):
+        for worker in self.workers:
+            worker.wake()
+
+    def claim(self, db):
+        """Nhận tối đa batch_size dòng đến hạn (đặt lease) trong một giao dịch ngắn."""
+        now = _now()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            rows = db.execute(CLAIM_ROWS, (now, self.max_attempts, now, self.batch_size)).fetchall()
+            if rows:
+                db.executemany("UPDATE NotificationOutbox SET locked_until = ? WHERE outbox_id = ?",
+                               [(_now(self.lease), row['outbox_id']) for row in rows])
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        return rows
+
+    def _retry_delay(self, attempts):
+        return min(self.backoff * 2 ** (attempts - 1), MAX_BACKOFF_SECONDS)
+
+    def deliver_batch(self, db, rows):
+        """Gửi các dòng đã nhận rồi ghi kết quả của cả lô trong một giao dịch; trả về số dòng đã gửi."""
+        done, failed = [], []
+        for row in rows:
+            if row['email'] is None:
+                done.append((_now(), 'customer deleted', row['outbox_id']))
+                continue
+            try:
+                self.sink.send(build_message(row))
+            except Exception as exc:
+                attempts = row['attempts'] + 1
+                if attempts >= self.max_attempts:
+                    log.error("Giving up on notification %s after %s attempts: %r",
+                              row['outbox_id'], attempts, exc)
+                failed.append((_now(self._retry_delay(attempts)), repr(exc)[:500], row['outbox_id']))
+            else:
+                done.append((_now(), None, row['outbox_id']))
+        try:
+            db.executemany("""
+                UPDATE NotificationOutbox SET delivered_at = ?, last_error = ?, locked_until = NULL
+                WHERE outbox_id = ?
+            """, done)
+            db.executemany("""
+                UPDATE NotificationOutbox
+                SET attempts = attempts + 1, next_attempt_at = ?, last_error = ?, locked_until = NULL
+                WHERE outbox_id = ?
+            """, failed)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        with self._lock:
+            self.delivered += len(done)
+            self.failed += len(failed)
+        return len(done)
+
+    def deliver_pending(self):
+        """Nhận và gửi từng lô cho tới khi không còn dòng đến hạn; trả về số dòng đã gửi."""
+        db = self.pool.acquire()
+        try:
+            sent = 0
+            while True:
+                rows = self.claim(db)
+                if not rows:
+                    return sent
+                sent += self.deliver_batch(db, rows)
+        finally:
+            self.pool.release(db)
+
+    def backlog(self):
+        """(số dòng chờ gửi, số dòng đã bỏ cuộc, tuổi (giây) của dòng chờ lâu nhất hoặc 0)."""
+        db = self.pool.acquire()
+        try:
+            return outbox_backlog(db, self.max_attempts)
+        finally:
+            self.pool.release(db)
+
+    def close(self, timeout=None):
+        for worker in self.workers:
+            worker.stop(timeout)
+        self.sink.close()
+        self.pool.close()
+
+
+def outbox_backlog(db, max_attempts=MAX_ATTEMPTS):
+    """Xem OutboxDispatcher.backlog()."""
+    pending, dead, oldest = db.execute("""
+        SELECT COALESCE(SUM(attempts < ?), 0), COALESCE(SUM(attempts >= ?), 0),
+               MIN(CASE WHEN attempts < ? THEN created_at END)
+        FROM NotificationOutbox WHERE delivered_at IS NULL
+    """, (max_attempts, max_attempts, max_attempts)).fetchone()
+    age = 0.0
+    if oldest:
+        age = db.execute("SELECT (JULIANDAY('now') - JULIANDAY(?)) * 86400", (oldest,)).fetchone()[0]
+    return pending, dead, max(age, 0.0)
+
+
+def prune_delivered(db, days=KEEP_DELIVERED_DAYS):
+    """Xóa các dòng đã gửi quá days ngày; trả về số dòng đã xóa."""
+    cur = db.execute("DELETE FROM NotificationOutbox WHERE delivered_at < ?", (_now(-days * 86400),))
+    db.commit()
+    return cur.rowcount
+
+
+def make_sink(kind, path=None, host='localhost', port=25, sender='reservations@localhost'):
+    """Sink theo tên cấu hình: 'file' hoặc 'smtp'."""
+    if kind == 'file':
+        return FileSink(path)
+    if kind == 'smtp':
+        return SmtpSink(host, port, sender)
+    raise ValueError(f"Unknown notification sink {kind!r}; expected 'file' or 'smtp'.")
+
+
+def main(argv=None):
+    # Import trong hàm: init_database import module này khi nạp
+    try:
+        from .init_database import DB_PATH
+    except ImportError:  # chạy trực tiếp: python outbox.py
+        from init_database import DB_PATH
+    parser = argparse.ArgumentParser(description="Deliver queued reservation notifications.")
+    parser.add_argument('--db', default=DB_PATH, help="path to the SQLite database")
+    sub = parser.add_subparsers(dest='command', required=True)
+    deliver = sub.add_parser('deliver', help="send every notification that is due, then exit")
+    target = deliver.add_mutually_exclusive_group(required=True)
+    target.add_argument('--file', help="append notifications to this JSONL file")
+    target.add_argument('--smtp-host', help="send notifications as email through this SMTP server")
+    deliver.add_argument('--smtp-port', type=int, default=25)
+    deliver.add_argument('--sender', default='reservations@localhost', help="From address for email")
+    deliver.add_argument('--max-attempts', type=int, default=MAX_ATTEMPTS)
+    sub.add_parser('status', help="print the notification backlog")
+    prune = sub.add_parser('prune', help="delete delivered notifications older than --days")
+    prune.add_argument('--days', type=int, default=KEEP_DELIVERED_DAYS)
+    args = parser.parse_args(argv)
+
+    if args.command == 'deliver':
+        sink = make_sink('file', args.file) if args.file else \
+            make_sink('smtp', host=args.smtp_host, port=args.smtp_port, sender=args.sender)
+        dispatcher = OutboxDispatcher(args.db, sink, workers=1, max_attempts=args.max_attempts)
+        try:
+            sent = dispatcher.deliver_pending()
+        finally:
+            dispatcher.close()
+        print(f"Delivered {sent} notification(s); {dispatcher.failed} attempt(s) failed and will be retried.")
+        return 0
+
+    db = sqlite3.connect(args.db)
+    try:
+        if args.command == 'prune':
+            print(f"Deleted {prune_delivered(db, args.days)} delivered notification(s).")
+        else:
+            pending, dead, age = outbox_backlog(db)
+            print(f"pending={pending} gave_up={dead} oldest_pending_age={age:.0f}s")
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
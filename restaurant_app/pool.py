@@ -0,0 +1,143 @@
+"""
+Kết nối SQLite cho tiến trình web.
+
+connect() mở kết nối với các PRAGMA của một storage profile:
+    'default' : giữ journal mặc định của file (như trước đây)
+    'wal'     : journal_mode=WAL + synchronous=NORMAL, người đọc không chặn người ghi; nên dùng
+                khi chạy nhiều worker (gunicorn -w N)
+ConnectionPool giữ lại tối đa size kết nối rảnh để request sau dùng lại (bỏ qua chi phí mở file,
+đọc schema và giữ nguyên page cache). Pool an toàn với fork: kết nối nào mở trước khi fork thì
+tiến trình con không bao giờ dùng hay đóng (tiến trình con tự mở kết nối mới); pool cũng bỏ các
+kết nối rảnh khi file CSDL bị thay bằng file khác (khôi phục backup, test tạo lại CSDL).
+Connection (factory của pool trong app khi tắt metrics; metrics.TimedConnection kế thừa nó) cho phép
+đăng ký việc chỉ làm khi giao dịch commit thành công.
+"""
+import os
+import sqlite3
+import threading
+
+STORAGE_PROFILES = {
+    'default': (),
+    'wal': ("PRAGMA journal_mode = WAL", "PRAGMA synchronous = NORMAL"),
+}
+
+class Connection(sqlite3.Connection):
+    """
+    Hàm đăng ký bằng after_commit() chạy sau lần commit() thành công kế tiếp, và bị bỏ khi rollback()
+    (kể cả khi pool trả kết nối về với giao dịch dở dang). Chỉ commit()/rollback() gọi tường minh mới
+    được tính; `with db:` đi thẳng vào C và không gọi các hàm này.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._after_commit = []
+
+    def reset(self):
+        """Xóa trạng thái của request trước (kết nối được dùng lại)."""
+        self._after_commit = []
+
+    def after_commit(self, func):
+        self._after_commit.append(func)
+
+    def commit(self):
+        super().commit()
+        callbacks, self._after_commit = self._after_commit, []
+        for func in callbacks:
+            func()
+
+    def rollback(self):
+        self._after_commit = []
+        super().rollback()
+
+
+# Kết nối được thừa hưởng qua fork: giữ tham chiếu để GC không đóng chúng trong tiến trình con
+_inherited = []
+
+
+def connect(db_path, profile='default', cache_kb=None, factory=sqlite3.Connection, read_only=False):
+    """Kết nối dùng trong request: Row, PARSE_DECLTYPES, khóa ngoại bật và PRAGMA của profile."""
+    if profile not in STORAGE_PROFILES:
+        raise ValueError(f"Unknown storage profile {profile!r}; expected one of {sorted(STORAGE_PROFILES)}.")
+    db = sqlite3.connect(db_path, detect_types=sqlite3.PARSE_DECLTYPES, factory=factory, check_same_thread=False)
+    db.row_factory = sqlite3.Row
+    db.execute("PRAGMA foreign_keys = ON;")
+    for pragma in STORAGE_PROFILES[profile]:
+        db.execute(pragma)
+    if cache_kb:
+        db.execute(f"PRAGMA cache_size = -{int(cache_kb)}")
+    if read_only:
+        db.execute("PRAGMA query_only = ON")
+    return db
+
+
+def _file_id(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_dev, st.st_ino)
+
+
+class ConnectionPool:
+    """Tối đa size kết nối rảnh cho db_path; size = 0 thì mỗi request mở/đóng kết nối riêng."""
+
+    def __init__(self, db_path, size=4, profile='default', cache_kb=None, factory=sqlite3.Connection, read_only=False):
+        self.db_path = db_path
+        self.size = size
+        self.profile = profile
+        self.cache_kb = cache_kb
+        self.factory = factory
+        self.read_only = read_only
+        self._idle = []
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._file = None
+        self.opened = 0
+        self.reused = 0
+
+    def _check_owner(self):
+        """Gọi khi giữ _lock: sau fork hoặc khi file CSDL bị thay, bỏ các kết nối rảnh hiện có."""
+        if self._pid != os.getpid():
+            _inherited.extend(self._idle)
+            self._idle = []
+            self._pid = os.getpid()
+        file_id = _file_id(self.db_path)
+        if file_id != self._file:
+            stale, self._idle = self._idle, []
+            self._file = file_id
+            for db in stale:
+                db.close()
+
+    def acquire(self):
+        with self._lock:
+            self._check_owner()
+            if self._idle:
+                self.reused += 1
+                return self._idle.pop()
+        db = connect(self.db_path, self.profile, self.cache_kb, self.factory, self.read_only)
+        with self._lock:
+            self.opened += 1
+            if self._file is None:
+                self._file = _file_id(self.db_path)
+        return db
+
+    def release(self, db):
+        """Trả kết nối về pool (giao dịch dở dang bị rollback); đóng nếu pool đã đầy."""
+        if db.in_transaction:
+            db.rollback()
+        with self._lock:
+            if self._pid == os.getpid() and len(self._idle) < self.size and _file_id(self.db_path) == self._file:
+                self._idle.append(db)
+                return
+        db.close()
+
+    @property
+    def idle(self):
+        return len(self._idle)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        if self._pid == os.getpid():
+            for db in idle:
+                db.close()
@@ -0,0 +1,101 @@
+"""
+Profile từng request bằng cProfile, chỉ khi được bật.
+
+app.py bắt đầu profile trong before_request khi:
+  - request được lấy mẫu theo PROFILE_SAMPLE_RATE (0..1, biến môi trường RESTAURANT_PROFILE_SAMPLE_RATE), hoặc
+  - admin đã đăng nhập gửi header PROFILE_HEADER (mặc định 'X-Profile').
+Khi tắt (rate 0, không có header) mỗi request chỉ tốn vài phép tra config/header, không bật profiler.
+
+Mỗi request được profile lưu một file pstats trong PROFILE_DIR và ghi cây lời gọi tóm tắt
+(bắt đầu từ hàm view, chỉ các nhánh chiếm >= min_fraction thời gian) vào log.
+Xem lại file: python -m pstats profiles/<file>.prof
+"""
+import cProfile
+import inspect
+import logging
+import os
+import pstats
+import re
+from datetime import datetime
+
+log = logging.getLogger(__name__)
+
+PROFILE_DIR = "profiles"
+
+
+def start_profile():
+    """Bật cProfile cho luồng hiện tại; None nếu đã có profiler khác đang chạy (Python 3.12+ chỉ cho một)."""
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        return None
+    return profile
+
+
+def function_key(func):
+    """Khóa pstats (file, dòng, tên) của hàm, bỏ qua các decorator dùng functools.wraps."""
+    code = inspect.unwrap(func).__code__
+    return (code.co_filename, code.co_firstlineno, code.co_name)
+
+
+def _label(key):
+    filename, line, name = key
+    if filename == '~':
+        return name
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+
+def call_tree(stats, root=None, min_fraction=0.02, max_depth=8):
+    """
+    Các dòng cây lời gọi từ root (khóa pstats) theo thời gian cộng dồn; không có root thì lấy hàm
+    có thời gian cộng dồn lớn nhất. Nhánh nhỏ hơn min_fraction của root bị bỏ qua.
+    """
+    entries = stats.stats
+    if not entries:
+        return []
+    if root not in entries:
+        root = max(entries, key=lambda key: entries[key][3])
+    callees = {}
+    for key, (_cc, _nc, _tt, _ct, callers) in entries.items():
+        for caller, caller_stats in callers.items():
+            # caller_stats = (cc, nc, tt, ct) của lời gọi caller -> key
+            callees.setdefault(caller, []).append((caller_stats[3], caller_stats[1], key))
+    total = entries[root][3] or 1e-9
+    lines = []
+
+    def walk(key, cumulative, calls, depth, path):
+        lines.append(f"{'  ' * depth}{cumulative * 1000:8.1f} ms {cumulative / total:6.1%} {calls:6d}x  {_label(key)}")
+        if depth >= max_depth:
+            return
+        for child_ct, child_calls, child in sorted(callees.get(key, ()), reverse=True):
+            if child_ct < total * min_fraction:
+                break
+            if child not in path:
+                walk(child, child_ct, child_calls, depth + 1, path | {child})
+
+    walk(root, entries[root][3], entries[root][1], 0, {root})
+    return lines
+
+
+class RequestProfiler:
+    """Lưu file pstats và ghi cây lời gọi của các request được profile."""
+
+    def __init__(self, directory=PROFILE_DIR, min_fraction=0.02, max_depth=8):
+        self.directory = directory
+        self.min_fraction = min_fraction
+        self.max_depth = max_depth
+        self.saved = 0
+
+    def finish(self, profile, label, elapsed, root=None):
+        """Dừng profile và lưu; trả về đường dẫn file .prof."""
+        profile.disable()
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        safe_label = re.sub(r'[^A-Za-z0-9_.-]+', '_', label).strip('_') or 'request'
+        path = os.path.join(self.directory, f"{stamp}-{safe_label}-{elapsed * 1000:.0f}ms.prof")
+        profile.dump_stats(path)
+        self.saved += 1
+        tree = call_tree(pstats.Stats(profile), root, self.min_fraction, self.max_depth)
+        log.info("Profiled %s in %.1f ms -> %s\n%s", label, elapsed * 1000, path, "\n".join(tree))
+        return path
@@ -0,0 +1,184 @@
+"""
+Xóa khách hàng / nhà hàng theo hai bước để không khóa CSDL trong suốt cả chuỗi cascade.
+
+  1. schedule_deletion(): đánh dấu deleted_at (mọi trang đọc đều bỏ qua dòng này) và ghi một dòng
+     PendingDeletions với tổng số dòng phụ thuộc cần dọn. Chỉ là vài câu lệnh ngắn.
+  2. purge_pending(): xóa dần các lượt đặt (kèm lịch sử), lượt đặt đã lưu trữ và bàn, mỗi khối
+     tối đa chunk_size dòng trong một giao dịch; khi hết mới xóa hẳn dòng gốc. Tiến độ nằm ở
+     PendingDeletions.purged / total (trang /admin/deletions).
+
+Ứng dụng web chạy bước 2 trên luồng nền (app.config['PURGE_INTERVAL_SECONDS']); cũng có thể chạy tay:
+    python purge.py --db restaurant_reservation.db
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from urllib.parse import quote
+
+CHUNK_SIZE = 500
+
+PURGE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS PendingDeletions (
+    deletion_id  INTEGER PRIMARY KEY AUTOINCREMENT,
+    entity       TEXT NOT NULL CHECK (entity IN ('customer', 'restaurant')),
+    entity_id    INTEGER NOT NULL,
+    label        TEXT,
+    requested_by INTEGER,
+    requested_at TIMESTAMP DEFAULT (DATETIME('now')),
+    total        INTEGER NOT NULL DEFAULT 0,
+    purged       INTEGER NOT NULL DEFAULT 0,
+    finished_at  TIMESTAMP,
+    UNIQUE (entity, entity_id)
+);
+"""
+
+# entity -> (bảng gốc, khóa chính, cột hiển thị)
+ENTITIES = {
+    'customer': ('Customers', 'customer_id', 'username'),
+    'restaurant': ('Restaurants', 'restaurant_id', 'name'),
+}
+
+# entity -> các bảng phụ thuộc (bảng, cột khóa ngoại, khóa chính), xóa theo thứ tự này.
+# ReservationHistory đi theo Reservations bằng ON DELETE CASCADE.
+DEPENDENTS = {
+    'customer': [
+        ('Waitlist', 'customer_id', 'waitlist_id'),
+        ('Reservations', 'customer_id', 'reservation_id'),
+        ('ArchivedReservations', 'customer_id', 'reservation_id'),
+    ],
+    'restaurant': [
+        ('Waitlist', 'restaurant_id', 'waitlist_id'),
+        ('Reservations', 'restaurant_id', 'reservation_id'),
+        ('ArchivedReservations', 'restaurant_id', 'reservation_id'),
+        ('Tables', 'restaurant_id', 'table_id'),
+    ],
+}
+
+
+def create_purge_schema(db):
+    db.executescript(PURGE_SCHEMA)
+
+
+def schedule_deletion(db, entity, entity_id, admin_id=None):
+    """
+    Xóa mềm một khách hàng/nhà hàng và xếp lịch dọn dữ liệu liên quan (chưa commit).
+    Trả về deletion_id, hoặc None nếu không tìm thấy hoặc đã bị xóa trước đó.
+    """
+    table, key, label_column = ENTITIES[entity]
+    row = db.execute(f"SELECT {label_column} FROM {table} WHERE {key} = ? AND deleted_at IS NULL",
+                     (entity_id,)).fetchone()
+    if row is None:
+        return None
+    db.execute(f"UPDATE {table} SET deleted_at = DATETIME('now') WHERE {key} = ?", (entity_id,))
+    total = sum(db.execute(f"SELECT COUNT(*) FROM {dep} WHERE {column} = ?", (entity_id,)).fetchone()[0]
+                for dep, column, _ in DEPENDENTS[entity])
+    cur = db.execute("""
+        INSERT INTO PendingDeletions (entity, entity_id, label, requested_by, total)
+        VALUES (?, ?, ?, ?, ?)
+    """, (entity, entity_id, row[0], admin_id, total))
+    return cur.lastrowid
+
+
+def purge_chunk(db, deletion_id, entity, entity_id, chunk_size=CHUNK_SIZE):
+    """Xóa tối đa chunk_size dòng phụ thuộc trong một giao dịch. Trả về (số dòng đã xóa, đã xong chưa)."""
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        removed = 0
+        for dep, column, dep_key in DEPENDENTS[entity]:
+            cur = db.execute(f"""
+                DELETE FROM {dep} WHERE {dep_key} IN (
+                    SELECT {dep_key} FROM {dep} WHERE {column} = ? LIMIT ?
+                )
+            """, (entity_id, chunk_size - removed))
+            removed += cur.rowcount
+            if removed >= chunk_size:
+                break
+        finished = removed < chunk_size
+        if finished:
+            # Không còn dòng phụ thuộc: cascade của câu DELETE này gần như không phải làm gì
+            table, key, _ = ENTITIES[entity]
+            db.execute(f"DELETE FROM {table} WHERE {key} = ?", (entity_id,))
+        db.execute("""
+            UPDATE PendingDeletions
+            SET purged = purged + ?, finished_at = CASE WHEN ? THEN DATETIME('now') END
+            WHERE deletion_id = ?
+        """, (removed, finished, deletion_id))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return removed, finished
+
+
+def purge_pending(db, chunk_size=CHUNK_SIZE, pause=0.0, max_chunks=None):
+    """Dọn mọi yêu cầu xóa chưa xong (hoặc tối đa max_chunks khối). Trả về tổng số dòng phụ thuộc đã xóa."""
+    total = chunks = 0
+    pending = db.execute("""
+        SELECT deletion_id, entity, entity_id FROM PendingDeletions
+        WHERE finished_at IS NULL ORDER BY deletion_id
+    """).fetchall()
+    for deletion_id, entity, entity_id in pending:
+        finished = False
+        while not finished:
+            if max_chunks is not None and chunks >= max_chunks:
+                return total
+            removed, finished = purge_chunk(db, deletion_id, entity, entity_id, chunk_size)
+            total += removed
+            chunks += 1
+            if pause and not finished:
+                time.sleep(pause)
+    return total
+
+
+def purge_database(db_path, **kwargs):
+    """Mở kết nối riêng tới db_path (không tạo file mới nếu file đã bị xóa) và chạy purge_pending."""
+    db = sqlite3.connect(f"file:{quote(os.path.abspath(db_path))}?mode=rw", uri=True, timeout=30)
+    db.execute("PRAGMA foreign_keys = ON;")
+    try:
+        return purge_pending(db, **kwargs)
+    finally:
+        db.close()
+
+
+def deletion_progress(db, limit=50):
+    """Các yêu cầu xóa gần nhất, chưa xong trước."""
+    return db.execute("""
+        SELECT * FROM PendingDeletions
+        ORDER BY finished_at IS NOT NULL, deletion_id DESC
+        LIMIT ?
+    """, (limit,)).fetchall()
+
+
+def main(argv=None):
+    # Import trong hàm: init_database import module này khi nạp
+    try:
+        from .init_database import DB_PATH
+    except ImportError:  # chạy trực tiếp: python purge.py
+        from init_database import DB_PATH
+    parser = argparse.ArgumentParser(description="Purge data belonging to soft-deleted customers and restaurants.")
+    parser.add_argument('--db', default=DB_PATH, help="database file")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--pause', type=float, default=0.05, help="seconds to sleep between chunks")
+    parser.add_argument('--status', action='store_true', help="only print pending deletions")
+    args = parser.parse_args(argv)
+
+    db = sqlite3.connect(args.db, timeout=30)
+    db.row_factory = sqlite3.Row
+    db.execute("PRAGMA foreign_keys = ON;")
+    try:
+        if not args.status:
+            started = time.perf_counter()
+            removed = purge_pending(db, chunk_size=args.chunk_size, pause=args.pause)
+            print(f"Purged {removed} dependent rows in {time.perf_counter() - started:.2f}s.")
+        for row in deletion_progress(db):
+            state = f"done {row['finished_at']}" if row['finished_at'] else "pending"
+            print(f"{row['entity']} {row['entity_id']} ({row['label']}): {row['purged']}/{row['total']} rows, {state}")
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,227 @@
+"""
+Giới hạn kích thước ReservationHistory: gộp các lần đổi trạng thái cũ, xóa dòng quá hạn lưu giữ
+và trả dung lượng trống về cho hệ điều hành.
+
+  1. Gộp: với mỗi lượt đặt, các dòng đổi trạng thái cũ hơn compact_after_days ngày mà đã bị một
+     lần đổi sau ghi đè được thay bằng một dòng 'status:summary'. Dòng trạng thái mới nhất được giữ.
+  2. Xóa: mỗi loại hành động có thời hạn lưu giữ riêng (RETENTION_DAYS, None = giữ mãi).
+  3. PRAGMA incremental_vacuum theo từng bước nhỏ (cần auto_vacuum = INCREMENTAL, xem
+     --enable-incremental-vacuum cho CSDL cũ).
+
+Rollup báo cáo (analytics.py) được cập nhật trước, nên số liệu hủy/từ chối không bị mất.
+    python retention.py --keep modified=180 --keep status:*=365
+"""
+import argparse
+import sqlite3
+import sys
+import time
+from datetime import date, timedelta
+
+try:
+    from .analytics import refresh_rollups
+    from .init_database import DB_PATH
+except ImportError:  # chạy trực tiếp: python retention.py
+    from analytics import refresh_rollups
+    from init_database import DB_PATH
+
+CHUNK_SIZE = 500
+COMPACT_AFTER_DAYS = 30
+VACUUM_STEP_PAGES = 1000
+
+# Số ngày giữ lại theo hành động; 'tiền_tố*' áp dụng cho mọi hành động cùng tiền tố chưa có luật
+# riêng, hành động không có trong bảng được giữ mãi.
+RETENTION_DAYS = {
+    'cancelled': None,
+    'modified': 365,
+    'reassigned': 365,
+    'expired': 365,
+    'status:summary': None,
+    'status:*': 730,
+}
+
+SUMMARY_ACTION = 'status:summary'
+STATUS_ACTIONS = "(action LIKE 'status:%' OR action = 'expired')"
+
+
+def _cutoff(days, today=None):
+    return ((today or date.today()) - timedelta(days=days)).isoformat()
+
+
+def _compact_reservation(db, reservation_id, before):
+    """Gộp các dòng trạng thái đã bị ghi đè của một lượt đặt; trả về số dòng giảm được."""
+    rows = db.execute(f"""
+        SELECT history_id, action, action_time, note FROM ReservationHistory
+        WHERE reservation_id = ? AND {STATUS_ACTIONS} AND action_time < ?
+        ORDER BY action_time, action != ?, history_id
+    """, (reservation_id, before, SUMMARY_ACTION)).fetchall()
+    superseded = rows[:-1]
+    if not any(row[1] != SUMMARY_ACTION for row in superseded):
+        return 0
+    parts = [row[3] if row[1] == SUMMARY_ACTION else f"{row[2]} {row[1].split(':', 1)[-1]}"
+             for row in superseded]
+    db.execute("""
+        INSERT INTO ReservationHistory (reservation_id, action, action_time, note)
+        VALUES (?, ?, ?, ?)
+    """, (reservation_id, SUMMARY_ACTION, superseded[-1][2], "; ".join(parts)))
+    marks = ", ".join("?" * len(superseded))
+    db.execute(f"DELETE FROM ReservationHistory WHERE history_id IN ({marks})", [row[0] for row in superseded])
+    return len(superseded) - 1
+
+
+def compact_history(db, compact_after_days=COMPACT_AFTER_DAYS, today=None, chunk_size=CHUNK_SIZE):
+    """Gộp lịch sử trạng thái, mỗi khối chunk_size lượt đặt một giao dịch. Trả về số dòng giảm được."""
+    refresh_rollups(db)
+    before = _cutoff(compact_after_days, today)
+    removed = last_id = 0
+    while True:
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            # Chỉ những lượt đặt có ít nhất 2 lần đổi trạng thái thật (không tính dòng summary cũ)
+            ids = [row[0] for row in db.execute(f"""
+                SELECT reservation_id FROM ReservationHistory
+                WHERE reservation_id > ? AND {STATUS_ACTIONS} AND action_time < ?
+                GROUP BY reservation_id
+                HAVING COUNT(*) - SUM(action = ?) > 1
+                ORDER BY reservation_id
+                LIMIT ?
+            """, (last_id, before, SUMMARY_ACTION, chunk_size))]
+            for res_id in ids:
+                removed += _compact_reservation(db, res_id, before)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        if len(ids) < chunk_size:
+            return removed
+        last_id = ids[-1]
+
+
+def retention_rules(policy):
+    """Đổi policy thành danh sách (luật, điều kiện SQL, tham số, số ngày); luật chính xác được ưu tiên hơn tiền tố."""
+    exact = [action for action in policy if not action.endswith('*')]
+    rules = []
+    for action, days in policy.items():
+        if days is None:
+            continue
+        if action.endswith('*'):
+            clause = "action LIKE ?"
+            params = [action[:-1] + '%']
+            if exact:
+                clause += f" AND action NOT IN ({', '.join('?' * len(exact))})"
+                params += exact
+        else:
+            clause, params = "action = ?", [action]
+        rules.append((action, clause, params, days))
+    return rules
+
+
+def prune_history(db, policy=None, today=None, chunk_size=CHUNK_SIZE):
+    """Xóa các dòng quá thời hạn lưu giữ, theo từng khối. Trả về {hành động/luật: số dòng đã xóa}."""
+    refresh_rollups(db)
+    policy = RETENTION_DAYS if policy is None else policy
+    deleted = {}
+    for action, clause, params, days in retention_rules(policy):
+        before = _cutoff(days, today)
+        count = 0
+        while True:
+            with db:
+                cur = db.execute(f"""
+                    DELETE FROM ReservationHistory WHERE history_id IN (
+                        SELECT history_id FROM ReservationHistory
+                        WHERE {clause} AND action_time < ?
+                        LIMIT ?
+                    )
+                """, (*params, before, chunk_size))
+            count += cur.rowcount
+            if cur.rowcount < chunk_size:
+                break
+        deleted[action] = count
+    return deleted
+
+
+def enable_incremental_vacuum(db):
+    """Chuyển CSDL cũ sang auto_vacuum = INCREMENTAL (chạy VACUUM đầy đủ một lần, khóa cả file)."""
+    db.commit()
+    db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    db.execute("VACUUM")
+
+
+def incremental_vacuum(db, step=VACUUM_STEP_PAGES, max_pages=None):
+    """
+    Trả các trang trống về cho hệ điều hành, mỗi lần tối đa step trang.
+    Trả về số trang đã giải phóng, hoặc None nếu CSDL chưa bật auto_vacuum = INCREMENTAL.
+    """
+    if db.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        return None
+    db.commit()
+    start_pages = db.execute("PRAGMA page_count").fetchone()[0]
+    freed = 0
+    while max_pages is None or freed < max_pages:
+        free = db.execute("PRAGMA freelist_count").fetchone()[0]
+        if not free:
+            break
+        pages = min(step, free) if max_pages is None else min(step, free, max_pages - freed)
+        # execute() chỉ bước câu lệnh một lần (giải phóng 1 trang); executescript chạy tới hết
+        db.executescript(f"PRAGMA incremental_vacuum({pages});")
+        freed = start_pages - db.execute("PRAGMA page_count").fetchone()[0]
+    return freed
+
+
+def run_retention(db, policy=None, compact_after_days=COMPACT_AFTER_DAYS, today=None, chunk_size=CHUNK_SIZE,
+                  vacuum=True):
+    """Gộp, xóa rồi thu hồi dung lượng. Trả về dict số liệu của từng bước."""
+    result = {'compacted': compact_history(db, compact_after_days, today, chunk_size)}
+    result['pruned'] = prune_history(db, policy, today, chunk_size)
+    result['freed_pages'] = incremental_vacuum(db) if vacuum else None
+    return result
+
+
+def parse_policy(items):
+    """'ACTION=DAYS' (DAYS = 'forever' để giữ mãi) ghi đè lên RETENTION_DAYS."""
+    policy = dict(RETENTION_DAYS)
+    for item in items or []:
+        action, sep, days = item.partition('=')
+        if not sep or not action:
+            raise ValueError(f"Invalid retention rule {item!r}, expected ACTION=DAYS.")
+        policy[action] = None if days == 'forever' else int(days)
+    return policy
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compact and prune ReservationHistory, then reclaim free pages.")
+    parser.add_argument('--db', default=DB_PATH, help="database file")
+    parser.add_argument('--keep', action='append', metavar='ACTION=DAYS',
+                        help="retention for an action or 'prefix*' (DAYS may be 'forever'); repeatable")
+    parser.add_argument('--compact-after-days', type=int, default=COMPACT_AFTER_DAYS)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--no-vacuum', action='store_true', help="skip PRAGMA incremental_vacuum")
+    parser.add_argument('--enable-incremental-vacuum', action='store_true',
+                        help="one-off full VACUUM switching an old database to auto_vacuum=INCREMENTAL")
+    args = parser.parse_args(argv)
+
+    try:
+        policy = parse_policy(args.keep)
+    except ValueError as exc:
+        parser.error(str(exc))
+
+    db = sqlite3.connect(args.db, timeout=30)
+    db.execute("PRAGMA foreign_keys = ON;")
+    try:
+        if args.enable_incremental_vacuum:
+            enable_incremental_vacuum(db)
+        started = time.perf_counter()
+        result = run_retention(db, policy, args.compact_after_days, chunk_size=args.chunk_size,
+                               vacuum=not args.no_vacuum)
+    finally:
+        db.close()
+    pruned = ", ".join(f"{action}: {count}" for action, count in result['pruned'].items())
+    print(f"Compacted away {result['compacted']} rows; pruned {pruned or 'nothing'}.")
+    if result['freed_pages'] is None and not args.no_vacuum:
+        print("auto_vacuum is not INCREMENTAL; run once with --enable-incremental-vacuum to reclaim space.")
+    else:
+        print(f"Freed {result['freed_pages'] or 0} pages in {time.perf_counter() - started:.2f}s.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
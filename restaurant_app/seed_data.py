@@ -0,0 +1,265 @@
+"""
+Sinh bộ dữ liệu giả lập quy mô lớn để đo hiệu năng.
+
+Ví dụ:
+    python seed_data.py --db bench.db --restaurants 200 --tables-per-restaurant 40 \\
+        --customers 50000 --reservations-per-day 60 --days 365 --seed 42
+
+Cùng seed và cùng --start luôn cho ra cùng một bộ dữ liệu, bất kể chạy vào ngày nào: "hôm nay"
+(ranh giới quá khứ/tương lai của trạng thái và lịch sử) là --today, mặc định giữa khoảng ngày.
+Mọi tài khoản khách (user1, user2, ...) dùng chung mật khẩu 'password123', khớp với users_*.csv.
+"""
+import argparse
+import math
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import date, timedelta
+
+from werkzeug.security import generate_password_hash
+
+try:
+    from .init_database import init_db, DB_PATH
+    from .outbox import create_outbox_schema, OUTBOX_TRIGGERS
+except ImportError:  # chạy trực tiếp: python seed_data.py
+    from init_database import init_db, DB_PATH
+    from outbox import create_outbox_schema, OUTBOX_TRIGGERS
+
+BATCH_SIZE = 10000
+SLOT_MINUTES = 30
+# Mỗi lượt đặt giữ bàn 2 tiếng, giống find_available_table
+SLOTS_PER_BOOKING = 120 // SLOT_MINUTES
+SAMPLE_PASSWORD = 'password123'
+
+CUISINES = ["Italian", "Japanese", "Vietnamese", "French", "Mexican", "Thai", "American", "Korean", "Indian", "Chinese"]
+CITIES = ["New York, NY", "Los Angeles, CA", "Chicago, IL", "Hanoi, Vietnam", "Ho Chi Minh City, Vietnam",
+          "Paris, France", "Bangkok, Thailand", "Tokyo, Japan", "Mexico City, Mexico", "Seoul, Korea"]
+OPENING_TIMES = ["10:00", "10:30", "11:00", "11:30", "12:00"]
+CLOSING_TIMES = ["21:00", "21:30", "22:00", "22:30", "23:00"]
+
+# Phân bố số khách mỗi lượt đặt: nhóm 2 và 4 người chiếm đa số
+PARTY_SIZES = [1, 2, 3, 4, 5, 6, 8, 10]
+PARTY_WEIGHTS = [5, 40, 12, 25, 6, 8, 3, 1]
+# Cơ cấu sức chứa bàn của một nhà hàng
+TABLE_CAPACITIES = [2, 4, 6, 8]
+TABLE_WEIGHTS = [35, 40, 18, 7]
+
+
+def time_of_day_weight(hour):
+    """Mật độ đặt bàn theo giờ: đỉnh trưa quanh 12:30, đỉnh tối quanh 19:15, cộng một nền thấp."""
+    lunch = math.exp(-((hour - 12.5) ** 2) / (2 * 0.75 ** 2))
+    dinner = math.exp(-((hour - 19.25) ** 2) / (2 * 1.0 ** 2))
+    return 0.02 + 0.35 * lunch + 0.65 * dinner
+
+
+def booking_slots(opening_time, closing_time):
+    """Các mốc giờ (phút từ 0:00) có thể nhận đặt bàn, kèm trọng số tích lũy cho random.choices."""
+    open_h, open_m = map(int, opening_time.split(':'))
+    close_h, close_m = map(int, closing_time.split(':'))
+    start, end = open_h * 60 + open_m, close_h * 60 + close_m
+    slots = list(range(start, end, SLOT_MINUTES))
+    cum_weights, total = [], 0.0
+    for minute in slots:
+        total += time_of_day_weight(minute / 60)
+        cum_weights.append(total)
+    return slots, cum_weights
+
+
+def pick_status(rng, reservation_day, today):
+    if reservation_day < today:
+        return rng.choices(['completed', 'cancelled', 'rejected'], [85, 12, 3])[0]
+    return rng.choices(['pending', 'confirmed', 'cancelled'], [40, 55, 5])[0]
+
+
+def history_for(reservation_id, status, customer_id, action_time):
+    """Dòng ReservationHistory tương ứng với trạng thái cuối (None nếu vẫn pending)."""
+    if status == 'cancelled':
+        return (reservation_id, 'cancelled', None, customer_id, action_time, 'Customer cancelled reservation')
+    if status in ('confirmed', 'completed', 'rejected'):
+        return (reservation_id, f"status:{status}", 1, None, action_time, f"Admin set status to {status}")
+    return None
+
+
+def generate(db_path, restaurants=50, tables_per_restaurant=20, customers=10000, reservations_per_day=40,
+             days=90, seed=42, start=None, log=print, today=None):
+    """
+    Tạo CSDL mới tại db_path và đổ dữ liệu giả lập vào. Trả về dict thống kê số dòng đã tạo.
+    start là ngày đầu tiên ('YYYY-MM-DD'); mặc định lùi nửa khoảng days so với hôm nay,
+    để dữ liệu có cả quá khứ lẫn tương lai. today ('YYYY-MM-DD') chia lượt đặt đã qua/sắp tới;
+    mặc định là hôm nay nếu không có start, ngược lại là start + days/2 (kết quả chỉ phụ thuộc tham số).
+    """
+    rng = random.Random(seed)
+    if start:
+        start_day = date.fromisoformat(start)
+        today = date.fromisoformat(today) if today else start_day + timedelta(days=days // 2)
+    else:
+        today = date.fromisoformat(today) if today else date.today()
+        start_day = today - timedelta(days=days // 2)
+
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    init_db(db_path, sample_data=False)
+
+    db = sqlite3.connect(db_path)
+    # Chỉ dùng khi dựng dữ liệu: một giao dịch lớn, không cần đảm bảo bền vững giữa chừng
+    db.execute("PRAGMA journal_mode = MEMORY")
+    db.execute("PRAGMA synchronous = OFF")
+    db.execute("PRAGMA foreign_keys = OFF")
+    # Khách giả lập không cần thông báo: bỏ trigger outbox trong lúc đổ dữ liệu, tạo lại ở cuối
+    for trigger in OUTBOX_TRIGGERS:
+        db.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    started = time.perf_counter()
+    counts = {}
+
+    db.execute("INSERT INTO Admins (adminname, password_hash, full_name, email) VALUES (?, ?, ?, ?)",
+               ("admin1", generate_password_hash("admin"), "Alice Admin", "admin01@example.com"))
+
+    # Băm mật khẩu một lần rồi dùng lại: đủ cho dữ liệu giả lập, tiết kiệm hàng phút khi có hàng triệu khách
+    password_hash = generate_password_hash(SAMPLE_PASSWORD)
+    batch = []
+    for i in range(1, customers + 1):
+        phone = ''.join(rng.choice('0123456789') for _ in range(10))
+        batch.append((f"user{i}", password_hash, f"Test User {i}", f"user{i}@example.com", phone))
+        if len(batch) >= BATCH_SIZE:
+            db.executemany("INSERT INTO Customers (username, password_hash, full_name, email, phone) VALUES (?, ?, ?, ?, ?)", batch)
+            batch = []
+    if batch:
+        db.executemany("INSERT INTO Customers (username, password_hash, full_name, email, phone) VALUES (?, ?, ?, ?, ?)", batch)
+    counts['customers'] = customers
+
+    restaurant_rows = []
+    for i in range(1, restaurants + 1):
+        cuisine = rng.choice(CUISINES)
+        restaurant_rows.append((f"{cuisine} House {i}", rng.choice(CITIES), cuisine, round(rng.uniform(3.0, 5.0), 1),
+                                f"Synthetic {cuisine} restaurant #{i}.", rng.choice(OPENING_TIMES), rng.choice(CLOSING_TIMES)))
+    db.executemany("INSERT INTO Restaurants (name, location, cuisine, rating, description, opening_time, closing_time) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                   restaurant_rows)
+    counts['restaurants'] = restaurants
+
+    # Bàn của mỗi nhà hàng, sắp theo sức chứa tăng dần để chọn bàn nhỏ nhất phù hợp
+    layouts = {}
+    table_rows = []
+    table_id = 0
+    for rid in range(1, restaurants + 1):
+        layout = []
+        for n in range(1, tables_per_restaurant + 1):
+            table_id += 1
+            capacity = rng.choices(TABLE_CAPACITIES, TABLE_WEIGHTS)[0]
+            table_rows.append((rid, f"T{n}", capacity))
+            layout.append((capacity, table_id))
+        layout.sort()
+        layouts[rid] = layout
+    db.executemany("INSERT INTO Tables (restaurant_id, table_number, capacity) VALUES (?, ?, ?)", table_rows)
+    counts['tables'] = len(table_rows)
+
+    slot_choices = {rid: booking_slots(row[5], row[6]) for rid, row in enumerate(restaurant_rows, start=1)}
+
+    reservation_id = 0
+    reservations, history = [], []
+    skipped = 0
+    for day_offset in range(days):
+        day = start_day + timedelta(days=day_offset)
+        day_str = day.isoformat()
+        for rid in range(1, restaurants + 1):
+            slots, cum_weights = slot_choices[rid]
+            layout = layouts[rid]
+            busy = {}  # table_id -> tập các ô 30 phút đã bị giữ trong ngày
+            for _ in range(reservations_per_day):
+                minute = rng.choices(slots, cum_weights=cum_weights)[0]
+                guests = rng.choices(PARTY_SIZES, PARTY_WEIGHTS)[0]
+                first_slot = minute // SLOT_MINUTES
+                needed = range(first_slot, first_slot + SLOTS_PER_BOOKING)
+
+                assigned = None
+                for capacity, tid in layout:
+                    if capacity < guests:
+                        continue
+                    taken = busy.setdefault(tid, set())
+                    if not any(s in taken for s in needed):
+                        taken.update(needed)
+                        assigned = tid
+                        break
+                if assigned is None:
+                    # Hết bàn cho giờ này: ngoài đời khách sẽ bị từ chối ngay, nên không tạo lượt đặt
+                    skipped += 1
+                    continue
+
+                reservation_id += 1
+                customer_id = rng.randint(1, customers) if customers else 1
+                status = pick_status(rng, day, today)
+                created = day - timedelta(days=rng.randint(0, 14))
+                reservations.append((reservation_id, customer_id, rid, assigned, day_str,
+                                     f"{minute // 60:02d}:{minute % 60:02d}", guests, status, created.isoformat()))
+                entry = history_for(reservation_id, status, customer_id,
+                                    f"{min(day, today).isoformat()} {minute // 60:02d}:{minute % 60:02d}:00")
+                if entry:
+                    history.append(entry)
+
+                if len(reservations) >= BATCH_SIZE:
+                    flush(db, reservations, history)
+                    reservations, history = [], []
+        if log and (day_offset + 1) % 30 == 0:
+            log(f"  {day_offset + 1}/{days} days, {reservation_id} reservations "
+                f"({time.perf_counter() - started:.1f}s)")
+    flush(db, reservations, history)
+    counts['reservations'] = reservation_id
+    counts['skipped_full'] = skipped
+    counts['history'] = db.execute("SELECT COUNT(*) FROM ReservationHistory").fetchone()[0]
+
+    db.commit()
+    create_outbox_schema(db)
+    db.execute("PRAGMA foreign_keys = ON")
+    db.execute("ANALYZE")
+    db.close()
+    counts['seconds'] = round(time.perf_counter() - started, 2)
+    return counts
+
+
+def flush(db, reservations, history):
+    if reservations:
+        db.executemany("""
+            INSERT INTO Reservations (reservation_id, customer_id, restaurant_id, table_id, reservation_date,
+                                      reservation_time, guests, status, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, reservations)
+    if history:
+        db.executemany("""
+            INSERT INTO ReservationHistory (reservation_id, action, action_by_admin, action_by_customer, action_time, note)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, history)
+
+
+def parse_date(value):
+    """Kiểu (type=) của --start/--today: 'YYYY-MM-DD' hợp lệ."""
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Date must look like YYYY-MM-DD, got {value!r}.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic restaurant reservation database for benchmarking.")
+    parser.add_argument('--db', default=DB_PATH, help="output database file (overwritten)")
+    parser.add_argument('--restaurants', type=int, default=50)
+    parser.add_argument('--tables-per-restaurant', type=int, default=20)
+    parser.add_argument('--customers', type=int, default=10000)
+    parser.add_argument('--reservations-per-day', type=int, default=40, help="per restaurant")
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--start', type=parse_date, help="first reservation date YYYY-MM-DD (default: today - days/2)")
+    parser.add_argument('--today', type=parse_date, help="dates before this are in the past: completed/cancelled/rejected "
+                                        "(default: today, or --start + days/2 when --start is given)")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    print(f"Generating {args.db} ...")
+    counts = generate(args.db, args.restaurants, args.tables_per_restaurant, args.customers,
+                      args.reservations_per_day, args.days, args.seed, args.start, today=args.today)
+    for key, value in counts.items():
+        print(f"{key:>14}: {value}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,169 @@
+"""
+Nhật ký câu SQL chậm (bật khi app.config['SLOW_QUERY_MS'] > 0).
+
+get_db gắn một SlowQueryLog vào TimedConnection (xem metrics.py); mỗi câu lệnh có thời gian
+execute + fetch vượt ngưỡng được ghi một dòng JSON vào file xoay vòng:
+  {"ts", "route", "ms", "sql" (đã chuẩn hóa), "params" (chỉ kiểu, không ghi giá trị), "plan"}
+"plan" là kết quả EXPLAIN QUERY PLAN, chỉ chạy lần đầu gặp mỗi dạng câu lệnh trong tiến trình.
+Trang /admin/slow-queries đọc lại các dòng mới nhất.
+
+Chạy trực tiếp để xem nhanh file log:
+    python sqltrace.py --log slow_queries.jsonl --limit 20
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+from datetime import datetime, timezone
+
+SLOW_QUERY_LOG = "slow_queries.jsonl"
+MAX_BYTES = 5 * 1024 * 1024
+BACKUP_COUNT = 3
+# Chỉ các câu này mới chạy được EXPLAIN QUERY PLAN
+EXPLAINABLE = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+_COMMENT = re.compile(r'--[^\n]*')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)+\s*\)', re.IGNORECASE)
+_SPACE = re.compile(r'\s+')
+
+
+def normalize_sql(sql):
+    """Dạng câu lệnh: bỏ comment, literal thành ?, IN (?, ?, ...) thành IN (?), gộp khoảng trắng."""
+    sql = _COMMENT.sub(' ', sql)
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('IN (?)', sql)
+    return _SPACE.sub(' ', sql).strip().rstrip(';').strip()
+
+
+def params_shape(parameters):
+    """Kiểu của tham số, không kèm giá trị (tham số có thể là mật khẩu băm, email...)."""
+    if parameters is None:
+        return 'many'
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    return [type(value).__name__ for value in parameters]
+
+
+def _now():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+class SlowQueryLog:
+    """Ghi câu lệnh chậm hơn threshold_ms vào path (JSONL, xoay vòng khi vượt max_bytes)."""
+
+    def __init__(self, path=SLOW_QUERY_LOG, threshold_ms=100, max_bytes=MAX_BYTES, backup_count=BACKUP_COUNT):
+        self.path = path
+        self.threshold = threshold_ms / 1000.0
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._lock = threading.Lock()
+        self._explained = set()
+        self.logged = 0
+
+    def statement_finished(self, db, sql, parameters, seconds, route):
+        if seconds < self.threshold:
+            return
+        shape = normalize_sql(sql)
+        entry = {'ts': _now(), 'route': route, 'ms': round(seconds * 1000, 3), 'sql': shape,
+                 'params': params_shape(parameters)}
+        with self._lock:
+            first = shape not in self._explained
+            self._explained.add(shape)
+        if first:
+            entry['plan'] = explain(db, sql, parameters)
+        self.write(entry)
+
+    def write(self, entry):
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        with self._lock:
+            try:
+                if os.path.exists(self.path) and os.path.getsize(self.path) + len(line) > self.max_bytes:
+                    self._rotate()
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(line)
+                self.logged += 1
+            except OSError:
+                pass  # nhật ký chậm không được làm hỏng request
+
+    def _rotate(self):
+        for i in range(self.backup_count - 1, 0, -1):
+            if os.path.exists(f'{self.path}.{i}'):
+                os.replace(f'{self.path}.{i}', f'{self.path}.{i + 1}')
+        if self.backup_count:
+            os.replace(self.path, f'{self.path}.1')
+        else:
+            os.remove(self.path)
+
+
+def explain(db, sql, parameters):
+    """Các dòng EXPLAIN QUERY PLAN của câu lệnh; None nếu không giải thích được (executemany, DDL...)."""
+    words = sql.split(None, 1)
+    if parameters is None or not words or words[0].upper() not in EXPLAINABLE:
+        return None
+    try:
+        return [row[3] for row in db.cursor(sqlite3.Cursor).execute("EXPLAIN QUERY PLAN " + sql, parameters)]
+    except sqlite3.Error:
+        return None
+
+
+def read_entries(path=SLOW_QUERY_LOG, limit=200):
+    """Tối đa limit dòng mới nhất (mới trước), đọc cả các file đã xoay vòng nếu cần."""
+    entries = []
+    files = [path] + [f'{path}.{i}' for i in range(1, BACKUP_COUNT + 1)]
+    for name in files:
+        if len(entries) >= limit or not os.path.exists(name):
+            break
+        with open(name, encoding='utf-8') as f:
+            lines = f.readlines()
+        for line in reversed(lines):
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+            if len(entries) >= limit:
+                break
+    return entries
+
+
+def summarize(entries):
+    """Gộp theo dạng câu lệnh: số lần, tổng/tối đa ms, route, plan; chậm nhất (theo tổng) trước."""
+    shapes = {}
+    for entry in entries:
+        item = shapes.setdefault(entry['sql'], {'sql': entry['sql'], 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                                                'routes': set(), 'plan': None})
+        item['count'] += 1
+        item['total_ms'] += entry['ms']
+        item['max_ms'] = max(item['max_ms'], entry['ms'])
+        item['routes'].add(entry.get('route') or '-')
+        if entry.get('plan'):
+            item['plan'] = entry['plan']
+    for item in shapes.values():
+        item['routes'] = sorted(item['routes'])
+        item['total_ms'] = round(item['total_ms'], 3)
+        item['full_scan'] = any(step.startswith('SCAN ') for step in item['plan'] or ())
+    return sorted(shapes.values(), key=lambda item: item['total_ms'], reverse=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize the slow-query log by statement shape.")
+    parser.add_argument("--log", default=SLOW_QUERY_LOG, help="Slow-query JSONL file")
+    parser.add_argument("--limit", type=int, default=1000, help="Number of most recent entries to read")
+    args = parser.parse_args(argv)
+
+    for item in summarize(read_entries(args.log, args.limit)):
+        print(f"{item['count']:5d}x  total {item['total_ms']:9.1f} ms  max {item['max_ms']:8.1f} ms  "
+              f"{', '.join(item['routes'])}")
+        print(f"       {item['sql']}")
+        for step in item['plan'] or ():
+            print(f"         {step}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,23 @@
+document.addEventListener("DOMContentLoaded", () => {
+  // Lấy tất cả các phần tử "navbar-burger"
+  const $navbarBurgers = Array.prototype.slice.call(
+    document.querySelectorAll(".navbar-burger"),
+    0
+  );
+
+  // Kiểm tra xem có navbar burger nào không
+  if ($navbarBurgers.length > 0) {
+    // Thêm sự kiện click cho mỗi phần tử
+    $navbarBurgers.forEach((el) => {
+      el.addEventListener("click", () => {
+        // Lấy target từ thuộc tính "data-target"
+        const target = el.dataset.target;
+        const $target = document.getElementById(target);
+
+        // Thêm/xóa lớp "is-active" trên cả "navbar-burger" và "navbar-menu"
+        el.classList.toggle("is-active");
+        $target.classList.toggle("is-active");
+      });
+    });
+  }
+});
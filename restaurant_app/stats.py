@@ -0,0 +1,299 @@
+"""
+Bảng thống kê được duy trì tăng dần cho trang admin dashboard.
+
+Các trigger cập nhật bộ đếm ngay trong giao dịch ghi Customers/Restaurants/Reservations,
+nên dashboard chỉ cần vài lần đọc theo khóa chính. Nếu số liệu bị lệch (sửa tay CSDL,
+khôi phục bản sao lưu, ...), chạy lại:
+    python stats.py --rebuild
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+import time
+from urllib.parse import quote
+
+try:
+    from .background import PeriodicWorker
+except ImportError:  # chạy trực tiếp: python stats.py
+    from background import PeriodicWorker
+
+# Lượt đặt đang hoạt động cộng với lượt đặt đã lưu trữ (archive.py)
+ALL_RESERVATIONS = ("(SELECT restaurant_id, created_at, reservation_id FROM Reservations"
+                    " UNION ALL SELECT restaurant_id, created_at, reservation_id FROM ArchivedReservations)")
+
+STATS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS StatCounters (
+    name  TEXT PRIMARY KEY,
+    value INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS DailyBookingCounts (
+    day   DATE PRIMARY KEY,
+    count INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS RestaurantBookingCounts (
+    restaurant_id INTEGER PRIMARY KEY,
+    booking_count INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS idx_restaurant_booking_counts_count
+    ON RestaurantBookingCounts (booking_count DESC);
+
+-- Customers
+CREATE TRIGGER IF NOT EXISTS trg_stats_customers_insert AFTER INSERT ON Customers
+BEGIN
+    INSERT INTO StatCounters (name, value) VALUES ('customers', 1)
+        ON CONFLICT(name) DO UPDATE SET value = value + 1;
+END;
+
+-- Khách/nhà hàng bị xóa mềm (deleted_at, xem purge.py) không còn được đếm; lúc xóa hẳn không trừ lần nữa
+DROP TRIGGER IF EXISTS trg_stats_customers_delete;
+CREATE TRIGGER IF NOT EXISTS trg_stats_customers_remove AFTER DELETE ON Customers
+WHEN OLD.deleted_at IS NULL
+BEGIN
+    UPDATE StatCounters SET value = value - 1 WHERE name = 'customers';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stats_customers_soft_delete AFTER UPDATE OF deleted_at ON Customers
+WHEN OLD.deleted_at IS NULL AND NEW.deleted_at IS NOT NULL
+BEGIN
+    UPDATE StatCounters SET value = value - 1 WHERE name = 'customers';
+END;
+
+-- Restaurants
+CREATE TRIGGER IF NOT EXISTS trg_stats_restaurants_insert AFTER INSERT ON Restaurants
+BEGIN
+    INSERT INTO StatCounters (name, value) VALUES ('restaurants', 1)
+        ON CONFLICT(name) DO UPDATE SET value = value + 1;
+    INSERT OR IGNORE INTO RestaurantBookingCounts (restaurant_id, booking_count) VALUES (NEW.restaurant_id, 0);
+END;
+
+DROP TRIGGER IF EXISTS trg_stats_restaurants_delete;
+CREATE TRIGGER IF NOT EXISTS trg_stats_restaurants_remove AFTER DELETE ON Restaurants
+BEGIN
+    UPDATE StatCounters SET value = value - 1 WHERE name = 'restaurants' AND OLD.deleted_at IS NULL;
+    DELETE FROM RestaurantBookingCounts WHERE restaurant_id = OLD.restaurant_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stats_restaurants_soft_delete AFTER UPDATE OF deleted_at ON Restaurants
+WHEN OLD.deleted_at IS NULL AND NEW.deleted_at IS NOT NULL
+BEGIN
+    UPDATE StatCounters SET value = value - 1 WHERE name = 'restaurants';
+END;
+
+-- Reservations
+CREATE TRIGGER IF NOT EXISTS trg_stats_reservations_insert AFTER INSERT ON Reservations
+BEGIN
+    INSERT INTO DailyBookingCounts (day, count) SELECT NEW.created_at, 1 WHERE NEW.created_at IS NOT NULL
+        ON CONFLICT(day) DO UPDATE SET count = count + 1;
+    INSERT INTO RestaurantBookingCounts (restaurant_id, booking_count) VALUES (NEW.restaurant_id, 1)
+        ON CONFLICT(restaurant_id) DO UPDATE SET booking_count = booking_count + 1;
+END;
+
+-- Dòng được chuyển sang ArchivedReservations (archive.py) vẫn được tính, chỉ trừ khi xóa hẳn
+DROP TRIGGER IF EXISTS trg_stats_reservations_delete;
+CREATE TRIGGER IF NOT EXISTS trg_stats_reservations_remove AFTER DELETE ON Reservations
+WHEN NOT EXISTS (SELECT 1 FROM ArchivedReservations WHERE reservation_id = OLD.reservation_id)
+BEGIN
+    UPDATE DailyBookingCounts SET count = count - 1 WHERE day = OLD.created_at;
+    UPDATE RestaurantBookingCounts SET booking_count = booking_count - 1 WHERE restaurant_id = OLD.restaurant_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stats_archived_reservations_delete AFTER DELETE ON ArchivedReservations
+BEGIN
+    UPDATE DailyBookingCounts SET count = count - 1 WHERE day = OLD.created_at;
+    UPDATE RestaurantBookingCounts SET booking_count = booking_count - 1 WHERE restaurant_id = OLD.restaurant_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stats_reservations_move AFTER UPDATE OF restaurant_id ON Reservations
+WHEN OLD.restaurant_id IS NOT NEW.restaurant_id
+BEGIN
+    UPDATE RestaurantBookingCounts SET booking_count = booking_count - 1 WHERE restaurant_id = OLD.restaurant_id;
+    INSERT INTO RestaurantBookingCounts (restaurant_id, booking_count) VALUES (NEW.restaurant_id, 1)
+        ON CONFLICT(restaurant_id) DO UPDATE SET booking_count = booking_count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stats_reservations_redate AFTER UPDATE OF created_at ON Reservations
+WHEN OLD.created_at IS NOT NEW.created_at
+BEGIN
+    UPDATE DailyBookingCounts SET count = count - 1 WHERE day = OLD.created_at;
+    INSERT INTO DailyBookingCounts (day, count) SELECT NEW.created_at, 1 WHERE NEW.created_at IS NOT NULL
+        ON CONFLICT(day) DO UPDATE SET count = count + 1;
+END;
+"""
+
+
+def create_stats_schema(db):
+    """Tạo bảng thống kê và trigger; nếu bảng vừa được tạo trên CSDL đã có dữ liệu thì tính lại từ đầu."""
+    existed = db.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'StatCounters'"
+    ).fetchone()
+    db.executescript(STATS_SCHEMA)
+    if not existed:
+        rebuild_stats(db)
+
+
+def rebuild_stats(db):
+    """Tính lại toàn bộ bảng thống kê từ dữ liệu gốc trong một giao dịch."""
+    with db:
+        db.execute("DELETE FROM StatCounters")
+        db.execute("""
+            INSERT INTO StatCounters (name, value) VALUES
+                ('customers', (SELECT COUNT(*) FROM Customers WHERE deleted_at IS NULL)),
+                ('restaurants', (SELECT COUNT(*) FROM Restaurants WHERE deleted_at IS NULL))
+        """)
+        db.execute("DELETE FROM DailyBookingCounts")
+        db.execute(f"""
+            INSERT INTO DailyBookingCounts (day, count)
+            SELECT created_at, COUNT(*) FROM {ALL_RESERVATIONS}
+            WHERE created_at IS NOT NULL
+            GROUP BY created_at
+        """)
+        db.execute("DELETE FROM RestaurantBookingCounts")
+        db.execute(f"""
+            INSERT INTO RestaurantBookingCounts (restaurant_id, booking_count)
+            SELECT r.restaurant_id, COUNT(res.reservation_id)
+            FROM Restaurants r
+            LEFT JOIN {ALL_RESERVATIONS} res ON r.restaurant_id = res.restaurant_id
+            GROUP BY r.restaurant_id
+        """)
+
+
+def check_stats(db):
+    """So sánh bảng thống kê với dữ liệu gốc, trả về danh sách (khóa, giá trị lưu, giá trị thật) bị lệch."""
+    drift = []
+    for name, table in (('customers', 'Customers'), ('restaurants', 'Restaurants')):
+        actual = db.execute(f"SELECT COUNT(*) FROM {table} WHERE deleted_at IS NULL").fetchone()[0]
+        stored = get_counter(db, name)
+        if stored != actual:
+            drift.append((name, stored, actual))
+
+    rows = db.execute(f"""
+        SELECT r.restaurant_id, s.booking_count, COUNT(res.reservation_id)
+        FROM Restaurants r
+        LEFT JOIN RestaurantBookingCounts s ON s.restaurant_id = r.restaurant_id
+        LEFT JOIN {ALL_RESERVATIONS} res ON res.restaurant_id = r.restaurant_id
+        GROUP BY r.restaurant_id
+    """).fetchall()
+    for rid, stored, actual in rows:
+        if stored != actual:
+            drift.append((f"restaurant:{rid}", stored, actual))
+
+    rows = db.execute(f"""
+        SELECT res.created_at, d.count, COUNT(*)
+        FROM {ALL_RESERVATIONS} res
+        LEFT JOIN DailyBookingCounts d ON d.day = res.created_at
+        WHERE res.created_at IS NOT NULL
+        GROUP BY res.created_at
+    """).fetchall()
+    for day, stored, actual in rows:
+        if stored != actual:
+            drift.append((f"day:{day}", stored, actual))
+    return drift
+
+
+def get_counter(db, name):
+    row = db.execute("SELECT value FROM StatCounters WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else 0
+
+
+def get_dashboard_stats(db, top_n=5):
+    """Số liệu cho admin dashboard, chỉ đọc từ các bảng thống kê."""
+    row = db.execute("SELECT count FROM DailyBookingCounts WHERE day = DATE('now')").fetchone()
+    top_restaurants = db.execute("""
+        SELECT r.name, s.booking_count
+        FROM RestaurantBookingCounts s
+        JOIN Restaurants r ON r.restaurant_id = s.restaurant_id
+        WHERE r.deleted_at IS NULL
+        ORDER BY s.booking_count DESC
+        LIMIT ?
+    """, (top_n,)).fetchall()
+    return {
+        'new_bookings_today': row[0] if row else 0,
+        'total_customers': get_counter(db, 'customers'),
+        'total_restaurants': get_counter(db, 'restaurants'),
+        'top_restaurants': top_restaurants,
+    }
+
+
+def load_dashboard_stats(db_path):
+    """Đọc số liệu dashboard bằng một kết nối chỉ-đọc riêng (dùng được từ luồng nền)."""
+    db = sqlite3.connect(f"file:{quote(os.path.abspath(db_path))}?mode=ro", uri=True)
+    db.row_factory = sqlite3.Row
+    try:
+        stats = get_dashboard_stats(db)
+    finally:
+        db.close()
+    stats['top_restaurants'] = [dict(row) for row in stats['top_restaurants']]
+    return stats
+
+
+class DashboardSnapshot:
+    """
+    Bản chụp số liệu dashboard dùng chung cho mọi request, làm mới bởi một luồng nền mỗi max_age giây.
+    Request không bao giờ chờ làm mới: nếu bản chụp đã cũ thì vẫn trả bản cũ và đánh thức luồng nền.
+    Chỉ lần đầu tiên (chưa có bản chụp nào) mới tính trực tiếp.
+    """
+
+    def __init__(self, loader, max_age=30):
+        self.loader = loader
+        self.max_age = max_age
+        self._snapshot = None  # (stats, taken_at)
+        self._refreshing = threading.Lock()
+        self.worker = PeriodicWorker('dashboard-snapshot', max_age, self.refresh)
+
+    def refresh(self):
+        """Tính lại bản chụp; bỏ qua nếu một lần làm mới khác đang chạy."""
+        if not self._refreshing.acquire(blocking=False):
+            return False
+        try:
+            self._snapshot = (self.loader(), time.time())
+        finally:
+            self._refreshing.release()
+        return True
+
+    def get(self):
+        """Trả về dict số liệu kèm 'snapshot_age' (giây)."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            stats = self.loader()
+            snapshot = self._snapshot = (stats, time.time())
+            self.worker.ensure_started()
+        elif time.time() - snapshot[1] > self.max_age and not self._refreshing.locked():
+            self.worker.wake()
+        stats, taken_at = snapshot
+        return dict(stats, snapshot_age=int(time.time() - taken_at))
+
+
+def main(argv=None):
+    # Import trong hàm: init_database import module này khi nạp
+    try:
+        from .init_database import DB_PATH
+    except ImportError:  # chạy trực tiếp: python stats.py
+        from init_database import DB_PATH
+    parser = argparse.ArgumentParser(description="Check or rebuild the admin dashboard statistics tables.")
+    parser.add_argument('--db', default=DB_PATH, help="database file")
+    parser.add_argument('--rebuild', action='store_true', help="recompute every statistics table from source data")
+    args = parser.parse_args(argv)
+
+    db = sqlite3.connect(args.db)
+    try:
+        create_stats_schema(db)
+        if args.rebuild:
+            rebuild_stats(db)
+            print("Statistics rebuilt.")
+            return 0
+        drift = check_stats(db)
+        for key, stored, actual in drift:
+            print(f"{key}: stored={stored} actual={actual}")
+        print("Statistics are consistent." if not drift else f"{len(drift)} statistics drifted; run with --rebuild.")
+        return 1 if drift else 0
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
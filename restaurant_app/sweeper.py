@@ -0,0 +1,119 @@
+"""
+Dọn các lượt đặt đã qua ngày: 'confirmed' -> 'completed', 'pending' (không ai xác nhận) -> 'rejected'.
+
+Mỗi lô là một giao dịch ngắn (BEGIN IMMEDIATE ... COMMIT) nên khóa ghi chỉ bị giữ trong thời gian
+xử lý tối đa batch_size dòng. Watermark 'sweeper:date' lưu ngày đặt bàn đã quét tới; lần chạy sau
+bắt đầu từ đó thay vì quét lại từ đầu bảng.
+
+Chạy một lần (cron) hoặc lặp liên tục:
+    python sweeper.py --db restaurant_reservation.db
+    python sweeper.py --loop 300
+Trong ứng dụng web có thể bật bằng app.config['SWEEPER_INTERVAL_SECONDS'].
+"""
+import argparse
+import sqlite3
+import sys
+import time
+from datetime import date
+
+try:
+    from .analytics import get_watermark, set_watermark
+    from .audit import history_event, INSERT_HISTORY
+    from .init_database import DB_PATH
+except ImportError:  # chạy trực tiếp: python sweeper.py
+    from analytics import get_watermark, set_watermark
+    from audit import history_event, INSERT_HISTORY
+    from init_database import DB_PATH
+
+BATCH_SIZE = 200
+WATERMARK = 'sweeper:date'
+
+# Trạng thái đích cho từng trạng thái "còn hiệu lực" khi ngày đặt đã qua
+TRANSITIONS = {
+    'confirmed': ('completed', 'status:completed', 'Automatically completed after reservation date'),
+    'pending': ('rejected', 'expired', 'Pending reservation expired without confirmation'),
+}
+
+
+def sweep_batch(db, cutoff, since, batch_size=BATCH_SIZE):
+    """
+    Xử lý tối đa batch_size lượt đặt có ngày trong [since, cutoff) trong một giao dịch.
+    Trả về (số dòng đã đổi, ngày của dòng cuối cùng hoặc None nếu không còn gì).
+    """
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        rows = db.execute("""
+            SELECT reservation_id, status, reservation_date FROM Reservations
+            WHERE reservation_date >= ? AND reservation_date < ? AND status IN ('pending', 'confirmed')
+            ORDER BY reservation_date
+            LIMIT ?
+        """, (since, cutoff, batch_size)).fetchall()
+        events = []
+        for res_id, status, _ in rows:
+            new_status, action, note = TRANSITIONS[status]
+            db.execute("UPDATE Reservations SET status = ? WHERE reservation_id = ?", (new_status, res_id))
+            events.append(history_event(res_id, action, note))
+        db.executemany(INSERT_HISTORY, events)
+        last_date = str(rows[-1][2]) if rows else None
+        # Lô chưa đầy nghĩa là đã quét hết tới cutoff
+        done_until = last_date if len(rows) == batch_size else cutoff
+        set_watermark(db, WATERMARK, date.fromisoformat(done_until).toordinal())
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return len(rows), last_date
+
+
+def sweep(db, today=None, batch_size=BATCH_SIZE, pause=0.0, max_batches=None, full=False):
+    """
+    Quét tới hết (hoặc tới max_batches lô). pause là số giây nghỉ giữa các lô để nhường khóa ghi
+    cho request. full=True bỏ qua watermark và quét lại từ đầu. Trả về tổng số lượt đặt đã đổi.
+    """
+    cutoff = (today or date.today()).isoformat()
+    mark = 0 if full else get_watermark(db, WATERMARK)
+    since = date.fromordinal(mark).isoformat() if mark else '0000-01-01'
+    total = batches = 0
+    while max_batches is None or batches < max_batches:
+        changed, last_date = sweep_batch(db, cutoff, since, batch_size)
+        total += changed
+        batches += 1
+        if changed < batch_size:
+            break
+        since = last_date
+        if pause:
+            time.sleep(pause)
+    return total
+
+
+def sweep_database(db_path, **kwargs):
+    """Mở kết nối riêng tới db_path và chạy sweep (dùng cho luồng nền)."""
+    db = sqlite3.connect(db_path, timeout=30)
+    db.execute("PRAGMA foreign_keys = ON;")
+    try:
+        return sweep(db, **kwargs)
+    finally:
+        db.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Complete or expire reservations whose date has passed.")
+    parser.add_argument('--db', default=DB_PATH, help="database file")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--pause', type=float, default=0.05, help="seconds to sleep between batches")
+    parser.add_argument('--full', action='store_true', help="ignore the watermark and rescan every past date")
+    parser.add_argument('--loop', type=float, metavar='SECONDS', help="keep sweeping every SECONDS")
+    args = parser.parse_args(argv)
+
+    while True:
+        started = time.perf_counter()
+        changed = sweep_database(args.db, batch_size=args.batch_size, pause=args.pause, full=args.full)
+        print(f"Swept {changed} reservations in {time.perf_counter() - started:.2f}s.")
+        if not args.loop:
+            return 0
+        args.full = False
+        time.sleep(args.loop)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,176 @@
+"""
+Danh sách chờ: khách đăng ký (nhà hàng, ngày, khung giờ, số khách) khi không còn bàn.
+
+Mỗi khi một lượt đặt 'pending'/'confirmed' bị hủy hoặc từ chối, match_waitlist() chỉ đọc các dòng
+'waiting' của đúng nhà hàng + ngày có khung giờ chạm tới khung 2 giờ vừa trống (partial index
+idx_waitlist_waiting), theo thứ tự đăng ký, rồi với mỗi dòng:
+  - mode 'book': tự tạo lượt đặt 'pending' nếu assignment.py xếp được bàn;
+  - mode 'offer': đánh dấu 'offered' cho một khách; khách bấm nhận thì mới đặt (bàn không được giữ).
+Các hàm không commit, để lượt hủy và lượt đặt từ danh sách chờ nằm trong cùng một giao dịch.
+Lịch sử được ghi qua record(db, events) (app.py truyền record_history_many để theo AUDIT_MODE).
+"""
+from datetime import datetime, timezone
+
+try:
+    from .assignment import SLOT_MINUTES, assign_tables, save_assignment, to_minutes
+    from .audit import history_event, insert_history
+except ImportError:  # chạy trực tiếp
+    from assignment import SLOT_MINUTES, assign_tables, save_assignment, to_minutes
+    from audit import history_event, insert_history
+
+# Số dòng chờ tối đa được xét cho mỗi khung giờ vừa trống
+MATCH_LIMIT = 50
+MODES = ('book', 'offer')
+
+WAITLIST_SCHEMA = """
+CREATE TABLE IF NOT EXISTS Waitlist (
+    waitlist_id    INTEGER PRIMARY KEY AUTOINCREMENT,
+    customer_id    INTEGER NOT NULL,
+    restaurant_id  INTEGER NOT NULL,
+    wait_date      DATE NOT NULL,
+    earliest_time  TEXT NOT NULL,
+    latest_time    TEXT NOT NULL,
+    guests         INTEGER NOT NULL CHECK (guests > 0),
+    status         TEXT NOT NULL DEFAULT 'waiting'
+                   CHECK (status IN ('waiting', 'offered', 'booked', 'cancelled')),
+    offered_time   TEXT,
+    reservation_id INTEGER,
+    created_at     TIMESTAMP DEFAULT (DATETIME('now')),
+    matched_at     TIMESTAMP,
+    FOREIGN KEY (customer_id) REFERENCES Customers(customer_id) ON DELETE CASCADE,
+    FOREIGN KEY (restaurant_id) REFERENCES Restaurants(restaurant_id) ON DELETE CASCADE,
+    FOREIGN KEY (reservation_id) REFERENCES Reservations(reservation_id) ON DELETE SET NULL
+);
+
+-- Chỉ các dòng đang chờ nằm trong index: ghép cặp không phải đọc dòng đã xong
+CREATE INDEX IF NOT EXISTS idx_waitlist_waiting ON Waitlist (restaurant_id, wait_date, earliest_time)
+    WHERE status = 'waiting';
+CREATE INDEX IF NOT EXISTS idx_waitlist_customer ON Waitlist (customer_id, wait_date);
+-- Khóa ngoại: lưu trữ/xóa lượt đặt không phải quét Waitlist
+CREATE INDEX IF NOT EXISTS idx_waitlist_reservation ON Waitlist (reservation_id);
+"""
+
+MATCH_QUERY = """
+    SELECT * FROM Waitlist
+    WHERE restaurant_id = ? AND wait_date = ? AND status = 'waiting'
+    AND earliest_time <= ? AND latest_time >= ?
+    ORDER BY waitlist_id
+    LIMIT ?
+"""
+
+
+def create_waitlist_schema(db):
+    db.executescript(WAITLIST_SCHEMA)
+
+
+def _hhmm(minutes):
+    minutes = min(max(minutes, 0), 24 * 60 - 1)
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def _now():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def join_waitlist(db, customer_id, restaurant_id, wait_date, earliest, latest, guests):
+    """Thêm một yêu cầu chờ; trả về dòng Waitlist (đã có thì trả về dòng cũ)."""
+    existing = db.execute("""
+        SELECT * FROM Waitlist
+        WHERE customer_id = ? AND restaurant_id = ? AND wait_date = ? AND earliest_time = ?
+        AND latest_time = ? AND guests = ? AND status IN ('waiting', 'offered')
+    """, (customer_id, restaurant_id, str(wait_date), earliest, latest, guests)).fetchone()
+    if existing:
+        return existing
+    cur = db.execute("""
+        INSERT INTO Waitlist (customer_id, restaurant_id, wait_date, earliest_time, latest_time, guests)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (customer_id, restaurant_id, str(wait_date), earliest, latest, guests))
+    return db.execute("SELECT * FROM Waitlist WHERE waitlist_id = ?", (cur.lastrowid,)).fetchone()
+
+
+def book_entry(db, entry, start, record=insert_history):
+    """Đặt bàn cho dòng chờ lúc start ('HH:MM'). Trả về reservation_id hoặc None nếu hết bàn."""
+    tables = assign_tables(db, entry['restaurant_id'], str(entry['wait_date']), start, entry['guests'])
+    if not tables:
+        return None
+    cur = db.execute("""
+        INSERT INTO Reservations (customer_id, restaurant_id, table_id, reservation_date, reservation_time, guests, status)
+        VALUES (?, ?, ?, ?, ?, ?, 'pending')
+    """, (entry['customer_id'], entry['restaurant_id'], tables[0], str(entry['wait_date']), start, entry['guests']))
+    res_id = cur.lastrowid
+    if len(tables) > 1:
+        save_assignment(db, res_id, tables)
+    db.execute("""
+        UPDATE Waitlist SET status = 'booked', reservation_id = ?, offered_time = NULL, matched_at = ?
+        WHERE waitlist_id = ?
+    """, (res_id, _now(), entry['waitlist_id']))
+    record(db, [history_event(res_id, 'waitlist', f"Booked from waitlist entry #{entry['waitlist_id']}",
+                              customer_id=entry['customer_id'])])
+    return res_id
+
+
+def _try_times(entry, freed):
+    """Giờ thử cho dòng chờ: giờ vừa trống kẹp vào khung của khách, rồi giờ sớm nhất của khung."""
+    first, last = to_minutes(entry['earliest_time']), to_minutes(entry['latest_time'])
+    times = [_hhmm(min(max(freed, first), last)), entry['earliest_time']]
+    return list(dict.fromkeys(times))
+
+
+def match_waitlist(db, restaurant_id, wait_date, freed_time, mode='book', limit=MATCH_LIMIT, record=insert_history):
+    """
+    Ghép khung 2 giờ bắt đầu lúc freed_time vừa trống với danh sách chờ.
+    Trả về danh sách (waitlist_id, 'booked' | 'offered').
+    """
+    freed = to_minutes(freed_time)
+    candidates = db.execute(MATCH_QUERY, (
+        restaurant_id, str(wait_date), _hhmm(freed + SLOT_MINUTES - 1), _hhmm(freed - SLOT_MINUTES + 1), limit,
+    )).fetchall()
+    matched = []
+    for entry in candidates:
+        for start in _try_times(entry, freed):
+            if mode == 'offer':
+                if not assign_tables(db, restaurant_id, str(wait_date), start, entry['guests']):
+                    continue
+                db.execute("""
+                    UPDATE Waitlist SET status = 'offered', offered_time = ?, matched_at = ? WHERE waitlist_id = ?
+                """, (start, _now(), entry['waitlist_id']))
+                # Bàn không được giữ: chỉ mời một khách cho mỗi khung vừa trống
+                return matched + [(entry['waitlist_id'], 'offered')]
+            if book_entry(db, entry, start, record):
+                matched.append((entry['waitlist_id'], 'booked'))
+                break
+    return matched
+
+
+def accept_offer(db, waitlist_id, customer_id, record=insert_history):
+    """
+    Khách nhận lời mời: đặt bàn nếu còn; nếu bàn đã bị lấy mất, dòng quay lại 'waiting'.
+    Trả về reservation_id hoặc None.
+    """
+    entry = db.execute("SELECT * FROM Waitlist WHERE waitlist_id = ? AND customer_id = ? AND status = 'offered'",
+                       (waitlist_id, customer_id)).fetchone()
+    if entry is None:
+        return None
+    res_id = book_entry(db, entry, entry['offered_time'], record)
+    if res_id is None:
+        db.execute("UPDATE Waitlist SET status = 'waiting', offered_time = NULL WHERE waitlist_id = ?",
+                   (waitlist_id,))
+    return res_id
+
+
+def leave_waitlist(db, waitlist_id, customer_id):
+    cur = db.execute("""
+        UPDATE Waitlist SET status = 'cancelled'
+        WHERE waitlist_id = ? AND customer_id = ? AND status IN ('waiting', 'offered')
+    """, (waitlist_id, customer_id))
+    return cur.rowcount > 0
+
+
+def customer_waitlist(db, customer_id, today):
+    """Các dòng chờ từ hôm nay trở đi của khách, kèm tên nhà hàng."""
+    return db.execute("""
+        SELECT w.*, rest.name AS restaurant_name FROM Waitlist w
+        JOIN Restaurants rest ON rest.restaurant_id = w.restaurant_id
+        WHERE w.customer_id = ? AND w.wait_date >= ? AND rest.deleted_at IS NULL
+        ORDER BY w.wait_date, w.earliest_time
+    """, (customer_id, today)).fetchall()
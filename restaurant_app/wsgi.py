@@ -0,0 +1,29 @@
+"""
+Điểm vào WSGI cho production.
+
+    python -m restaurant_app.assets fetch    # một lần khi triển khai: phục vụ Bulma từ /assets thay vì CDN
+
+    RESTAURANT_DB_PATH=/srv/reso/restaurant_reservation.db \
+    RESTAURANT_SECRET_KEY=... \
+    RESTAURANT_STORAGE_PROFILE=wal \
+    RESTAURANT_PRECOMPILE_TEMPLATES=true \
+    gunicorn --preload -w 4 -b 0.0.0.0:8000 'restaurant_app.wsgi:app'
+
+Cấu hình đọc từ các biến môi trường RESTAURANT_<KHÓA> (xem create_app trong app.py), ví dụ
+RESTAURANT_DB_POOL_SIZE, RESTAURANT_SQLITE_CACHE_KB, RESTAURANT_TEMPLATE_CACHE_DIR.
+Thông báo cho khách: RESTAURANT_NOTIFY_SINK=smtp RESTAURANT_NOTIFY_SMTP_HOST=... (xem outbox.py).
+--preload an toàn: create_app() không mở kết nối CSDL hay luồng nền nào; pool kết nối, bản chụp
+dashboard và các luồng nền được tạo khi worker nhận request đầu tiên, nên không có kết nối SQLite
+nào đi qua fork. Với PRECOMPILE_TEMPLATES các template được biên dịch một lần ở tiến trình cha
+(hoặc nạp từ bytecode cache) và các worker dùng chung qua fork. `python app.py` chỉ dùng khi phát triển (debug=True).
+Để ghi nốt lịch sử đang chờ khi worker dừng, thêm vào gunicorn.conf.py:
+    def worker_exit(server, worker):
+        from restaurant_app.wsgi import app, shutdown_app
+        shutdown_app(app)
+"""
+try:
+    from .app import create_app, shutdown_app
+except ImportError:  # chạy trực tiếp trong thư mục restaurant_app: gunicorn wsgi:app
+    from app import create_app, shutdown_app
+
+app = create_app()
@@ -0,0 +1,132 @@
+"""
+CSDL mẫu dùng chung cho các test.
+
+template_database() dựng CSDL (schema + dữ liệu mẫu, mật khẩu mẫu chỉ băm một lần) một lần cho
+mỗi tiến trình test, trong thư mục tạm riêng. Mỗi test lấy một bản sao:
+  - clone_database(dir): sao chép file, cho code tự mở kết nối theo đường dẫn (app, sweeper, ...)
+  - memory_database(): sao vào :memory: bằng sqlite backup API, cho test chỉ cần một kết nối
+AppTestCase tạo app riêng (create_app) trỏ tới bản sao trong thư mục tạm của test, nên các test
+không dùng chung file nào (kể cả restaurant_reservation.db trong thư mục làm việc) và chạy song song
+được, ví dụ: python -m pytest -n auto tests/ (cần pytest-xdist).
+StubSMTPServer là máy chủ SMTP tối giản trên cổng ngẫu nhiên của 127.0.0.1, giữ lại thư nhận được.
+"""
+import atexit
+import os
+import shutil
+import socketserver
+import sqlite3
+import sys
+import tempfile
+import threading
+import unittest
+from email import message_from_bytes
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from restaurant_app.app import create_app, shutdown_app
+from restaurant_app.init_database import init_db
+
+_templates = {}
+
+
+def template_database(sample_data=True):
+    """Đường dẫn CSDL mẫu của tiến trình này; dựng ở lần gọi đầu, xóa khi tiến trình kết thúc."""
+    if sample_data not in _templates:
+        directory = tempfile.mkdtemp(prefix='reso-template-')
+        atexit.register(shutil.rmtree, directory, True)
+        path = os.path.join(directory, 'template.db')
+        init_db(path, sample_data=sample_data)
+        _templates[sample_data] = path
+    return _templates[sample_data]
+
+
+def clone_database(directory, name='test.db', sample_data=True):
+    """Sao chép CSDL mẫu thành directory/name; trả về đường dẫn."""
+    path = os.path.join(directory, name)
+    shutil.copyfile(template_database(sample_data), path)
+    return path
+
+
+def memory_database(sample_data=True):
+    """Kết nối :memory: (như sqlite3.connect(path) mặc định) chứa bản sao CSDL mẫu."""
+    source = sqlite3.connect(template_database(sample_data))
+    db = sqlite3.connect(':memory:')
+    try:
+        source.backup(db)
+    finally:
+        source.close()
+    return db
+
+
+class AppTestCase(unittest.TestCase):
+    """self.app (create_app) dùng bản sao CSDL mẫu self.db_path trong thư mục tạm self.tmpdir; self.client."""
+
+    config = {}
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='reso-test-')
+        self.db_path = clone_database(self.tmpdir)
+        self.app = create_app({
+            'TESTING': True,
+            'SECRET_KEY': 'test_secret_key',
+            'DB_PATH': self.db_path,
+            'SLOW_QUERY_LOG': os.path.join(self.tmpdir, 'slow_queries.jsonl'),
+            'PROFILE_DIR': os.path.join(self.tmpdir, 'profiles'),
+            **self.config,
+        })
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        shutdown_app(self.app)
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        self.reply('220 stub ESMTP')
+        sender, recipients = None, []
+        for raw in self.rfile:
+            command = raw.decode().strip()
+            verb = command.split(' ', 1)[0].upper()
+            if verb in ('EHLO', 'HELO'):
+                self.reply('250 stub')
+            elif verb == 'MAIL':
+                sender, recipients = command.split(':', 1)[1].strip(' <>'), []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                recipients.append(command.split(':', 1)[1].strip(' <>'))
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                lines = []
+                for line in self.rfile:
+                    if line == b'.\r\n':
+                        break
+                    lines.append(line[1:] if line.startswith(b'.') else line)
+                self.server.messages.append((sender, recipients, message_from_bytes(b''.join(lines))))
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+class StubSMTPServer(socketserver.ThreadingTCPServer):
+    """Máy chủ SMTP cho test: messages là danh sách (người gửi, người nhận, email.message.Message)."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _SMTPHandler)
+        self.messages = []
+        self.port = self.server_address[1]
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
@@ -1,31 +1,33 @@
 import unittest
 import os
 import sys
+import gzip
+import json
+import re
+import shutil
+import sqlite3
+import tempfile
+import time
 from datetime import datetime, timedelta
+from unittest.mock import patch
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from restaurant_app.app import app
-from restaurant_app.init_database import init_db, DB_PATH
+from restaurant_app.app import create_app, get_audit_writer, get_layout_cache, metrics_registry
+from tests.fixtures import AppTestCase, clone_database
+from restaurant_app import archive, purge, outbox
+from restaurant_app.pool import Connection
 
 
-class UserComponentTest(unittest.TestCase):
+class UserComponentTest(AppTestCase):
 
     def setUp(self):
-        """Thiết lập môi trường test cho mỗi lần chạy."""
-        app.config['TESTING'] = True
-        app.config['SECRET_KEY'] = 'test_secret_key'
-        app.config['DATABASE'] = 'test_db.sqlite'  # Sử dụng CSDL riêng
-        self.client = app.test_client()
-
-        if os.path.exists(DB_PATH):
-            os.remove(DB_PATH)
-        init_db()
+        """Thiết lập môi trường test cho mỗi lần chạy: app riêng với bản sao CSDL mẫu."""
+        super().setUp()
 
     def tearDown(self):
         """Dọn dẹp sau khi test xong."""
-        if os.path.exists(DB_PATH):
-            os.remove(DB_PATH)
+        super().tearDown()
 
     def test_CT_USR_01_register_success(self):
         """TC CT_USR_01: Đăng ký tài khoản thành công."""
@@ -90,26 +92,16 @@ class UserComponentTest(unittest.TestCase):
         self.assertIn(b'Profile updated.', response.data)
         self.assertIn(b'Updated Name', response.data)
 
-class RestaurantComponentTest(unittest.TestCase):
+class RestaurantComponentTest(AppTestCase):
 
     def setUp(self):
-        app.config['TESTING'] = True
-        app.config['SECRET_KEY'] = 'test_secret_key'
-        self.client = app.test_client()
-
-        if os.path.exists(DB_PATH):
-            os.remove(DB_PATH)
-        init_db()
+        super().setUp()
 
         # Đăng nhập với vai trò admin cho tất cả các test
         with self.client.session_transaction() as sess:
             sess['user'] = 1
             sess['role'] = 'admin'
 
-    def tearDown(self):
-        if os.path.exists(DB_PATH):
-            os.remove(DB_PATH)
-
     def test_CT_RES_01_admin_add_restaurant_success(self):
         """TC CT_RES_01: Admin thêm một nhà hàng mới thành công."""
         response = self.client.post('/admin/restaurant/new', data={
@@ -133,25 +125,86 @@ class RestaurantComponentTest(unittest.TestCase):
         self.assertIn(b'Restaurant deleted.', response.data)
         self.assertNotIn(b'Pizza Palace', response.data)
 
-class ReservationComponentTest(unittest.TestCase):
+    def test_CT_RES_04_admin_dashboard_reads_summary_tables(self):
+        """TC CT_RES_04: Dashboard hiển thị số liệu từ bảng thống kê."""
+        self.client.post('/admin/restaurant/new', data={
+            'name': 'New Test Cafe', 'location': 'Test City', 'cuisine': 'Coffee', 'rating': '4.8'
+        })
+        response = self.client.get('/admin')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'<p class="title">9</p>', response.data)  # 8 nhà hàng mẫu + 1
 
-    def setUp(self):
-        app.config['TESTING'] = True
-        app.config['SECRET_KEY'] = 'test_secret_key'
-        self.client = app.test_client()
+    def test_CT_RES_05_admin_booking_report(self):
+        """TC CT_RES_05: Trang báo cáo đọc số liệu từ rollup."""
+        tomorrow = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+        self.client.post('/login', data={'who': 'customer', 'username': 'cuong', 'password': 'admin'})
+        self.client.post('/restaurant/1', data={'date': tomorrow, 'time': '19:00', 'guests': '2'})
+        with self.client.session_transaction() as sess:
+            sess['user'] = 1
+            sess['role'] = 'admin'
+
+        # GET chỉ đọc rollup; dữ liệu mới được cộng khi admin bấm Refresh (POST)
+        response = self.client.get('/admin/reports?restaurant_id=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'0 bookings, 0 guests', response.data)
+        self.assertIn(b'have not been rolled up yet', response.data)
+        response = self.client.post('/admin/reports/refresh', data={'restaurant_id': '1'}, follow_redirects=True)
+        self.assertIn(b'1 bookings, 2 guests', response.data)
+        self.assertIn(b'Table occupancy', response.data)
+        self.assertNotIn(b'have not been rolled up yet', response.data)
+
+    def test_CT_RES_06_deleted_restaurant_hidden_then_purged(self):
+        """TC CT_RES_06: Nhà hàng bị xóa biến mất khỏi trang công khai ngay, dữ liệu được dọn dần."""
+        self.app.config['PURGE_INTERVAL_SECONDS'] = 0
+        try:
+            self.client.post('/admin/restaurant/1/delete')
+        finally:
+            self.app.config['PURGE_INTERVAL_SECONDS'] = 60
+        self.assertNotIn(b'Pizza Palace', self.client.get('/restaurants').data)
+        response = self.client.get('/admin/deletions')
+        self.assertIn(b'in progress', response.data)
+
+        db = sqlite3.connect(self.db_path)
+        db.execute("PRAGMA foreign_keys = ON;")
+        purge.purge_pending(db)
+        remaining = db.execute("SELECT COUNT(*) FROM Tables WHERE restaurant_id = 1").fetchone()[0]
+        db.close()
+        self.assertEqual(remaining, 0)
+        self.assertNotIn(b'in progress', self.client.get('/admin/deletions').data)
+
+    def test_CT_RES_07_bulk_table_layout(self):
+        """TC CT_RES_07: Admin dán sơ đồ bàn, xem trước thay đổi rồi áp dụng; trang nhà hàng hiển thị sơ đồ mới."""
+        self.client.get('/restaurant/1')
+        layout_text = "table_number,capacity\n" + "".join(f"P{i},4\n" for i in range(1, 51))
+        response = self.client.post('/admin/restaurant/1/tables/layout',
+                                    data={'layout': layout_text, 'action': 'preview'})
+        self.assertIn(b'50 to add', response.data)
+        self.assertIn(b'Apply Layout', response.data)
+
+        response = self.client.post('/admin/restaurant/1/tables/layout',
+                                    data={'layout': layout_text, 'action': 'apply'}, follow_redirects=True)
+        self.assertIn(b'Layout applied: 50 added', response.data)
+        try:
+            detail = self.client.get('/restaurant/1').data
+            self.assertIn(b'P50', detail)
+        finally:
+            with self.app.app_context():
+                get_layout_cache().clear()
+
+        response = self.client.post('/admin/restaurant/1/tables/layout',
+                                    data={'layout': "T1,2\nT1,4\n", 'action': 'preview'}, follow_redirects=True)
+        self.assertIn(b'Line 2', response.data)
+
+
+class ReservationComponentTest(AppTestCase):
 
-        if os.path.exists(DB_PATH):
-            os.remove(DB_PATH)
-        init_db()
+    def setUp(self):
+        super().setUp()
 
         # Đăng nhập với vai trò customer cho tất cả các test
         # User 'cuong' đã được tạo sẵn trong init_db.py
         self.client.post('/login', data={'who': 'customer', 'username': 'cuong', 'password': 'admin'})
 
-    def tearDown(self):
-        if os.path.exists(DB_PATH):
-            os.remove(DB_PATH)
-
     def test_CT_REV_01_create_reservation_success(self):
         """TC CT_REV_01: Khách hàng tạo một lượt đặt bàn mới thành công."""
         tomorrow = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
@@ -202,6 +255,523 @@ class ReservationComponentTest(unittest.TestCase):
         self.assertIn(b'Reservation cancelled.', response.data)
         self.assertIn(b'guests | <em>cancelled</em>', response.data)
 
+    def test_CT_REV_05_cancel_with_async_audit(self):
+        """TC CT_REV_05: Chế độ ghi lịch sử bất đồng bộ vẫn ghi đủ sau khi drain."""
+        tomorrow = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+        self.client.post('/restaurant/1', data={'date': tomorrow, 'time': '19:00', 'guests': '2'})
+        self.app.config['AUDIT_MODE'] = 'async'
+        try:
+            response = self.client.post('/reservation/1/edit', data={'action': 'cancel'}, follow_redirects=True)
+        finally:
+            self.app.config['AUDIT_MODE'] = 'sync'
+        self.assertIn(b'Reservation cancelled.', response.data)
+
+        with self.app.app_context():
+            get_audit_writer().drain()
+        db = sqlite3.connect(self.db_path)
+        actions = [row[0] for row in db.execute("SELECT action FROM ReservationHistory WHERE reservation_id = 1")]
+        db.close()
+        self.assertEqual(actions, ['cancelled'])
+
+    def test_CT_REV_09_async_audit_skips_rolled_back_changes(self):
+        """TC CT_REV_09: Chế độ bất đồng bộ không ghi lịch sử cho request lỗi trước khi commit."""
+        tomorrow = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+        self.client.post('/restaurant/1', data={'date': tomorrow, 'time': '19:00', 'guests': '2'})
+        self.app.config['AUDIT_MODE'] = 'async'
+        try:
+            with patch('restaurant_app.app.release_slot', side_effect=RuntimeError('boom')):
+                with self.assertRaises(RuntimeError):
+                    self.client.post('/reservation/1/edit', data={'action': 'cancel'})
+            with self.app.app_context():
+                self.assertEqual(get_audit_writer().pending, 0)
+            self.client.post('/reservation/1/edit', data={'action': 'cancel'})
+        finally:
+            self.app.config['AUDIT_MODE'] = 'sync'
+
+        with self.app.app_context():
+            get_audit_writer().drain()
+        db = sqlite3.connect(self.db_path)
+        status = db.execute("SELECT status FROM Reservations WHERE reservation_id = 1").fetchone()[0]
+        actions = [row[0] for row in db.execute("SELECT action FROM ReservationHistory WHERE reservation_id = 1")]
+        db.close()
+        self.assertEqual((status, actions), ('cancelled', ['cancelled']))
+
+
+    def test_CT_REV_06_large_party_gets_combined_tables(self):
+        """TC CT_REV_06: Đoàn đông hơn mọi bàn được ghép bàn tự động và hiển thị đủ các bàn."""
+        tomorrow = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+        # Pizza Palace có bàn V1 (2), V2 (6), V3 (4): 10 khách -> V2 + V3
+        response = self.client.post('/restaurant/1', data={
+            'date': tomorrow, 'time': '19:00', 'guests': '10'
+        }, follow_redirects=True)
+        self.assertIn(b'Reservation created and is pending confirmation.', response.data)
+        self.assertIn(b'Table: V2 + V3', response.data)
+
+        # V3 đang bị ghép nên không chọn riêng được trong cùng khung giờ
+        response = self.client.post('/restaurant/1', data={
+            'date': tomorrow, 'time': '20:00', 'guests': '2', 'table_id': '6'
+        }, follow_redirects=True)
+        self.assertIn(b'No available table for that time and party size.', response.data)
+
+    def test_CT_REV_07_waitlist_booked_after_cancellation(self):
+        """TC CT_REV_07: Khách vào danh sách chờ khi hết bàn và được đặt tự động khi có lượt hủy."""
+        tomorrow = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+        # The Golden Spoon (ID=3) chỉ có một bàn H1
+        self.client.post('/restaurant/3', data={'date': tomorrow, 'time': '19:00', 'guests': '4'})
+        response = self.client.post('/restaurant/3', data={'date': tomorrow, 'time': '19:00', 'guests': '2'},
+                                    follow_redirects=True)
+        self.assertIn(b'No available table', response.data)
+        self.assertIn(b'Join the waitlist', response.data)
+
+        self.client.post('/register', data={'username': 'waiter', 'password': 'password123',
+                                            'confirm_password': 'password123', 'email': 'waiter@example.com'})
+        self.client.post('/login', data={'who': 'customer', 'username': 'waiter', 'password': 'password123'})
+        response = self.client.post('/restaurant/3/waitlist', data={
+            'date': tomorrow, 'earliest_time': '18:30', 'latest_time': '20:00', 'guests': '2'
+        }, follow_redirects=True)
+        self.assertIn(b"on the waitlist", response.data)
+
+        self.client.post('/login', data={'who': 'customer', 'username': 'cuong', 'password': 'admin'})
+        self.client.post('/reservation/1/edit', data={'action': 'cancel'})
+
+        self.client.post('/login', data={'who': 'customer', 'username': 'waiter', 'password': 'password123'})
+        response = self.client.get('/bookings')
+        self.assertIn(b'<em>booked</em>', response.data)
+        self.assertIn(b'The Golden Spoon', response.data)
+        self.assertIn(b'guests | <em>pending</em>', response.data)
+
+    def test_CT_REV_08_edit_keeps_tables_only_if_free(self):
+        """TC CT_REV_08: Sửa lượt đặt sang khung giờ mà bàn hiện tại đã có người giữ thì không được giữ bàn đó."""
+        tomorrow = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+        # Kín cả ba bàn của Pizza Palace lúc 19:00 (lượt 1-3), lượt 4 ngồi bàn V1 lúc 12:00
+        for guests in ('2', '6', '4'):
+            self.client.post('/restaurant/1', data={'date': tomorrow, 'time': '19:00', 'guests': guests})
+        self.client.post('/restaurant/1', data={'date': tomorrow, 'time': '12:00', 'guests': '2'})
+
+        response = self.client.post('/reservation/4/edit', data={'date': tomorrow, 'time': '19:00', 'guests': '2'},
+                                    follow_redirects=True)
+        self.assertIn(b'No available table for updated time/party size.', response.data)
+        db = sqlite3.connect(self.db_path)
+        self.assertEqual(db.execute("SELECT reservation_time FROM Reservations WHERE reservation_id = 4").fetchone()[0],
+                         '12:00')
+        db.close()
+
+        # Khung giờ còn trống: vẫn giữ bàn V1
+        response = self.client.post('/reservation/4/edit', data={'date': tomorrow, 'time': '15:00', 'guests': '2'},
+                                    follow_redirects=True)
+        self.assertIn(b'Reservation updated.', response.data)
+        db = sqlite3.connect(self.db_path)
+        self.assertEqual(db.execute("SELECT table_id FROM Reservations WHERE reservation_id = 4").fetchone()[0],
+                         db.execute("SELECT table_id FROM Reservations WHERE reservation_id = 1").fetchone()[0])
+        db.close()
+
+    def test_CT_REV_10_accept_waitlist_offer(self):
+        """TC CT_REV_10: Chế độ mời: khách nhận lời mời qua route thì được đặt bàn, lời mời chỉ dùng được một lần."""
+        tomorrow = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+        self.app.config['WAITLIST_MODE'] = 'offer'
+        try:
+            # The Golden Spoon (ID=3) chỉ có một bàn H1
+            self.client.post('/restaurant/3', data={'date': tomorrow, 'time': '19:00', 'guests': '4'})
+            self.client.post('/restaurant/3/waitlist', data={
+                'date': tomorrow, 'earliest_time': '18:30', 'latest_time': '20:00', 'guests': '2'})
+            self.client.post('/reservation/1/edit', data={'action': 'cancel'})
+            response = self.client.post('/waitlist/1/accept', follow_redirects=True)
+            self.assertIn(b'Reservation created and is pending confirmation.', response.data)
+            response = self.client.post('/waitlist/1/accept', follow_redirects=True)
+            self.assertIn(b'that table has just been taken', response.data)
+        finally:
+            self.app.config['WAITLIST_MODE'] = 'book'
+        db = sqlite3.connect(self.db_path)
+        rows = db.execute("SELECT status, reservation_id FROM Waitlist WHERE waitlist_id = 1").fetchall()
+        active = db.execute("SELECT COUNT(*) FROM Reservations WHERE restaurant_id = 3 "
+                            "AND status = 'pending'").fetchone()[0]
+        db.close()
+        self.assertEqual((rows, active), ([('booked', 2)], 1))
+
+    def test_CT_REV_11_waitlist_booking_history_follows_audit_mode(self):
+        """TC CT_REV_11: Lượt đặt từ danh sách chờ ghi lịch sử theo AUDIT_MODE (async: qua hàng đợi)."""
+        tomorrow = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+        self.client.post('/restaurant/3', data={'date': tomorrow, 'time': '19:00', 'guests': '4'})
+        self.client.post('/restaurant/3/waitlist', data={
+            'date': tomorrow, 'earliest_time': '18:30', 'latest_time': '20:00', 'guests': '2'})
+        self.app.config['AUDIT_MODE'] = 'async'
+        try:
+            self.client.post('/reservation/1/edit', data={'action': 'cancel'})
+            db = sqlite3.connect(self.db_path)
+            self.assertEqual(db.execute("SELECT status FROM Waitlist WHERE waitlist_id = 1").fetchone()[0], 'booked')
+            self.assertEqual(db.execute("SELECT COUNT(*) FROM ReservationHistory").fetchone()[0], 0)
+            with self.app.app_context():
+                self.assertEqual(get_audit_writer().pending, 2)
+                get_audit_writer().drain()
+            actions = [row[0] for row in db.execute("SELECT action FROM ReservationHistory ORDER BY history_id")]
+            db.close()
+        finally:
+            self.app.config['AUDIT_MODE'] = 'sync'
+        self.assertEqual(actions, ['cancelled', 'waitlist'])
+
+class AdminBulkReservationComponentTest(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        # 3 lượt đặt ở Pizza Palace, 1 lượt ở Sushi World (res_id 1..4)
+        self.tomorrow = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+        self.client.post('/login', data={'who': 'customer', 'username': 'cuong', 'password': 'admin'})
+        for rid, time_str in ((1, '12:00'), (1, '15:00'), (1, '19:00'), (2, '19:00')):
+            self.client.post(f'/restaurant/{rid}', data={'date': self.tomorrow, 'time': time_str, 'guests': '2'})
+        with self.client.session_transaction() as sess:
+            sess['user'] = 1
+            sess['role'] = 'admin'
+
+    def _statuses(self):
+        db = sqlite3.connect(self.db_path)
+        rows = dict(db.execute("SELECT reservation_id, status FROM Reservations"))
+        history = db.execute("SELECT COUNT(*) FROM ReservationHistory").fetchone()[0]
+        db.close()
+        return rows, history
+
+    def test_CT_BULK_01_confirm_selected(self):
+        """TC CT_BULK_01: Xác nhận các lượt đặt được chọn trong một lần gửi."""
+        response = self.client.post('/admin/reservations/bulk', data={
+            'status': 'confirmed', 'scope': 'selected', 'reservation_ids': ['1', '3']
+        }, follow_redirects=True)
+        self.assertIn(b'2 reservation(s) set to confirmed.', response.data)
+        statuses, history = self._statuses()
+        self.assertEqual(statuses, {1: 'confirmed', 2: 'pending', 3: 'confirmed', 4: 'pending'})
+        self.assertEqual(history, 2)
+
+    def test_CT_BULK_02_reject_everything_matching_filter(self):
+        """TC CT_BULK_02: Từ chối mọi lượt đặt khớp bộ lọc; lượt đã đúng trạng thái không bị tính."""
+        self.client.post('/admin/reservations/bulk', data={'status': 'rejected', 'reservation_ids': ['2']})
+        response = self.client.post('/admin/reservations/bulk', data={
+            'status': 'rejected', 'scope': 'filter', 'restaurant_id': '1', 'date': self.tomorrow
+        }, follow_redirects=True)
+        self.assertIn(b'2 reservation(s) set to rejected.', response.data)
+        statuses, history = self._statuses()
+        self.assertEqual(statuses, {1: 'rejected', 2: 'rejected', 3: 'rejected', 4: 'pending'})
+        self.assertEqual(history, 3)
+
+    def test_CT_BULK_03_filter_scope_requires_a_filter(self):
+        """TC CT_BULK_03: Không cho phép cập nhật toàn bộ khi chưa chọn bộ lọc."""
+        response = self.client.post('/admin/reservations/bulk', data={'status': 'completed', 'scope': 'filter'},
+                                    follow_redirects=True)
+        self.assertIn(b'Choose at least one filter', response.data)
+        statuses, history = self._statuses()
+        self.assertEqual(set(statuses.values()), {'pending'})
+
+    def test_CT_BULK_04_reoptimize_history_follows_audit_mode(self):
+        """TC CT_BULK_04: Xếp lại bàn ghi lịch sử 'reassigned' theo AUDIT_MODE (async: qua hàng đợi)."""
+        db = sqlite3.connect(self.db_path)
+        # Lượt 2 (15:00, 2 khách) ngồi bàn V2 6 chỗ: xếp lại sẽ chuyển sang bàn nhỏ hơn
+        db.execute("UPDATE Reservations SET table_id = (SELECT table_id FROM Tables WHERE restaurant_id = 1 "
+                   "AND table_number = 'V2') WHERE reservation_id = 2")
+        db.commit()
+        self.app.config['AUDIT_MODE'] = 'async'
+        try:
+            response = self.client.post('/admin/reservations/reoptimize', data={
+                'restaurant_id': '1', 'date': self.tomorrow}, follow_redirects=True)
+            self.assertIn(b'1 moved', response.data)
+            self.assertEqual(self._statuses()[1], 0)
+            with self.app.app_context():
+                get_audit_writer().drain()
+        finally:
+            self.app.config['AUDIT_MODE'] = 'sync'
+        actions = db.execute("SELECT reservation_id, action FROM ReservationHistory").fetchall()
+        db.close()
+        self.assertEqual(actions, [(2, 'reassigned')])
+
+
+class ArchivedBookingsComponentTest(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        # Một lượt đặt đã hoàn tất từ 2 năm trước của 'cuong', được chuyển vào bảng lưu trữ
+        old_date = (datetime.now() - timedelta(days=730)).strftime('%Y-%m-%d')
+        db = sqlite3.connect(self.db_path)
+        db.execute("PRAGMA foreign_keys = ON;")
+        customer_id = db.execute("SELECT customer_id FROM Customers WHERE username = 'cuong'").fetchone()[0]
+        db.execute("INSERT INTO Reservations (customer_id, restaurant_id, reservation_date, reservation_time, guests, status) VALUES (?, 2, ?, '19:00', 7, 'completed')",
+                   (customer_id, old_date))
+        db.commit()
+        archive.archive_reservations(db)
+        db.close()
+        self.client.post('/login', data={'who': 'customer', 'username': 'cuong', 'password': 'admin'})
+
+    def test_CT_ARC_01_archived_bookings_shown_on_request(self):
+        """TC CT_ARC_01: Lượt đặt đã lưu trữ chỉ hiện khi khách chọn xem."""
+        response = self.client.get('/bookings')
+        self.assertNotIn(b'7\n    guests', response.data)
+        self.assertIn(b'Show archived bookings', response.data)
+
+        response = self.client.get('/bookings?archived=1')
+        self.assertIn(b'7\n    guests', response.data)
+        self.assertIn(b'Archived', response.data)
+
+
+class MetricsComponentTest(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+        metrics_registry.clear()
+
+    def test_CT_MET_01_metrics_endpoint(self):
+        """TC CT_MET_01: /metrics có độ trễ theo endpoint/status, thời gian SQL và thời gian render template."""
+        self.client.get('/login')
+        self.client.post('/login', data={'who': 'customer', 'username': 'cuong', 'password': 'wrong'})
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain; version=0.0.4'))
+        text = response.get_data(as_text=True)
+        self.assertIn('http_request_duration_seconds_count{endpoint="login",method="GET",status="200"} 1', text)
+        self.assertIn('http_request_duration_seconds_count{endpoint="login",method="POST",status="200"} 1', text)
+        self.assertIn('http_request_sql_seconds_count{endpoint="login"} 1', text)
+        self.assertIn('template_render_seconds_count{template="login.html"} 2', text)
+        self.assertIn('db_connect_seconds_count 1', text)
+
+        self.app.config['METRICS_ENABLED'] = False
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+    def test_CT_MET_04_disabled_metrics_use_plain_connections(self):
+        """TC CT_MET_04: Tắt METRICS_ENABLED thì pool dùng kết nối thường và không đo thời gian kết nối."""
+        factory_app = create_app({'DB_PATH': self.db_path, 'METRICS_ENABLED': False})
+        client = factory_app.test_client()
+        self.assertEqual(client.get('/restaurants').status_code, 200)
+        pool = factory_app.extensions['restaurant']['pools'][self.db_path]
+        self.assertIs(pool.factory, Connection)
+        with factory_app.app_context():
+            self.assertNotIn('db_connect_seconds_count', metrics_registry.expose())
+        pool.close()
+
+    def test_CT_MET_02_slow_query_log_in_admin(self):
+        """TC CT_MET_02: Bật SLOW_QUERY_MS, câu lệnh của request hiện trong trang admin kèm route."""
+        log_path = os.path.join(self.tmpdir, 'slow.jsonl')
+        self.app.config['SLOW_QUERY_MS'] = 0.000001
+        self.app.config['SLOW_QUERY_LOG'] = log_path
+        try:
+            self.client.get('/restaurants?q=Pizza')
+            with self.client.session_transaction() as sess:
+                sess['user'] = 1
+                sess['role'] = 'admin'
+            response = self.client.get('/admin/slow-queries')
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(b'GET /restaurants', response.data)
+            self.assertIn(b'FROM Restaurants', response.data)
+        finally:
+            self.app.config['SLOW_QUERY_MS'] = 0
+            self.app.config['SLOW_QUERY_LOG'] = 'slow_queries.jsonl'
+            if os.path.exists(log_path):
+                os.remove(log_path)
+
+    def test_CT_MET_03_profile_header_for_admin_only(self):
+        """TC CT_MET_03: Header X-Profile chỉ profile request của admin và lưu file pstats."""
+        profile_dir = os.path.join(self.tmpdir, 'profiles')
+        self.app.config['PROFILE_DIR'] = profile_dir
+        try:
+            self.client.post('/login', data={'who': 'customer', 'username': 'cuong', 'password': 'admin'})
+            self.client.get('/restaurants', headers={'X-Profile': '1'})
+            self.assertFalse(os.path.exists(profile_dir))
+
+            with self.client.session_transaction() as sess:
+                sess['user'] = 1
+                sess['role'] = 'admin'
+            self.client.get('/admin/reservations')
+            self.assertFalse(os.path.exists(profile_dir))
+            self.client.get('/admin/reservations', headers={'X-Profile': '1'})
+            files = os.listdir(profile_dir)
+            self.assertEqual(len(files), 1)
+            self.assertIn('admin_reservations', files[0])
+        finally:
+            self.app.config['PROFILE_DIR'] = 'profiles'
+            shutil.rmtree(profile_dir, ignore_errors=True)
+
+
+class NotificationComponentTest(AppTestCase):
+
+    config = {'NOTIFY_SINK': 'file', 'NOTIFY_INTERVAL_SECONDS': 60}
+
+    def setUp(self):
+        super().setUp()
+        self.notify_file = self.app.config['NOTIFY_FILE'] = os.path.join(self.tmpdir, 'notifications.jsonl')
+
+    def delivered(self, count):
+        """Các thông báo trong NOTIFY_FILE, chờ tối đa 5 giây cho tới khi đủ count dòng."""
+        deadline = time.time() + 5
+        lines = []
+        while time.time() < deadline:
+            if os.path.exists(self.notify_file):
+                with open(self.notify_file, encoding='utf-8') as f:
+                    lines = [json.loads(line) for line in f]
+                if len(lines) >= count:
+                    break
+            time.sleep(0.02)
+        return lines
+
+    def test_CT_NTF_01_booking_and_admin_status_notify_customer(self):
+        """TC CT_NTF_01: Đặt bàn và admin xác nhận gửi thông báo qua luồng nền, backlog có trong /metrics."""
+        with self.client.session_transaction() as sess:
+            sess['user'] = 1
+            sess['role'] = 'customer'
+        tomorrow = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+        self.client.post('/restaurant/1', data={'date': tomorrow, 'time': '19:00', 'guests': '2'})
+        res_id = sqlite3.connect(self.db_path).execute("SELECT MAX(reservation_id) FROM Reservations").fetchone()[0]
+        with self.client.session_transaction() as sess:
+            sess['user'] = 1
+            sess['role'] = 'admin'
+        self.client.post(f'/admin/reservation/{res_id}/update', data={'status': 'confirmed'})
+
+        messages = self.delivered(2)
+        self.assertEqual([(m['reservation_id'], m['event'], m['to']) for m in messages],
+                         [(res_id, 'created', 'john@example.com'), (res_id, 'confirmed', 'john@example.com')])
+        text = self.client.get('/metrics').get_data(as_text=True)
+        self.assertIn('notifications_delivered_total 2', text)
+        self.assertIn('notification_outbox_pending 0', text)
+
+    def test_CT_NTF_02_outbox_kept_when_sink_disabled(self):
+        """TC CT_NTF_02: NOTIFY_SINK tắt thì thông báo vẫn nằm trong outbox để `outbox.py deliver` gửi sau."""
+        self.app.config['NOTIFY_SINK'] = None
+        with self.client.session_transaction() as sess:
+            sess['user'] = 2
+            sess['role'] = 'customer'
+        tomorrow = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+        self.client.post('/restaurant/2', data={'date': tomorrow, 'time': '19:00', 'guests': '2'})
+        self.assertNotIn('notifiers', self.app.extensions['restaurant'])
+        self.assertNotIn('notification_outbox_pending', self.client.get('/metrics').get_data(as_text=True))
+        db = sqlite3.connect(self.db_path)
+        self.assertEqual(db.execute("SELECT customer_id, event FROM NotificationOutbox").fetchall(), [(2, 'created')])
+        db.close()
+
+        outbox.main(['--db', self.db_path, 'deliver', '--file', self.notify_file])
+        self.assertEqual([m['to'] for m in self.delivered(1)], ['abc@example.com'])
+
+
+class AppFactoryComponentTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = clone_database(self.tmp, 'factory.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_CT_APP_01_config_from_env_and_dict(self):
+        """TC CT_APP_01: create_app đọc DB_PATH/pool từ biến môi trường và dict, dùng lại kết nối giữa các request."""
+        with patch.dict(os.environ, {'RESTAURANT_DB_PATH': 'ignored.db', 'RESTAURANT_DB_POOL_SIZE': '2'}):
+            factory_app = create_app({'DB_PATH': self.path, 'TESTING': True})
+        self.assertEqual(factory_app.config['DB_POOL_SIZE'], 2)
+        self.assertEqual(factory_app.config['DB_PATH'], self.path)
+        client = factory_app.test_client()
+
+        response = client.post('/login', data={'who': 'customer', 'username': 'cuong', 'password': 'admin'},
+                               follow_redirects=True)
+        self.assertIn(b'Logged in.', response.data)
+        self.assertIn(b'href="/restaurants"', response.data)
+        client.get('/restaurants')
+        self.assertFalse(os.path.exists('ignored.db'))
+        pools = factory_app.extensions['restaurant']['pools']
+        self.assertEqual(list(pools), [self.path])
+        self.assertEqual(pools[self.path].opened, 1)
+        self.assertGreaterEqual(pools[self.path].reused, 1)
+        self.assertIn('db_pool_connections_opened_total 1', client.get('/metrics').get_data(as_text=True))
+        # Resource của app khác độc lập với app này
+        self.assertNotIn('pools', create_app().extensions['restaurant'])
+        pools[self.path].close()
+
+    def test_CT_APP_02_template_bytecode_cache_and_precompile(self):
+        """TC CT_APP_02: PRECOMPILE_TEMPLATES biên dịch mọi template vào bytecode cache, thời gian khởi động có trong /metrics."""
+        cache_dir = os.path.join(self.tmp, 'jinja')
+        config = {'DB_PATH': self.path, 'TEMPLATE_CACHE_DIR': cache_dir, 'PRECOMPILE_TEMPLATES': True}
+        factory_app = create_app(config)
+        templates = factory_app.jinja_env.list_templates()
+        self.assertEqual(len(os.listdir(cache_dir)), len(templates))
+        self.assertIn('app_startup_seconds', factory_app.test_client().get('/metrics').get_data(as_text=True))
+
+        with patch('jinja2.environment.Environment.compile') as compile_source:
+            create_app(config)
+        compile_source.assert_not_called()
+        self.assertNotIn('bytecode_cache', create_app({'TEMPLATE_CACHE_DIR': False}).jinja_options)
+
+    def test_CT_APP_03_gzip_and_fingerprinted_assets(self):
+        """TC CT_APP_03: HTML được nén gzip, file tĩnh có fingerprint được cache lâu dài và bản nén được dùng lại."""
+        factory_app = create_app({'DB_PATH': self.path, 'COMPRESS_MIN_BYTES': 200})
+        client = factory_app.test_client()
+        plain = client.get('/login')
+        self.assertNotIn('Content-Encoding', plain.headers)
+        self.assertIn('Accept-Encoding', plain.headers['Vary'])
+        self.assertNotIn(b'<script>', plain.data)
+        compressed = client.get('/login', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(compressed.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(compressed.data), plain.data)
+
+        script_url = re.search(rb'src="(/assets/js/navbar\.[0-9a-f]{12}\.js)"', plain.data).group(1).decode()
+        with open(os.path.join(factory_app.static_folder, 'js', 'navbar.js'), 'rb') as f:
+            source = f.read()
+        for _ in range(2):
+            response = client.get(script_url, headers={'Accept-Encoding': 'gzip'})
+            self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+            self.assertEqual(gzip.decompress(response.data), source)
+        self.assertIn('immutable', response.headers['Cache-Control'])
+        self.assertIn('max-age=31536000', response.headers['Cache-Control'])
+        self.assertTrue(response.headers['ETag'].startswith('W/'))
+        self.assertEqual(client.get(script_url, headers={'If-None-Match': response.headers['ETag']}).status_code, 304)
+        gzip_cache = factory_app.extensions['restaurant']['gzip_caches'][None]
+        self.assertEqual((gzip_cache.hits, gzip_cache.misses), (1, 1))
+        self.assertEqual(client.get(script_url.replace('navbar.', 'navbar.0')).status_code, 404)
+
+    def test_CT_APP_04_availability_fan_out_page(self):
+        """TC CT_APP_04: /availability hiển thị bàn trống theo nhà hàng x ngày, hết hạn chót thì báo kết quả dở dang."""
+        factory_app = create_app({'DB_PATH': self.path, 'AVAILABILITY_WORKERS': 2})
+        client = factory_app.test_client()
+        tomorrow = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+        response = client.get(f'/availability?date={tomorrow}&days=2&time=19:00&guests=2')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Pizza Palace', response.data)
+        self.assertIn(f'/restaurant/1?date={tomorrow}&amp;time=19:00&amp;guests=2'.encode(), response.data)
+        self.assertNotIn(b'results are partial', response.data)
+
+        service = factory_app.extensions['restaurant']['availability'][self.path]
+        run = service._run
+        factory_app.config['AVAILABILITY_TIMEOUT'] = 0.1
+        with patch.object(service, '_run', lambda lookup: (time.sleep(0.3), run(lookup))[1]):
+            response = client.get(f'/availability?date={tomorrow}&days=2&time=19:00&guests=2')
+        self.assertIn(b'results are partial', response.data)
+        self.assertIn(b'Invalid date', client.get('/availability?days=x', follow_redirects=True).data)
+        factory_app.extensions['restaurant']['availability'][self.path].close()
+
+    def test_CT_APP_05_availability_matches_combined_booking(self):
+        """TC CT_APP_05: Đoàn đông chỉ vừa khi ghép bàn: /availability báo còn chỗ đúng như lúc đặt thật."""
+        db = sqlite3.connect(self.path)
+        rid = db.execute("INSERT INTO Restaurants (name, location, cuisine, rating) "
+                         "VALUES ('Long Table', 'Dock', 'Seafood', 5)").lastrowid
+        db.executemany("INSERT INTO Tables (restaurant_id, table_number, capacity, zone) VALUES (?, ?, 4, 'patio')",
+                       [(rid, 'P1'), (rid, 'P2')])
+        db.commit()
+        db.close()
+        factory_app = create_app({'DB_PATH': self.path, 'AVAILABILITY_WORKERS': 2})
+        client = factory_app.test_client()
+        tomorrow = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+        grid_url = f'/availability?date={tomorrow}&days=1&time=19:00&guests=8&location=Dock'
+        booking_url = f'/restaurant/{rid}?date={tomorrow}&amp;time=19:00&amp;guests=8'.encode()
+        self.assertIn(booking_url, client.get(grid_url).data)
+
+        client.post('/login', data={'who': 'customer', 'username': 'cuong', 'password': 'admin'})
+        response = client.post(f'/restaurant/{rid}', data={'date': tomorrow, 'time': '19:00', 'guests': '8'},
+                               follow_redirects=True)
+        self.assertIn(b'Reservation created', response.data)
+        db = sqlite3.connect(self.path)
+        booked = db.execute("SELECT COUNT(*) FROM ReservationTables rt JOIN Reservations r USING (reservation_id) "
+                            "WHERE r.restaurant_id = ?", (rid,)).fetchone()[0]
+        db.close()
+        self.assertEqual(booked, 2)
+        # Cả hai bàn đã được ghép: lưới báo hết chỗ, đặt thêm cũng thất bại
+        page = client.get(grid_url).data
+        self.assertNotIn(booking_url, page)
+        self.assertIn(b'Full', page)
+        response = client.post(f'/restaurant/{rid}', data={'date': tomorrow, 'time': '19:00', 'guests': '8'},
+                               follow_redirects=True)
+        self.assertIn(b'No available table', response.data)
+        factory_app.extensions['restaurant']['availability'][self.path].close()
+
 
 if __name__ == '__main__':
     unittest.main(verbosity=2)
\ No newline at end of file
@@ -6,21 +6,10 @@ from datetime import datetime, timedelta
 # Thêm thư mục gốc của dự án vào Python Path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from restaurant_app.app import app
-from restaurant_app.init_database import init_db, DB_PATH
+from tests.fixtures import AppTestCase
 
 
-class CustomerFlowIntegrationTest(unittest.TestCase):
-    def setUp(self):
-        app.config['TESTING'] = True
-        app.config['SECRET_KEY'] = 'test_secret_key'
-        self.client = app.test_client()
-        if os.path.exists(DB_PATH): os.remove(DB_PATH)
-        init_db()
-
-    def tearDown(self):
-        if os.path.exists(DB_PATH): os.remove(DB_PATH)
-
+class CustomerFlowIntegrationTest(AppTestCase):
     def test_IT_FLOW_01_full_customer_journey_success(self):
         """TC IT_FLOW_01: Luồng thành công A-Z từ đăng ký đến xem đặt bàn."""
         # 1. Đăng ký
@@ -61,16 +50,7 @@ class CustomerFlowIntegrationTest(unittest.TestCase):
         self.assertIn(b'No available table for updated time/party size.', response.data)
 
 
-class AvailabilityIntegrationTest(unittest.TestCase):
-    def setUp(self):
-        app.config['TESTING'] = True
-        self.client = app.test_client()
-        if os.path.exists(DB_PATH): os.remove(DB_PATH)
-        init_db()
-
-    def tearDown(self):
-        if os.path.exists(DB_PATH): os.remove(DB_PATH)
-
+class AvailabilityIntegrationTest(AppTestCase):
     def test_IT_AVAIL_01_booking_conflict(self):
         """TC IT_AVAIL_01: User 1 đặt thành công, User 2 đặt trùng giờ thất bại."""
         self.client.post('/login', data={'who': 'customer', 'username': 'cuong', 'password': 'admin'})
@@ -97,16 +77,7 @@ class AvailabilityIntegrationTest(unittest.TestCase):
         response = self.client.post('/restaurant/2', data={'date': '2025-11-12', 'time': '20:00', 'guests': '2'}, follow_redirects=True)
         self.assertIn(b'Reservation created', response.data)
 
-class AdminCustomerSyncIntegrationTest(unittest.TestCase):
-    def setUp(self):
-        app.config['TESTING'] = True
-        self.client = app.test_client()
-        if os.path.exists(DB_PATH): os.remove(DB_PATH)
-        init_db()
-
-    def tearDown(self):
-        if os.path.exists(DB_PATH): os.remove(DB_PATH)
-
+class AdminCustomerSyncIntegrationTest(AppTestCase):
     def test_IT_SYNC_01_admin_confirms_reservation(self):
         """TC IT_SYNC_01: Admin xác nhận, khách hàng thấy trạng thái 'confirmed'."""
         # 1. Customer 'cuong' đặt bàn -> res_id=1, status=pending
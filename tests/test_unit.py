@@ -1,13 +1,28 @@
 import unittest
 from unittest.mock import MagicMock, patch
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, date
 import sys
 import os
+import csv
+import gzip
+import json
+import pstats
+import shutil
+import sqlite3
+import subprocess
+import tempfile
+import threading
+import time
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 # các hàm và đối tượng cần thiết
-from restaurant_app.app import app, is_reservation_date_valid, is_reservation_time_valid, find_available_table
+from restaurant_app.app import app, create_app, is_reservation_date_valid, is_reservation_time_valid, find_available_table, \
+    get_dashboard_snapshot
+from restaurant_app.init_database import init_db
+from restaurant_app import export_users, seed_data, stats, analytics, audit, sweeper, archive, retention, purge, layout, assignment, waitlist, metrics, sqltrace, profiling, loadtest, benchmark, pool, assets, availability, outbox
+from restaurant_app.init_database import upgrade_history_timestamps, ensure_schema, SCHEMA_VERSION
+from tests.fixtures import clone_database, memory_database, StubSMTPServer
 
 
 class TestDateTimeValidation(unittest.TestCase):
@@ -177,5 +192,1531 @@ class TestReservationStatusUpdate(unittest.TestCase):
         self.assertEqual(response.status_code, 302)  # 302 là mã cho redirect
 
 
+class TestTableExport(unittest.TestCase):
+    """
+    Kiểm tra công cụ xuất dữ liệu theo luồng (export_users.py)
+    Tương ứng với các TC ID: UT_EX_01 đến UT_EX_06
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.mkdtemp()
+        cls.db_path = clone_database(cls.tmpdir, 'export.db')
+        db = sqlite3.connect(cls.db_path)
+        db.executemany(
+            "INSERT INTO Reservations (customer_id, restaurant_id, table_id, reservation_date, reservation_time, guests, status) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(1, 1, None, f"2025-10-{day:02d}", "19:00", 2, 'confirmed' if day % 2 else 'pending') for day in range(1, 31)])
+        db.commit()
+        db.close()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmpdir)
+
+    def setUp(self):
+        self.db = sqlite3.connect(self.db_path)
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_UT_EX_01_csv_export_with_date_range(self):
+        """TC UT_EX_01: Xuất CSV theo khoảng ngày (tính cả hai đầu)"""
+        out = os.path.join(self.tmpdir, 'res.csv')
+        count = export_users.export_table(self.db, 'Reservations', out, date_from='2025-10-05', date_to='2025-10-09')
+        self.assertEqual(count, 5)
+        with open(out, newline='') as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual([r['reservation_date'] for r in rows][0], '2025-10-05')
+        self.assertEqual([r['reservation_date'] for r in rows][-1], '2025-10-09')
+
+    def test_UT_EX_02_gzip_jsonl_with_filter(self):
+        """TC UT_EX_02: Xuất JSONL nén gzip kèm bộ lọc trạng thái"""
+        out = os.path.join(self.tmpdir, 'res.jsonl.gz')
+        count = export_users.export_table(self.db, 'Reservations', out, fmt='jsonl',
+                                          filters={'status': 'confirmed'}, chunk_size=4)
+        self.assertEqual(count, 15)
+        with gzip.open(out, 'rt') as f:
+            rows = [json.loads(line) for line in f]
+        self.assertEqual(len(rows), 15)
+        self.assertTrue(all(r['status'] == 'confirmed' for r in rows))
+
+    def test_UT_EX_03_customers_export_hides_password_hash(self):
+        """TC UT_EX_03: Không bao giờ xuất cột password_hash"""
+        sql, params, columns = export_users.build_export_query(self.db, 'Customers')
+        self.assertNotIn('password_hash', columns)
+        self.assertIn('username', columns)
+
+    def test_UT_EX_04_rejects_unknown_table_or_column(self):
+        """TC UT_EX_04: Từ chối bảng hoặc cột không hợp lệ"""
+        with self.assertRaises(ValueError):
+            export_users.build_export_query(self.db, 'Admins')
+        with self.assertRaises(ValueError):
+            export_users.build_export_query(self.db, 'Reservations', filters={'1=1; --': 'x'})
+
+    def test_UT_EX_05_reads_in_chunks(self):
+        """TC UT_EX_05: Đọc con trỏ bằng fetchmany theo từng khối"""
+        cur = MagicMock()
+        cur.fetchmany.side_effect = [[(1,), (2,)], [(3,)], []]
+        self.assertEqual(list(export_users.iter_rows(cur, chunk_size=2)), [(1,), (2,), (3,)])
+        cur.fetchmany.assert_called_with(2)
+
+    def test_UT_EX_06_cli_rejects_bad_or_hidden_filters(self):
+        """TC UT_EX_06: --filter/--from/--to sai dạng báo lỗi argparse (không traceback), không lọc được theo password_hash"""
+        with patch('sys.stderr'), self.assertRaises(SystemExit) as raised:
+            export_users.main(['Reservations', '--db', self.db_path, '--filter', 'status'])
+        self.assertEqual(raised.exception.code, 2)
+        with self.assertRaises(ValueError):
+            export_users.build_export_query(self.db, 'Customers', filters={'password_hash': 'x'})
+        out = os.path.join(self.tmpdir, 'customers.csv')
+        with patch('sys.stderr'):
+            self.assertEqual(export_users.main(['Customers', '--db', self.db_path, '-o', out,
+                                                '--filter', 'password_hash=x']), 1)
+        for bad_date in (['--to', '2025-13-01'], ['--from', '10/05/2025']):
+            with patch('sys.stderr'), self.assertRaises(SystemExit) as raised:
+                export_users.main(['Reservations', '--db', self.db_path, '-o', out, *bad_date])
+            self.assertEqual(raised.exception.code, 2)
+
+
+class TestSyntheticSeed(unittest.TestCase):
+    """
+    Kiểm tra bộ sinh dữ liệu giả lập (seed_data.py)
+    Tương ứng với các TC ID: UT_SD_01 đến UT_SD_05
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _generate(self, name, seed):
+        path = os.path.join(self.tmpdir, name)
+        seed_data.generate(path, restaurants=3, tables_per_restaurant=5, customers=20,
+                           reservations_per_day=10, days=4, seed=seed, start='2025-10-01', log=None)
+        db = sqlite3.connect(path)
+        rows = db.execute("SELECT * FROM Reservations ORDER BY reservation_id").fetchall()
+        db.close()
+        return rows
+
+    def test_UT_SD_01_same_seed_same_data(self):
+        """TC UT_SD_01: Cùng seed cho ra cùng dữ liệu"""
+        self.assertEqual(self._generate('a.db', 7), self._generate('b.db', 7))
+        self.assertNotEqual(self._generate('c.db', 7), self._generate('d.db', 8))
+
+    def test_UT_SD_04_output_independent_of_run_date(self):
+        """TC UT_SD_04: Cùng seed và --start cho cùng dữ liệu (trạng thái, lịch sử) dù chạy vào ngày khác"""
+        def snapshot(name, run_day):
+            with patch.object(seed_data, 'date', wraps=date) as fake_date:
+                fake_date.today.return_value = run_day
+                fake_date.fromisoformat = date.fromisoformat
+                rows = self._generate(name, 5)
+            db = sqlite3.connect(os.path.join(self.tmpdir, name))
+            history = db.execute("SELECT reservation_id, action, action_time FROM ReservationHistory ORDER BY 1").fetchall()
+            db.close()
+            return rows, history
+
+        first = snapshot('a.db', date(2025, 9, 1))
+        self.assertEqual(first, snapshot('b.db', date(2026, 3, 1)))
+        statuses = {row[7] for row in first[0]}
+        # start 2025-10-01, 4 ngày: 2 ngày đầu đã qua, 2 ngày sau sắp tới
+        self.assertTrue(statuses & {'completed', 'rejected'} and statuses & {'pending', 'confirmed'})
+
+    def test_UT_SD_02_no_double_booked_tables(self):
+        """TC UT_SD_02: Không có bàn nào bị đặt chồng trong cửa sổ 2 tiếng"""
+        rows = self._generate('a.db', 3)
+        seen = {}
+        for r in rows:
+            start = int(r[5][:2]) * 60 + int(r[5][3:])
+            for other in seen.get((r[3], r[4]), []):
+                self.assertGreaterEqual(abs(start - other), 120)
+            seen.setdefault((r[3], r[4]), []).append(start)
+
+    def test_UT_SD_03_dinner_peak_outweighs_afternoon(self):
+        """TC UT_SD_03: Phân bố theo giờ có đỉnh trưa và tối"""
+        self.assertGreater(seed_data.time_of_day_weight(19.25), seed_data.time_of_day_weight(12.5))
+        self.assertGreater(seed_data.time_of_day_weight(12.5), seed_data.time_of_day_weight(16))
+
+    def test_UT_SD_05_cli_rejects_bad_dates(self):
+        """TC UT_SD_05: --start/--today sai dạng báo lỗi argparse (không traceback), không tạo CSDL"""
+        path = os.path.join(self.tmpdir, 'bad.db')
+        for bad_date in (['--start', '2025-02-30'], ['--today', 'yesterday']):
+            with patch('sys.stderr'), self.assertRaises(SystemExit) as raised:
+                seed_data.main(['--db', path, *bad_date])
+            self.assertEqual(raised.exception.code, 2)
+        self.assertFalse(os.path.exists(path))
+
+
+class TestDashboardStatsTables(unittest.TestCase):
+    """
+    Kiểm tra các bảng thống kê được trigger duy trì (stats.py)
+    Tương ứng với các TC ID: UT_STAT_01 đến UT_STAT_03
+    """
+
+    def setUp(self):
+        self.db = memory_database()
+        self.db.execute("PRAGMA foreign_keys = ON")
+
+    def tearDown(self):
+        self.db.close()
+
+    def _book(self, rid):
+        self.db.execute("INSERT INTO Reservations (customer_id, restaurant_id, reservation_date, reservation_time, guests) VALUES (1, ?, '2030-01-01', '19:00', 2)", (rid,))
+
+    def test_UT_STAT_01_counters_follow_writes(self):
+        """TC UT_STAT_01: Bộ đếm thay đổi cùng giao dịch ghi"""
+        self._book(2)
+        self._book(2)
+        self._book(3)
+        self.db.execute("INSERT INTO Customers (username, password_hash, email) VALUES ('newbie', 'x', 'n@example.com')")
+        result = stats.get_dashboard_stats(self.db)
+        self.assertEqual(result['new_bookings_today'], 3)
+        self.assertEqual(result['total_customers'], 3)
+        self.assertEqual(result['total_restaurants'], 8)
+        self.assertEqual(tuple(result['top_restaurants'][0]), ('Sushi World', 2))
+        self.assertEqual(stats.check_stats(self.db), [])
+
+    def test_UT_STAT_02_cascade_delete_keeps_counts_consistent(self):
+        """TC UT_STAT_02: Xóa nhà hàng (cascade) vẫn giữ số liệu đúng"""
+        self._book(1)
+        self._book(2)
+        self.db.execute("DELETE FROM Restaurants WHERE restaurant_id = 1")
+        result = stats.get_dashboard_stats(self.db)
+        self.assertEqual(result['new_bookings_today'], 1)
+        self.assertEqual(result['total_restaurants'], 7)
+        self.assertEqual(stats.check_stats(self.db), [])
+
+    def test_UT_STAT_03_rebuild_repairs_drift(self):
+        """TC UT_STAT_03: Lệnh rebuild sửa số liệu bị lệch"""
+        self._book(1)
+        self.db.execute("UPDATE StatCounters SET value = 999 WHERE name = 'customers'")
+        self.db.execute("UPDATE RestaurantBookingCounts SET booking_count = 0")
+        self.assertEqual(len(stats.check_stats(self.db)), 2)
+        stats.rebuild_stats(self.db)
+        self.assertEqual(stats.check_stats(self.db), [])
+        self.assertEqual(stats.get_counter(self.db, 'customers'), 2)
+
+
+class TestDashboardSnapshot(unittest.TestCase):
+    """
+    Kiểm tra bản chụp dashboard stale-while-revalidate (stats.DashboardSnapshot)
+    Tương ứng với các TC ID: UT_SNAP_01 đến UT_SNAP_03
+    """
+
+    def setUp(self):
+        self.calls = 0
+        self.release = threading.Event()
+        self.release.set()
+
+        def loader():
+            self.calls += 1
+            self.release.wait(5)
+            return {'total_customers': self.calls}
+
+        self.snapshot = stats.DashboardSnapshot(loader, max_age=60)
+
+    def tearDown(self):
+        self.release.set()
+        self.snapshot.worker.stop(timeout=5)
+
+    def test_UT_SNAP_01_first_call_loads_then_serves_cached(self):
+        """TC UT_SNAP_01: Lần đầu tính trực tiếp, các lần sau dùng bản chụp"""
+        first = self.snapshot.get()
+        second = self.snapshot.get()
+        self.assertEqual(first['total_customers'], 1)
+        self.assertEqual(second['total_customers'], 1)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(second['snapshot_age'], 0)
+
+    def test_UT_SNAP_02_stale_snapshot_served_while_refreshing(self):
+        """TC UT_SNAP_02: Bản chụp cũ vẫn được trả ngay khi luồng nền đang làm mới"""
+        self.snapshot.get()
+        stats_dict, taken_at = self.snapshot._snapshot
+        self.snapshot._snapshot = (stats_dict, taken_at - 120)
+        self.release.clear()  # làm mới sẽ bị treo cho tới khi được thả
+
+        started = time.monotonic()
+        stale = self.snapshot.get()
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(stale['total_customers'], 1)
+        self.assertGreaterEqual(stale['snapshot_age'], 120)
+
+        self.release.set()
+        for _ in range(50):
+            if self.snapshot.get()['total_customers'] == 2:
+                break
+            time.sleep(0.05)
+        self.assertEqual(self.snapshot.get()['total_customers'], 2)
+
+    def test_UT_SNAP_03_concurrent_refresh_is_skipped(self):
+        """TC UT_SNAP_03: Không chạy hai lần làm mới cùng lúc"""
+        self.release.clear()
+        worker = threading.Thread(target=self.snapshot.refresh)
+        worker.start()
+        time.sleep(0.05)
+        self.assertFalse(self.snapshot.refresh())
+        self.release.set()
+        worker.join(5)
+        self.assertEqual(self.calls, 1)
+
+
+class TestBookingRollups(unittest.TestCase):
+    """
+    Kiểm tra rollup theo giờ/ngày được cộng dồn tăng dần (analytics.py)
+    Tương ứng với các TC ID: UT_AN_01 đến UT_AN_04
+    """
+
+    def setUp(self):
+        self.db = memory_database()
+        self.db.row_factory = sqlite3.Row
+
+    def tearDown(self):
+        self.db.close()
+
+    def _book(self, time_str, guests=2, table_id=4):
+        cur = self.db.execute("INSERT INTO Reservations (customer_id, restaurant_id, table_id, reservation_date, reservation_time, guests) VALUES (1, 1, ?, '2030-01-01', ?, ?)",
+                              (table_id, time_str, guests))
+        self.db.commit()
+        return cur.lastrowid
+
+    def _cancel(self, res_id):
+        self.db.execute("INSERT INTO ReservationHistory (reservation_id, action, action_by_customer, note) VALUES (?, 'cancelled', 1, 'x')", (res_id,))
+        self.db.commit()
+
+    def test_UT_AN_01_incremental_refresh_uses_watermark(self):
+        """TC UT_AN_01: Mỗi lần refresh chỉ cộng các dòng mới sau watermark"""
+        self._book('19:00')
+        self._book('19:30', guests=4)
+        self.assertEqual(analytics.refresh_rollups(self.db), 2)
+        self._book('12:00')
+        self.assertEqual(analytics.refresh_rollups(self.db), 1)
+        self.assertEqual(analytics.refresh_rollups(self.db), 0)
+
+        hourly = analytics.booking_report(self.db, '2030-01-01', '2030-01-01', granularity='hour')
+        self.assertEqual([(r['bucket_hour'], r['bookings'], r['guests']) for r in hourly],
+                         [('12:00', 1, 2), ('19:00', 2, 6)])
+        daily = analytics.booking_report(self.db, '2030-01-01', '2030-01-01')
+        self.assertEqual(daily[0]['bookings'], 3)
+
+    def test_UT_AN_02_cancellation_rate_and_occupancy(self):
+        """TC UT_AN_02: Tỉ lệ hủy và tỉ lệ lấp đầy bàn lấy từ lịch sử"""
+        first = self._book('19:00')
+        self._book('12:00')
+        self._cancel(first)
+        analytics.refresh_rollups(self.db)
+
+        daily = analytics.booking_report(self.db, '2030-01-01', '2030-01-01', restaurant_id=1)
+        self.assertEqual(daily[0]['cancellations'], 1)
+        self.assertAlmostEqual(daily[0]['cancellation_rate'], 0.5)
+
+        occupancy = {t['table_id']: t for t in analytics.occupancy_report(self.db, 1, '2030-01-01', '2030-01-01')}
+        # Pizza Palace mở 11:00-22:00 = 660 phút; còn lại một lượt đặt 120 phút trên bàn 4
+        self.assertEqual(occupancy[4]['booked_minutes'], 120)
+        self.assertAlmostEqual(occupancy[4]['occupancy_rate'], 120 / 660)
+
+    def test_UT_AN_03_bounded_refresh(self):
+        """TC UT_AN_03: max_rows giới hạn lượng dữ liệu xử lý mỗi lần"""
+        for _ in range(5):
+            self._book('19:00')
+        self.assertEqual(analytics.refresh_rollups(self.db, batch_size=2, max_rows=3), 3)
+        self.assertEqual(analytics.pending_rows(self.db), 2)
+        analytics.refresh_rollups(self.db, batch_size=2)
+        self.assertEqual(analytics.pending_rows(self.db), 0)
+        self.assertEqual(analytics.booking_report(self.db, '2030-01-01', '2030-01-01')[0]['bookings'], 5)
+
+    def _modify(self, res_id, date_str, time_str, table_ids):
+        self.db.execute("UPDATE Reservations SET reservation_date = ?, reservation_time = ?, table_id = ? WHERE reservation_id = ?",
+                        (date_str, time_str, table_ids[0], res_id))
+        self.db.execute("DELETE FROM ReservationTables WHERE reservation_id = ?", (res_id,))
+        self.db.executemany("INSERT INTO ReservationTables (reservation_id, table_id) VALUES (?, ?)",
+                            [(res_id, t) for t in table_ids])
+        self.db.execute("INSERT INTO ReservationHistory (reservation_id, action, action_by_customer, note) VALUES (?, 'modified', 1, 'x')", (res_id,))
+        self.db.commit()
+
+    def _daily(self, day):
+        return [(r['bookings'], r['cancellations']) for r in analytics.booking_report(self.db, day, day)]
+
+    def _minutes(self, day):
+        return {t['table_id']: (t['bookings'], t['booked_minutes'])
+                for t in analytics.occupancy_report(self.db, 1, day, day) if t['bookings']}
+
+    def test_UT_AN_04_modified_booking_moves_between_buckets(self):
+        """TC UT_AN_04: Sửa lượt đặt sau khi đã cộng thì chuyển sang ô/bàn mới; hủy sau đó trừ đúng ô mới"""
+        res_id = self._book('19:00')
+        analytics.refresh_rollups(self.db)
+        self.assertEqual(self._minutes('2030-01-01'), {4: (1, 120)})
+
+        # Dời sang ngày khác và ghép hai bàn (ReservationTables)
+        self._modify(res_id, '2030-01-02', '12:00', [5, 6])
+        analytics.refresh_rollups(self.db)
+        self.assertEqual(self._daily('2030-01-01'), [(0, 0)])
+        self.assertEqual(self._minutes('2030-01-01'), {})
+        self.assertEqual(self._daily('2030-01-02'), [(1, 0)])
+        self.assertEqual(self._minutes('2030-01-02'), {5: (1, 120), 6: (1, 120)})
+
+        self.db.execute("UPDATE Reservations SET status = 'cancelled' WHERE reservation_id = ?", (res_id,))
+        self._cancel(res_id)
+        analytics.refresh_rollups(self.db)
+        self.assertEqual(self._daily('2030-01-01'), [(0, 0)])
+        self.assertEqual(self._daily('2030-01-02'), [(1, 1)])
+        self.assertEqual(self._minutes('2030-01-02'), {5: (1, 0), 6: (1, 0)})
+        hourly = analytics.booking_report(self.db, '2030-01-01', '2030-01-02', granularity='hour')
+        self.assertTrue(all(r['bookings'] >= 0 and r['cancellations'] >= 0 for r in hourly))
+
+        # Sửa rồi hủy trước cùng một lần refresh cho kết quả như trên
+        second = self._book('19:00')
+        analytics.refresh_rollups(self.db)
+        self._modify(second, '2030-01-03', '20:00', [4])
+        self._cancel(second)
+        analytics.refresh_rollups(self.db)
+        self.assertEqual(self._daily('2030-01-01'), [(0, 0)])
+        self.assertEqual(self._daily('2030-01-03'), [(1, 1)])
+        self.assertEqual(self._minutes('2030-01-03'), {4: (1, 0)})
+
+
+class TestAuditWriter(unittest.TestCase):
+    """
+    Kiểm tra bộ ghi lịch sử bất đồng bộ theo lô (audit.AuditWriter)
+    Tương ứng với các TC ID: UT_AU_01 đến UT_AU_03
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.mkdtemp()
+        cls.template_path = clone_database(cls.tmpdir, 'template.db')
+        db = sqlite3.connect(cls.template_path)
+        db.executemany("INSERT INTO Reservations (customer_id, restaurant_id, reservation_date, reservation_time, guests) VALUES (1, 1, '2030-01-01', ?, 2)",
+                       [('12:00',), ('19:00',)])
+        db.commit()
+        db.close()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmpdir)
+
+    def setUp(self):
+        self.db_path = os.path.join(self.tmpdir, 'audit.db')
+        shutil.copy(self.template_path, self.db_path)
+        self.writer = audit.AuditWriter(self.db_path, flush_interval=60, batch_size=3)
+
+    def tearDown(self):
+        self.writer.drain()
+
+    def _history_count(self):
+        db = sqlite3.connect(self.db_path)
+        count = db.execute("SELECT COUNT(*) FROM ReservationHistory").fetchone()[0]
+        db.close()
+        return count
+
+    def test_UT_AU_01_events_are_queued_until_flush(self):
+        """TC UT_AU_01: Sự kiện nằm trong hàng đợi cho tới khi được ghi theo lô"""
+        for i in range(7):
+            self.writer.submit(audit.history_event(1, 'modified', f'change {i}', customer_id=1))
+        self.assertEqual(self.writer.pending, 7)
+        self.assertEqual(self._history_count(), 0)
+        self.assertEqual(self.writer.flush(), 7)
+        self.assertEqual(self._history_count(), 7)
+
+    def test_UT_AU_02_drain_writes_everything_on_shutdown(self):
+        """TC UT_AU_02: drain() ghi nốt mọi sự kiện khi tắt ứng dụng"""
+        self.writer.submit(audit.history_event(2, 'cancelled', 'bye', customer_id=1))
+        self.writer.drain()
+        self.assertEqual(self.writer.pending, 0)
+        self.assertEqual(self._history_count(), 1)
+
+    def test_UT_AU_03_missing_reservation_does_not_drop_batch(self):
+        """TC UT_AU_03: Một sự kiện lỗi khóa ngoại không làm mất cả lô"""
+        self.writer.submit(audit.history_event(1, 'modified', 'ok', customer_id=1))
+        self.writer.submit(audit.history_event(999, 'modified', 'gone', customer_id=1))
+        self.writer.submit(audit.history_event(2, 'modified', 'ok', customer_id=1))
+        self.assertEqual(self.writer.flush(), 2)
+        self.assertEqual(self.writer.dropped, 1)
+        self.assertEqual(self._history_count(), 2)
+
+
+class TestReservationSweeper(unittest.TestCase):
+    """
+    Kiểm tra sweeper hoàn tất/hết hạn các lượt đặt đã qua ngày (sweeper.py)
+    Tương ứng với các TC ID: UT_SW_01 đến UT_SW_03
+    """
+
+    def setUp(self):
+        self.db = memory_database()
+        # 5 lượt confirmed + 5 lượt pending trong quá khứ, 2 lượt trong tương lai
+        rows = [(f"2025-10-{day:02d}", 'confirmed' if day % 2 else 'pending') for day in range(1, 11)]
+        rows += [("2025-10-25", 'confirmed'), ("2025-10-26", 'pending')]
+        self.db.executemany("INSERT INTO Reservations (customer_id, restaurant_id, reservation_date, reservation_time, guests, status) VALUES (1, 1, ?, '19:00', 2, ?)", rows)
+        self.db.commit()
+        self.today = date(2025, 10, 20)
+
+    def tearDown(self):
+        self.db.close()
+
+    def _statuses(self):
+        return dict(self.db.execute("SELECT reservation_date, status FROM Reservations"))
+
+    def test_UT_SW_01_completes_confirmed_and_expires_pending(self):
+        """TC UT_SW_01: confirmed -> completed, pending -> rejected, tương lai giữ nguyên"""
+        self.assertEqual(sweeper.sweep(self.db, today=self.today), 10)
+        statuses = self._statuses()
+        self.assertEqual(statuses['2025-10-01'], 'completed')
+        self.assertEqual(statuses['2025-10-02'], 'rejected')
+        self.assertEqual(statuses['2025-10-25'], 'confirmed')
+        self.assertEqual(statuses['2025-10-26'], 'pending')
+        actions = dict(self.db.execute("SELECT action, COUNT(*) FROM ReservationHistory GROUP BY action"))
+        self.assertEqual(actions, {'status:completed': 5, 'expired': 5})
+
+    def test_UT_SW_02_small_batches_and_watermark(self):
+        """TC UT_SW_02: Quét theo lô nhỏ và lưu watermark để lần sau không quét lại"""
+        self.assertEqual(sweeper.sweep(self.db, today=self.today, batch_size=3, max_batches=2), 6)
+        self.assertEqual(analytics.get_watermark(self.db, sweeper.WATERMARK), date(2025, 10, 6).toordinal())
+        self.assertEqual(sweeper.sweep(self.db, today=self.today, batch_size=3), 4)
+        self.assertEqual(analytics.get_watermark(self.db, sweeper.WATERMARK), self.today.toordinal())
+
+    def test_UT_SW_03_watermark_skips_already_swept_dates(self):
+        """TC UT_SW_03: Dòng cũ hơn watermark chỉ được quét lại khi dùng full=True"""
+        sweeper.sweep(self.db, today=self.today)
+        self.db.execute("UPDATE Reservations SET status = 'confirmed' WHERE reservation_date = '2025-10-01'")
+        self.db.commit()
+        self.assertEqual(sweeper.sweep(self.db, today=self.today), 0)
+        self.assertEqual(sweeper.sweep(self.db, today=self.today, full=True), 1)
+
+
+class TestReservationArchive(unittest.TestCase):
+    """
+    Kiểm tra việc chuyển lượt đặt cũ sang bảng lưu trữ (archive.py)
+    Tương ứng với các TC ID: UT_AR_01 đến UT_AR_03
+    """
+
+    def setUp(self):
+        self.db = memory_database()
+        self.db.execute("PRAGMA foreign_keys = ON;")
+        # 6 lượt đặt cũ (4 đã kết thúc, 2 vẫn pending/confirmed) và 1 lượt gần đây, mỗi lượt 1 dòng lịch sử
+        rows = [("2024-01-0%d" % day, status) for day, status in
+                enumerate(('completed', 'cancelled', 'rejected', 'completed', 'pending', 'confirmed'), start=1)]
+        rows.append(("2025-10-01", 'completed'))
+        for res_date, status in rows:
+            cur = self.db.execute("INSERT INTO Reservations (customer_id, restaurant_id, reservation_date, reservation_time, guests, status) VALUES (1, 1, ?, '19:00', 2, ?)", (res_date, status))
+            self.db.execute("INSERT INTO ReservationHistory (reservation_id, action, note) VALUES (?, 'created', 'test')", (cur.lastrowid,))
+        self.db.commit()
+        self.today = date(2025, 10, 20)
+
+    def tearDown(self):
+        self.db.close()
+
+    def _count(self, table):
+        return self.db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def test_UT_AR_01_moves_old_finished_reservations_with_history(self):
+        """TC UT_AR_01: Chỉ lượt đặt đã kết thúc và quá hạn được chuyển, kèm lịch sử của nó"""
+        live_before = self._count("Reservations")
+        self.assertEqual(archive.archive_reservations(self.db, days=365, today=self.today), 4)
+        self.assertEqual(self._count("Reservations"), live_before - 4)
+        self.assertEqual(self._count("ArchivedReservations"), 4)
+        self.assertEqual(self._count("ArchivedReservationHistory"), 4)
+        statuses = {row[0] for row in self.db.execute("SELECT status FROM ArchivedReservations")}
+        self.assertEqual(statuses, {'completed', 'cancelled', 'rejected'})
+        archived_history = self.db.execute("""
+            SELECT COUNT(*) FROM ReservationHistory h
+            JOIN ArchivedReservations a ON a.reservation_id = h.reservation_id
+        """).fetchone()[0]
+        self.assertEqual(archived_history, 0)
+
+    def test_UT_AR_02_chunks_and_stats_unchanged(self):
+        """TC UT_AR_02: Chuyển theo khối; bảng thống kê dashboard không bị trừ đi"""
+        booking_count = self.db.execute("SELECT booking_count FROM RestaurantBookingCounts WHERE restaurant_id = 1").fetchone()[0]
+        self.assertEqual(archive.archive_reservations(self.db, days=365, today=self.today, chunk_size=3, max_chunks=1), 3)
+        self.assertEqual(archive.archive_reservations(self.db, days=365, today=self.today, chunk_size=3), 1)
+        self.assertEqual(self.db.execute("SELECT booking_count FROM RestaurantBookingCounts WHERE restaurant_id = 1").fetchone()[0], booking_count)
+        self.assertEqual(stats.check_stats(self.db), [])
+
+    def test_UT_AR_03_archived_rows_readable_on_request(self):
+        """TC UT_AR_03: Lượt đặt đã lưu trữ chỉ xuất hiện khi yêu cầu include_archived"""
+        archive.archive_reservations(self.db, days=365, today=self.today)
+        live = self.db.execute(f"SELECT COUNT(*), SUM(archived) FROM {archive.reservations_source()} r").fetchone()
+        both = self.db.execute(f"SELECT COUNT(*), SUM(archived) FROM {archive.reservations_source(True)} r").fetchone()
+        self.assertEqual(live, (self._count("Reservations"), 0))
+        self.assertEqual(both, (self._count("Reservations") + 4, 4))
+
+
+class TestHistoryRetention(unittest.TestCase):
+    """
+    Kiểm tra gộp/xóa ReservationHistory và thu hồi dung lượng (retention.py)
+    Tương ứng với các TC ID: UT_RT_01 đến UT_RT_04
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmpdir)
+
+    def setUp(self):
+        self.path = clone_database(self.tmpdir, 'retention.db')
+        self.db = sqlite3.connect(self.path)
+        self.db.execute("PRAGMA foreign_keys = ON;")
+        self.res_id = self.db.execute("INSERT INTO Reservations (customer_id, restaurant_id, reservation_date, reservation_time, guests, status) VALUES (1, 1, '2024-03-01', '19:00', 2, 'completed')").lastrowid
+        self.db.executemany("INSERT INTO ReservationHistory (reservation_id, action, action_time, note) VALUES (?, ?, ?, 'x')", [
+            (self.res_id, 'modified', '2024-02-20 10:00:00'),
+            (self.res_id, 'status:confirmed', '2024-02-21 09:00:00'),
+            (self.res_id, 'status:rejected', '2024-02-22 09:00:00'),
+            (self.res_id, 'status:completed', '2024-03-01 22:00:00'),
+        ])
+        self.db.commit()
+        self.today = date(2025, 10, 20)
+
+    def tearDown(self):
+        self.db.close()
+
+    def _actions(self):
+        return [row[0] for row in self.db.execute(
+            "SELECT action FROM ReservationHistory WHERE reservation_id = ? ORDER BY action_time, history_id", (self.res_id,))]
+
+    def test_UT_RT_01_collapses_superseded_status_rows(self):
+        """TC UT_RT_01: Các lần đổi trạng thái bị ghi đè được gộp thành một dòng summary, giữ dòng mới nhất"""
+        self.assertEqual(retention.compact_history(self.db, today=self.today), 1)
+        self.assertEqual(self._actions(), ['modified', 'status:summary', 'status:completed'])
+        note = self.db.execute("SELECT note FROM ReservationHistory WHERE action = 'status:summary'").fetchone()[0]
+        self.assertEqual(note, "2024-02-21 09:00:00 confirmed; 2024-02-22 09:00:00 rejected")
+        # Chạy lại không gộp thêm gì
+        self.assertEqual(retention.compact_history(self.db, today=self.today), 0)
+
+    def test_UT_RT_02_per_action_retention(self):
+        """TC UT_RT_02: Mỗi hành động có thời hạn riêng; None = giữ mãi"""
+        policy = {'modified': 30, 'status:summary': None, 'status:*': None}
+        deleted = retention.prune_history(self.db, policy, today=self.today)
+        self.assertEqual(deleted, {'modified': 1})
+        self.assertNotIn('modified', self._actions())
+        deleted = retention.prune_history(self.db, {'status:completed': None, 'status:*': 30}, today=self.today)
+        self.assertEqual(deleted, {'status:*': 2})
+        self.assertEqual(self._actions(), ['status:completed'])
+
+    def test_UT_RT_03_incremental_vacuum_shrinks_file(self):
+        """TC UT_RT_03: CSDL mới dùng auto_vacuum = INCREMENTAL và file nhỏ lại sau khi xóa"""
+        self.assertEqual(self.db.execute("PRAGMA auto_vacuum").fetchone()[0], 2)
+        self.db.executemany("INSERT INTO ReservationHistory (reservation_id, action, action_time, note) VALUES (?, 'modified', '2020-01-01 00:00:00', ?)",
+                            [(self.res_id, 'x' * 500) for _ in range(2000)])
+        self.db.commit()
+        size_before = os.path.getsize(self.path)
+        result = retention.run_retention(self.db, {'modified': 30}, today=self.today)
+        self.assertEqual(result['pruned'], {'modified': 2001})
+        self.assertGreater(result['freed_pages'], 0)
+        self.assertLess(os.path.getsize(self.path), size_before)
+
+    def test_UT_RT_04_upgrades_date_only_action_time(self):
+        """TC UT_RT_04: CSDL cũ (action_time kiểu DATE) được chuyển sang TIMESTAMP, giữ nguyên dữ liệu"""
+        path = os.path.join(self.tmpdir, 'old.db')
+        old = sqlite3.connect(path)
+        old.execute("CREATE TABLE ReservationHistory (history_id INTEGER PRIMARY KEY AUTOINCREMENT, reservation_id INTEGER NOT NULL, action TEXT NOT NULL, action_by_admin INTEGER, action_by_customer INTEGER, action_time DATE DEFAULT (DATE('now')), note TEXT)")
+        old.execute("INSERT INTO ReservationHistory (reservation_id, action, action_time) VALUES (1, 'cancelled', '2025-01-02')")
+        old.commit()
+        upgrade_history_timestamps(old)
+        self.assertEqual(old.execute("SELECT type FROM pragma_table_info('ReservationHistory') WHERE name = 'action_time'").fetchone()[0], 'TIMESTAMP')
+        self.assertEqual(old.execute("SELECT history_id, action_time FROM ReservationHistory").fetchall(), [(1, '2025-01-02 00:00:00')])
+        old.close()
+
+
+class TestChunkedPurge(unittest.TestCase):
+    """
+    Kiểm tra xóa mềm và dọn dữ liệu phụ thuộc theo khối (purge.py)
+    Tương ứng với các TC ID: UT_PG_01 đến UT_PG_03
+    """
+
+    def setUp(self):
+        self.db = memory_database()
+        self.db.execute("PRAGMA foreign_keys = ON;")
+        # 10 lượt đặt ở nhà hàng 1 (mỗi lượt 1 dòng lịch sử), 2 lượt ở nhà hàng 2
+        for i in range(12):
+            rid = 1 if i < 10 else 2
+            cur = self.db.execute("INSERT INTO Reservations (customer_id, restaurant_id, reservation_date, reservation_time, guests) VALUES (1, ?, '2030-01-01', '19:00', 2)", (rid,))
+            self.db.execute("INSERT INTO ReservationHistory (reservation_id, action) VALUES (?, 'created')", (cur.lastrowid,))
+        self.db.commit()
+        self.tables = self._count("Tables WHERE restaurant_id = 1")
+
+    def tearDown(self):
+        self.db.close()
+
+    def _count(self, table_and_where):
+        return self.db.execute(f"SELECT COUNT(*) FROM {table_and_where}").fetchone()[0]
+
+    def test_UT_PG_01_soft_delete_hides_and_counts_dependents(self):
+        """TC UT_PG_01: Xóa mềm đánh dấu deleted_at, ghi tổng số dòng cần dọn, chưa xóa gì"""
+        restaurants = stats.get_counter(self.db, 'restaurants')
+        deletion_id = purge.schedule_deletion(self.db, 'restaurant', 1, admin_id=1)
+        self.db.commit()
+        self.assertIsNotNone(self.db.execute("SELECT deleted_at FROM Restaurants WHERE restaurant_id = 1").fetchone()[0])
+        total = self.db.execute("SELECT total FROM PendingDeletions WHERE deletion_id = ?", (deletion_id,)).fetchone()[0]
+        self.assertEqual(total, 10 + self.tables)
+        self.assertEqual(self._count("Reservations WHERE restaurant_id = 1"), 10)
+        self.assertEqual(stats.get_counter(self.db, 'restaurants'), restaurants - 1)
+        # Xóa lần hai không tạo yêu cầu mới
+        self.assertIsNone(purge.schedule_deletion(self.db, 'restaurant', 1))
+
+    def test_UT_PG_02_purges_in_chunks_with_progress(self):
+        """TC UT_PG_02: Dọn theo khối, tiến độ tăng dần, cuối cùng xóa hẳn nhà hàng"""
+        deletion_id = purge.schedule_deletion(self.db, 'restaurant', 1)
+        self.db.commit()
+        self.assertEqual(purge.purge_pending(self.db, chunk_size=4, max_chunks=1), 4)
+        purged, finished = self.db.execute("SELECT purged, finished_at FROM PendingDeletions WHERE deletion_id = ?", (deletion_id,)).fetchone()
+        self.assertEqual((purged, finished), (4, None))
+        purge.purge_pending(self.db, chunk_size=4)
+        self.assertEqual(self._count("Restaurants WHERE restaurant_id = 1"), 0)
+        self.assertEqual(self._count("Reservations WHERE restaurant_id = 1"), 0)
+        self.assertEqual(self._count("ReservationHistory"), 2)
+        self.assertEqual(self._count("Reservations WHERE restaurant_id = 2"), 2)
+        purged, finished = self.db.execute("SELECT purged, finished_at FROM PendingDeletions WHERE deletion_id = ?", (deletion_id,)).fetchone()
+        self.assertEqual(purged, 10 + self.tables)
+        self.assertIsNotNone(finished)
+        self.assertEqual(stats.check_stats(self.db), [])
+
+    def test_UT_PG_03_customer_purge(self):
+        """TC UT_PG_03: Xóa khách hàng dọn cả lượt đặt đã lưu trữ và giữ số liệu thống kê đúng"""
+        self.db.execute("UPDATE Reservations SET status = 'completed', reservation_date = '2020-01-01' WHERE reservation_id IN (SELECT reservation_id FROM Reservations LIMIT 3)")
+        self.db.commit()
+        archive.archive_reservations(self.db, days=365, today=date(2025, 10, 20))
+        customers = stats.get_counter(self.db, 'customers')
+        purge.schedule_deletion(self.db, 'customer', 1)
+        self.db.commit()
+        self.assertEqual(stats.get_counter(self.db, 'customers'), customers - 1)
+        self.assertEqual(purge.purge_pending(self.db, chunk_size=5), 12)
+        self.assertEqual(self._count("Customers WHERE customer_id = 1"), 0)
+        self.assertEqual(self._count("ArchivedReservations"), 0)
+        self.assertEqual(stats.get_counter(self.db, 'customers'), customers - 1)
+        self.assertEqual(stats.check_stats(self.db), [])
+
+
+
+class TestTableLayout(unittest.TestCase):
+    """
+    Kiểm tra nhập sơ đồ bàn hàng loạt (layout.py)
+    Tương ứng với các TC ID: UT_LY_01 đến UT_LY_03
+    """
+
+    def setUp(self):
+        self.db = memory_database()
+        self.db.execute("PRAGMA foreign_keys = ON;")
+        self.db.execute("DELETE FROM Tables WHERE restaurant_id = 1")
+        self.db.executemany("INSERT INTO Tables (restaurant_id, table_number, capacity) VALUES (1, ?, ?)",
+                            [('T1', 2), ('T2', 4), ('T3', 6)])
+        self.db.commit()
+
+    def tearDown(self):
+        self.db.close()
+
+    def _version(self):
+        return self.db.execute("SELECT layout_version FROM Restaurants WHERE restaurant_id = 1").fetchone()[0]
+
+    def test_UT_LY_01_parse_layout(self):
+        """TC UT_LY_01: Đọc CSV có tiêu đề và dòng trống; báo lỗi kèm số dòng khi sai hoặc trùng"""
+        rows = layout.parse_layout("table_number,capacity\n T1 , 2\n\nPatio 1,8\n")
+        self.assertEqual(rows, [('T1', 2), ('Patio 1', 8)])
+        with self.assertRaisesRegex(ValueError, 'Line 2'):
+            layout.parse_layout("T1,2\nT2,0\n")
+        with self.assertRaisesRegex(ValueError, 'Line 3'):
+            layout.parse_layout("T1,2\nT2,4\nT1,6\n")
+        with self.assertRaisesRegex(ValueError, 'Line 1'):
+            layout.parse_layout("T1;2\n")
+
+    def test_UT_LY_02_diff_layout(self):
+        """TC UT_LY_02: So sánh theo số bàn: thêm, sửa sức chứa, xóa, giữ nguyên"""
+        diff = layout.diff_layout(self.db, 1, [('T1', 2), ('T2', 8), ('T4', 4)])
+        self.assertEqual(diff.insert, [('T4', 4)])
+        self.assertEqual([(u[1], u[2], u[3]) for u in diff.update], [('T2', 4, 8)])
+        self.assertEqual([d[1] for d in diff.delete], ['T3'])
+        self.assertEqual(diff.unchanged, 1)
+        # Lượt đặt sắp tới trên bàn bị xóa được cảnh báo
+        t3 = diff.delete[0][0]
+        self.db.execute("INSERT INTO Reservations (customer_id, restaurant_id, table_id, reservation_date, reservation_time, guests, status) VALUES (1, 1, ?, '2030-01-01', '19:00', 5, 'confirmed')", (t3,))
+        self.assertEqual(layout.affected_reservations(self.db, diff, '2029-12-31'), 1)
+        self.assertEqual(layout.affected_reservations(self.db, diff, '2030-01-02'), 0)
+
+    def test_UT_LY_03_apply_layout_bumps_version_once(self):
+        """TC UT_LY_03: Áp dụng trong một giao dịch, layout_version tăng đúng 1, cache đọc lại đúng 1 lần"""
+        cache = layout.LayoutCache()
+        before = cache.get(self.db, 1, self._version())
+        self.assertEqual(len(before), 3)
+        version = self._version()
+        diff = layout.apply_layout(self.db, 1, [('T1', 2), ('T2', 8)] + [(f'P{i}', 4) for i in range(400)])
+        self.assertEqual((len(diff.insert), len(diff.update), len(diff.delete)), (400, 1, 1))
+        self.assertEqual(self._version(), version + 1)
+        self.assertIs(cache.get(self.db, 1, version), before)
+        tables = cache.get(self.db, 1, self._version())
+        self.assertEqual(len(tables), 402)
+        self.assertIs(cache.get(self.db, 1, self._version()), tables)
+        self.assertEqual((cache.hits, cache.misses), (2, 2))
+        # Áp dụng lại cùng sơ đồ: không có gì đổi, version giữ nguyên
+        layout.apply_layout(self.db, 1, [('T1', 2), ('T2', 8)] + [(f'P{i}', 4) for i in range(400)])
+        self.assertEqual(self._version(), version + 1)
+
+
+
+class TestTableAssignment(unittest.TestCase):
+    """
+    Kiểm tra bộ xếp bàn có ghép bàn (assignment.py)
+    Tương ứng với các TC ID: UT_AS_01 đến UT_AS_03
+    """
+
+    def setUp(self):
+        self.db = memory_database()
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA foreign_keys = ON;")
+        self.db.execute("DELETE FROM Tables WHERE restaurant_id = 1")
+        self.db.executemany("INSERT INTO Tables (table_id, restaurant_id, table_number, capacity, zone) VALUES (?, 1, ?, ?, ?)",
+                            [(101, 'A1', 2, None), (102, 'A2', 2, None), (103, 'A3', 4, None),
+                             (104, 'A4', 8, None), (105, 'B1', 6, 'Terrace')])
+        self.db.commit()
+
+    def tearDown(self):
+        self.db.close()
+
+    def _book(self, guests, status='pending', table_id=None, res_time='19:00'):
+        cur = self.db.execute("INSERT INTO Reservations (customer_id, restaurant_id, table_id, reservation_date, reservation_time, guests, status) VALUES (1, 1, ?, '2030-01-01', ?, ?, ?)",
+                              (table_id, res_time, guests, status))
+        self.db.commit()
+        return cur.lastrowid
+
+    def test_UT_AS_01_best_fit_combines_within_zone(self):
+        """TC UT_AS_01: Bàn đơn vừa nhất khi có; đoàn lớn hơn mọi bàn được ghép trong cùng khu"""
+        schedule = assignment.DaySchedule([(1, 2, None), (2, 2, None), (3, 4, None), (4, 8, None), (5, 6, 'Terrace')])
+        self.assertEqual(schedule.best_fit(3, 19 * 60), (3,))
+        # 12 khách: 8 + 4 cùng sảnh chính, không ghép với bàn ngoài Terrace
+        self.assertEqual(schedule.best_fit(12, 19 * 60), (4, 3))
+        self.assertIsNone(schedule.best_fit(17, 19 * 60))
+        # Quy tắc cũ không xếp được đoàn 12 người
+        self.assertIsNone(schedule.greedy_fit(12, 19 * 60))
+        schedule.book('x', (4, 3), 19 * 60)
+        self.assertFalse(schedule.is_free(4, 20 * 60 + 59))
+        self.assertTrue(schedule.is_free(4, 21 * 60))
+
+    def test_UT_AS_02_assign_and_reoptimize_day(self):
+        """TC UT_AS_02: Lượt ghép bàn chặn mọi bàn liên quan; xếp lại các lượt pending giữ nguyên lượt confirmed"""
+        tables = assignment.assign_tables(self.db, 1, '2030-01-01', '19:00', 12)
+        self.assertEqual(tables, [104, 103])
+        big = self._book(12, table_id=tables[0])
+        assignment.save_assignment(self.db, big, tables)
+        self.db.commit()
+        # find_available_table (quy tắc cũ) cũng coi bàn ghép là đang bận
+        self.assertIsNone(find_available_table(self.db, 1, '2030-01-01', '19:30', 3, selected_table_id=103))
+
+        confirmed = self._book(2, status='confirmed', table_id=101, res_time='18:00')
+        wasteful = self._book(6, table_id=105, res_time='12:00')
+        unseated = self._book(2, res_time='12:00')
+        result = assignment.reoptimize_day(self.db, 1, '2030-01-01')
+        self.assertEqual((result['seated_before'], result['seated_after']), (2, 3))
+        table_of = lambda res_id: self.db.execute("SELECT table_id FROM Reservations WHERE reservation_id = ?", (res_id,)).fetchone()[0]
+        self.assertEqual(table_of(confirmed), 101)
+        self.assertIsNotNone(table_of(unseated))
+        self.assertEqual(table_of(wasteful), 105)
+        combined = self.db.execute("SELECT COUNT(*) FROM ReservationTables WHERE reservation_id = ?", (big,)).fetchone()[0]
+        self.assertEqual(combined, 2)
+        history = self.db.execute("SELECT COUNT(*) FROM ReservationHistory WHERE action = 'reassigned'").fetchone()[0]
+        self.assertEqual(history, result['moved'])
+        # Chạy lại không còn gì để cải thiện
+        self.assertEqual(assignment.reoptimize_day(self.db, 1, '2030-01-01')['moved'], 0)
+
+    def test_UT_AS_03_benchmark_beats_greedy(self):
+        """TC UT_AS_03: Trên luồng yêu cầu mô phỏng, bộ xếp bàn xếp được nhiều khách hơn quy tắc cũ"""
+        results = assignment.run_bench(n_tables=60, seed=1)
+        self.assertGreater(results['engine']['guests'], results['greedy']['guests'])
+        self.assertGreaterEqual(results['engine+reoptimize']['utilization'], results['greedy']['utilization'])
+
+
+
+class TestWaitlist(unittest.TestCase):
+    """
+    Kiểm tra danh sách chờ và ghép cặp khi có bàn trống (waitlist.py)
+    Tương ứng với các TC ID: UT_WL_01 đến UT_WL_03
+    """
+
+    def setUp(self):
+        self.db = memory_database()
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA foreign_keys = ON;")
+        # Nhà hàng 3 chỉ có một bàn H1 (4 chỗ), đã kín lúc 19:00
+        cur = self.db.execute("INSERT INTO Reservations (customer_id, restaurant_id, table_id, reservation_date, reservation_time, guests, status) VALUES (1, 3, 7, '2030-01-01', '19:00', 4, 'confirmed')")
+        self.booked = cur.lastrowid
+        self.db.commit()
+
+    def tearDown(self):
+        self.db.close()
+
+    def _free_table(self):
+        self.db.execute("UPDATE Reservations SET status = 'cancelled' WHERE reservation_id = ?", (self.booked,))
+
+    def test_UT_WL_01_cancellation_books_first_matching_entry(self):
+        """TC UT_WL_01: Bàn vừa trống được đặt cho dòng chờ đầu tiên vừa khung giờ và số khách"""
+        too_big = waitlist.join_waitlist(self.db, 1, 3, '2030-01-01', '19:00', '20:00', 6)
+        other_day = waitlist.join_waitlist(self.db, 1, 3, '2030-01-02', '19:00', '20:00', 2)
+        first = waitlist.join_waitlist(self.db, 1, 3, '2030-01-01', '18:30', '19:30', 2)
+        second = waitlist.join_waitlist(self.db, 1, 3, '2030-01-01', '19:00', '19:00', 2)
+        self.assertEqual(waitlist.join_waitlist(self.db, 1, 3, '2030-01-01', '18:30', '19:30', 2)['waitlist_id'],
+                         first['waitlist_id'])
+        self._free_table()
+        matched = waitlist.match_waitlist(self.db, 3, '2030-01-01', '19:00')
+        self.db.commit()
+        self.assertEqual(matched, [(first['waitlist_id'], 'booked')])
+        status = lambda w: self.db.execute("SELECT status, reservation_id FROM Waitlist WHERE waitlist_id = ?", (w['waitlist_id'],)).fetchone()
+        self.assertEqual([status(w)['status'] for w in (too_big, other_day, second)], ['waiting'] * 3)
+        res = self.db.execute("SELECT * FROM Reservations WHERE reservation_id = ?", (status(first)['reservation_id'],)).fetchone()
+        self.assertEqual((res['table_id'], res['reservation_time'], res['status']), (7, '19:00', 'pending'))
+
+    def test_UT_WL_02_offer_mode(self):
+        """TC UT_WL_02: Chế độ mời: chỉ một khách được mời; nhận lời thì đặt, bàn đã bị lấy thì quay lại chờ"""
+        first = waitlist.join_waitlist(self.db, 1, 3, '2030-01-01', '19:00', '21:00', 2)
+        second = waitlist.join_waitlist(self.db, 2, 3, '2030-01-01', '19:00', '21:00', 2)
+        self._free_table()
+        self.assertEqual(waitlist.match_waitlist(self.db, 3, '2030-01-01', '19:00', mode='offer'),
+                         [(first['waitlist_id'], 'offered')])
+        # Người khác đặt mất bàn trước khi khách nhận lời
+        self.db.execute("INSERT INTO Reservations (customer_id, restaurant_id, table_id, reservation_date, reservation_time, guests, status) VALUES (2, 3, 7, '2030-01-01', '19:30', 2, 'pending')")
+        self.assertIsNone(waitlist.accept_offer(self.db, first['waitlist_id'], 1))
+        self.assertEqual(self.db.execute("SELECT status FROM Waitlist WHERE waitlist_id = ?", (first['waitlist_id'],)).fetchone()[0], 'waiting')
+        self.db.execute("DELETE FROM Reservations WHERE reservation_time = '19:30'")
+        waitlist.match_waitlist(self.db, 3, '2030-01-01', '19:30', mode='offer')
+        self.assertIsNotNone(waitlist.accept_offer(self.db, first['waitlist_id'], 1))
+        self.assertIsNone(waitlist.accept_offer(self.db, second['waitlist_id'], 2))
+
+    def test_UT_WL_03_match_uses_partial_index(self):
+        """TC UT_WL_03: Truy vấn ghép cặp đi qua partial index, không quét cả bảng Waitlist"""
+        plan = " ".join(row[3] for row in self.db.execute(
+            "EXPLAIN QUERY PLAN " + waitlist.MATCH_QUERY, (3, '2030-01-01', '20:59', '17:01', 50)))
+        self.assertIn('idx_waitlist_waiting', plan)
+        self.assertNotIn('SCAN Waitlist', plan)
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_UT_MT_01_histogram_text_format(self):
+        """TC UT_MT_01: Histogram xuất bucket cộng dồn, _sum và _count theo định dạng Prometheus"""
+        registry = metrics.Registry()
+        hist = registry.histogram('req_seconds', 'Latency.', ('endpoint', 'status'), buckets=(0.1, 1.0))
+        hist.observe(0.05, 'home', '200')
+        hist.observe(0.5, 'home', '200')
+        hist.observe(3.0, 'home', '200')
+        hist.observe(0.1, 'say "hi"', '500')
+        registry.counter('stmts_total', 'Statements.', ('endpoint',)).inc('home', amount=7)
+        text = registry.expose()
+        for line in ('# TYPE req_seconds histogram',
+                     'req_seconds_bucket{endpoint="home",status="200",le="0.1"} 1',
+                     'req_seconds_bucket{endpoint="home",status="200",le="1.0"} 2',
+                     'req_seconds_bucket{endpoint="home",status="200",le="+Inf"} 3',
+                     'req_seconds_sum{endpoint="home",status="200"} 3.55',
+                     'req_seconds_count{endpoint="home",status="200"} 3',
+                     'req_seconds_bucket{endpoint="say \\"hi\\"",status="500",le="0.1"} 1',
+                     '# TYPE stmts_total counter',
+                     'stmts_total{endpoint="home"} 7'):
+            self.assertIn(line, text.splitlines())
+
+    def test_UT_MT_02_timed_connection(self):
+        """TC UT_MT_02: TimedConnection đếm câu lệnh, cộng thời gian SQL và tách thời gian BEGIN"""
+        db = sqlite3.connect(':memory:', factory=metrics.TimedConnection)
+        db.row_factory = sqlite3.Row
+        db.execute("CREATE TABLE t (x INTEGER)")
+        db.execute("BEGIN IMMEDIATE")
+        db.executemany("INSERT INTO t VALUES (?)", [(i,) for i in range(100)])
+        db.commit()
+        self.assertEqual([row['x'] for row in db.execute("SELECT x FROM t WHERE x < 3")], [0, 1, 2])
+        self.assertEqual(db.cursor().execute("SELECT COUNT(*) FROM t").fetchone()[0], 100)
+        self.assertEqual(db.sql_statements, 5)
+        self.assertGreater(db.sql_seconds, 0)
+        self.assertGreater(db.lock_wait_seconds, 0)
+        self.assertLess(db.lock_wait_seconds, db.sql_seconds)
+        db.close()
+
+
+class TestSlowQueryLog(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'slow.jsonl')
+        self.db = sqlite3.connect(':memory:', factory=metrics.TimedConnection)
+        self.db.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, name TEXT, day DATE)")
+        self.db.executemany("INSERT INTO t (name, day) VALUES (?, ?)", [(f'n{i}', '2030-01-01') for i in range(50)])
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.tmp)
+
+    def test_UT_SQ_01_normalize_and_param_shape(self):
+        """TC UT_SQ_01: Chuẩn hóa literal/IN-list/khoảng trắng; tham số chỉ ghi kiểu, không ghi giá trị"""
+        self.assertEqual(sqltrace.normalize_sql("""
+            SELECT * FROM t  -- comment
+            WHERE name = 'it''s' AND id IN (?, ?, ?) AND t2.x > 10 LIMIT 5;"""),
+            "SELECT * FROM t WHERE name = ? AND id IN (?) AND t2.x > ? LIMIT ?")
+        self.assertEqual(sqltrace.params_shape((1, 'secret', None)), ['int', 'str', 'NoneType'])
+        self.assertEqual(sqltrace.params_shape({'email': 'a@b.c'}), {'email': 'str'})
+
+    def test_UT_SQ_02_slow_statements_logged_with_plan_once(self):
+        """TC UT_SQ_02: Câu vượt ngưỡng được ghi kèm route; EXPLAIN QUERY PLAN chỉ lần đầu mỗi dạng câu"""
+        self.db.tracer = sqltrace.SlowQueryLog(self.path, threshold_ms=0)
+        self.db.trace_route = 'GET /things'
+        for name in ('n1', 'n2'):
+            self.db.execute("SELECT id FROM t WHERE name = ?", (name,)).fetchone()
+        rows = list(self.db.execute("SELECT * FROM t WHERE id IN (1, 2)"))
+        self.assertEqual(len(rows), 2)
+        self.db.tracer = sqltrace.SlowQueryLog(self.path, threshold_ms=10000)
+        self.db.execute("SELECT COUNT(*) FROM t").fetchone()
+
+        entries = sqltrace.read_entries(self.path)
+        self.assertEqual([e['sql'] for e in entries], ["SELECT * FROM t WHERE id IN (?)",
+                                                       "SELECT id FROM t WHERE name = ?",
+                                                       "SELECT id FROM t WHERE name = ?"])
+        self.assertEqual(entries[-1]['route'], 'GET /things')
+        self.assertEqual(entries[-1]['params'], ['str'])
+        self.assertTrue(any('SCAN t' in step for step in entries[-1]['plan']))
+        self.assertNotIn('plan', entries[1])
+        summary = sqltrace.summarize(entries)
+        by_sql = {item['sql']: item for item in summary}
+        self.assertEqual(by_sql["SELECT id FROM t WHERE name = ?"]['count'], 2)
+        self.assertTrue(by_sql["SELECT id FROM t WHERE name = ?"]['full_scan'])
+        self.assertFalse(by_sql["SELECT * FROM t WHERE id IN (?)"]['full_scan'])
+
+    def test_UT_SQ_03_log_rotates(self):
+        """TC UT_SQ_03: File log xoay vòng khi vượt max_bytes, giữ backup_count file cũ"""
+        log = sqltrace.SlowQueryLog(self.path, threshold_ms=0, max_bytes=300, backup_count=2)
+        for i in range(30):
+            log.write({'ts': '2030-01-01 00:00:00', 'route': None, 'ms': i, 'sql': 'SELECT ?', 'params': []})
+        self.assertTrue(os.path.exists(self.path + '.2'))
+        self.assertFalse(os.path.exists(self.path + '.3'))
+        self.assertLessEqual(os.path.getsize(self.path), 300)
+        self.assertEqual(sqltrace.read_entries(self.path, limit=1)[0]['ms'], 29)
+
+
+def _profiled_leaf(n):
+    total = 0
+    for i in range(n):
+        total += i * i
+    return total
+
+
+def _profiled_root():
+    total = 0
+    for _ in range(5):
+        total += _profiled_leaf(20000)
+    return total
+
+
+class TestRequestProfiler(unittest.TestCase):
+
+    def test_UT_PF_01_call_tree_from_root(self):
+        """TC UT_PF_01: Cây lời gọi bắt đầu từ hàm view, nhánh con lớn được thụt lề bên dưới"""
+        profile = profiling.start_profile()
+        _profiled_root()
+        profile.disable()
+        tree = profiling.call_tree(pstats.Stats(profile), profiling.function_key(_profiled_root))
+        self.assertIn('_profiled_root', tree[0])
+        self.assertIn('100.0%', tree[0])
+        leaf = [line for line in tree if '_profiled_leaf' in line]
+        self.assertEqual(len(leaf), 1)
+        self.assertTrue(leaf[0].startswith('  '))
+        self.assertIn('5x', leaf[0])
+
+    def test_UT_PF_02_finish_saves_pstats(self):
+        """TC UT_PF_02: finish() lưu file .prof đọc được bằng pstats"""
+        tmp = tempfile.mkdtemp()
+        try:
+            profiler = profiling.RequestProfiler(tmp)
+            profile = profiling.start_profile()
+            _profiled_root()
+            with self.assertLogs('restaurant_app.profiling', level='INFO') as logs:
+                path = profiler.finish(profile, 'GET /admin/<x>', 0.0123, profiling.function_key(_profiled_root))
+            self.assertTrue(os.path.basename(path).endswith('-GET_admin_x-12ms.prof'))
+            self.assertIn('_profiled_leaf', logs.output[0])
+            self.assertGreater(pstats.Stats(path).total_calls, 0)
+        finally:
+            shutil.rmtree(tmp)
+
+
+class TestLoadHarness(unittest.TestCase):
+
+    def test_UT_LD_01_percentiles_and_error_rate(self):
+        """TC UT_LD_01: p50/p95/p99 theo thứ hạng gần nhất, tỉ lệ lỗi và thông lượng"""
+        samples = [(float(ms), ms != 100) for ms in range(1, 101)]
+        stats = loadtest.summarize_samples(samples, elapsed=4.0)
+        self.assertEqual((stats['p50_ms'], stats['p95_ms'], stats['p99_ms'], stats['max_ms']), (50.0, 95.0, 99.0, 100.0))
+        self.assertEqual((stats['requests'], stats['errors'], stats['error_rate'], stats['throughput_rps']), (100, 1, 0.01, 25.0))
+        self.assertIsNone(loadtest.summarize_samples([], 1.0)['p50_ms'])
+
+    def test_UT_LD_02_scenario_against_local_server(self):
+        """TC UT_LD_02: Kịch bản đăng nhập + duyệt + đặt bàn chạy được trên máy chủ cục bộ, sai mật khẩu tính là lỗi"""
+        from werkzeug.serving import make_server
+        tmp = tempfile.mkdtemp()
+        path = os.path.join(tmp, 'load.db')
+        seed_data.generate(path, restaurants=2, tables_per_restaurant=3, customers=3, reservations_per_day=2,
+                           days=2, log=None)
+        server = make_server('127.0.0.1', 0, create_app({'DB_PATH': path}), threaded=True)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        try:
+            thread.start()
+            result = loadtest.run_load(f"http://127.0.0.1:{server.server_port}", loadtest.SCENARIOS['mixed']['steps'],
+                                       users=3, iterations=2,
+                                       user_rows=[('user1', 'password123'), ('user2', 'password123'), ('user3', 'wrong')])
+        finally:
+            server.shutdown()
+            shutil.rmtree(tmp)
+        self.assertEqual(set(result['steps']), {'login', 'browse', 'detail', 'book'})
+        self.assertEqual(result['total']['requests'], 24)
+        self.assertEqual(result['steps']['login']['errors'], 2)
+        self.assertEqual(result['steps']['browse']['errors'], 0)
+        # user3 chưa đăng nhập nên không đặt được; 4 lượt đặt còn lại tranh 3 bàn cùng giờ
+        self.assertEqual(result['steps']['book']['errors'], 3)
+        self.assertEqual(json.loads(json.dumps(result))['total']['errors'], 5)
+
+    def test_UT_LD_03_rejected_bookings_count_as_errors(self):
+        """TC UT_LD_03: Đặt bàn bị từ chối (hết bàn) vẫn trả về 200 nhưng phải tính là lỗi"""
+        from werkzeug.serving import make_server
+        tmp = tempfile.mkdtemp()
+        path = os.path.join(tmp, 'load.db')
+        seed_data.generate(path, restaurants=1, tables_per_restaurant=1, customers=6, reservations_per_day=0,
+                           days=1, log=None)
+        server = make_server('127.0.0.1', 0, create_app({'DB_PATH': path}), threaded=True)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        try:
+            thread.start()
+            result = loadtest.run_load(f"http://127.0.0.1:{server.server_port}",
+                                       [loadtest.login_step(), loadtest.book_step('19:00')], users=6,
+                                       user_rows=[(f'user{i}', 'password123') for i in range(1, 7)])
+            db = sqlite3.connect(path)
+            booked = db.execute("SELECT COUNT(*) FROM Reservations").fetchone()[0]
+            db.close()
+        finally:
+            server.shutdown()
+            shutil.rmtree(tmp)
+        self.assertEqual(booked, 1)
+        self.assertEqual(result['steps']['login']['errors'], 0)
+        self.assertEqual((result['steps']['book']['requests'], result['steps']['book']['errors']), (6, 5))
+
+
+class TestBenchmarks(unittest.TestCase):
+
+    def test_UT_BM_01_benchmarks_and_regression_check(self):
+        """TC UT_BM_01: Dựng CSDL theo cỡ, đo từng hàm, phát hiện hồi quy vượt ngưỡng"""
+        tmp = tempfile.mkdtemp()
+        try:
+            result = benchmark.run_benchmarks(tmp, sizes=[10, 50], budget=0.01, log=None,
+                                              names=['find_available_table', 'assign_tables', 'dashboard_stats'])
+            db = sqlite3.connect(os.path.join(tmp, 'bench_50_42.db'))
+            self.assertEqual(db.execute("SELECT COUNT(*) FROM Reservations WHERE restaurant_id = 1 AND reservation_date = ?",
+                                        (benchmark.BENCH_DAY,)).fetchone()[0], 50)
+            db.close()
+        finally:
+            shutil.rmtree(tmp)
+        self.assertEqual(set(result['results']['assign_tables']), {'10', '50'})
+        self.assertGreaterEqual(result['results']['dashboard_stats']['50']['runs'], 5)
+
+        baseline = json.loads(json.dumps(result))
+        self.assertEqual(benchmark.regressions(baseline, result, 0.25), [])
+        baseline['results']['find_available_table']['50']['median_ms'] = 0.001
+        result['results']['find_available_table']['50']['median_ms'] = 1.0
+        self.assertEqual(benchmark.regressions(baseline, result, 0.25), [('find_available_table', '50', 0.001, 1.0)])
+        # Chậm hơn về tỉ lệ nhưng dưới MIN_DELTA_MS thì không tính
+        result['results']['find_available_table']['50']['median_ms'] = 0.01
+        self.assertEqual(benchmark.regressions(baseline, result, 0.25), [])
+
+    def test_UT_BM_02_app_database_stops_background_workers(self):
+        """TC UT_BM_02: Ra khỏi app_database thì luồng nền của app (bản chụp dashboard, ...) đã dừng và pool đã đóng"""
+        tmp = tempfile.mkdtemp()
+        try:
+            with benchmark.app_database(clone_database(tmp, 'bench.db')) as client:
+                resources = client.application.extensions['restaurant']
+                with client.application.app_context():
+                    snapshot = get_dashboard_snapshot()
+                    snapshot.get()
+                self.assertTrue(snapshot.worker.running)
+            self.assertFalse(snapshot.worker.running)
+            self.assertNotIn('pools', resources)
+            self.assertNotIn('dashboard_snapshots', resources)
+        finally:
+            shutil.rmtree(tmp)
+
+
+class TestConnectionPool(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = clone_database(self.tmp, 'pool.db', sample_data=False)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_UT_PL_01_reuse_and_rollback(self):
+        """TC UT_PL_01: Kết nối được dùng lại, giao dịch dở dang bị rollback khi trả, pool đầy thì đóng"""
+        connections = pool.ConnectionPool(self.path, size=1, profile='wal', cache_kb=4096)
+        db = connections.acquire()
+        self.assertEqual(db.execute("PRAGMA journal_mode").fetchone()[0], 'wal')
+        self.assertEqual(db.execute("PRAGMA cache_size").fetchone()[0], -4096)
+        db.execute("BEGIN IMMEDIATE")
+        db.execute("INSERT INTO Admins (adminname, password_hash, email) VALUES ('x', 'x', 'x@example.com')")
+        extra = connections.acquire()
+        connections.release(db)
+        connections.release(extra)
+        with self.assertRaises(sqlite3.ProgrammingError):
+            extra.execute("SELECT 1")
+        self.assertIs(connections.acquire(), db)
+        self.assertEqual(db.execute("SELECT COUNT(*) FROM Admins WHERE adminname = 'x'").fetchone()[0], 0)
+        self.assertEqual((connections.opened, connections.reused), (2, 1))
+        connections.release(db)
+        connections.close()
+        self.assertEqual(connections.idle, 0)
+        with self.assertRaises(ValueError):
+            pool.connect(self.path, profile='fast')
+
+    def test_UT_PL_02_fork_and_replaced_file(self):
+        """TC UT_PL_02: Sau fork không dùng/đóng kết nối của tiến trình cha; file CSDL bị thay thì mở kết nối mới"""
+        connections = pool.ConnectionPool(self.path, size=2)
+        db = connections.acquire()
+        connections.release(db)
+        os.remove(self.path)
+        init_db(self.path, sample_data=False)
+        fresh = connections.acquire()
+        self.assertIsNot(fresh, db)
+        with self.assertRaises(sqlite3.ProgrammingError):
+            db.execute("SELECT 1")
+        connections.release(fresh)
+
+        connections._pid = -1  # giả lập tiến trình con sau fork
+        child = connections.acquire()
+        self.assertIsNot(child, fresh)
+        self.assertIn(fresh, pool._inherited)
+        fresh.execute("SELECT 1")  # không bị đóng
+        pool._inherited.remove(fresh)
+        fresh.close()
+        connections.release(child)
+        connections.close()
+
+
+class TestSchemaVersion(unittest.TestCase):
+
+    def test_UT_SV_01_current_schema_skips_ddl_and_seed(self):
+        """TC UT_SV_01: CSDL đã ở SCHEMA_VERSION thì init_db/ensure_schema không chạy lại DDL và dữ liệu mẫu"""
+        tmp = tempfile.mkdtemp()
+        path = os.path.join(tmp, 'schema.db')
+        try:
+            init_db(path)
+            db = sqlite3.connect(path)
+            self.assertEqual(db.execute("PRAGMA user_version").fetchone()[0], SCHEMA_VERSION)
+            db.execute("DELETE FROM Admins")
+            db.commit()
+            with patch('restaurant_app.init_database.create_schema') as create_schema:
+                self.assertFalse(ensure_schema(db))
+                init_db(path)
+            create_schema.assert_not_called()
+            self.assertEqual(db.execute("SELECT COUNT(*) FROM Admins").fetchone()[0], 0)
+
+            db.execute("PRAGMA user_version = 0")
+            self.assertTrue(ensure_schema(db))
+            self.assertEqual(db.execute("PRAGMA user_version").fetchone()[0], SCHEMA_VERSION)
+            db.close()
+        finally:
+            shutil.rmtree(tmp)
+
+
+class TestAssetManifest(unittest.TestCase):
+
+    def test_UT_AS_01_fingerprint_follows_content(self):
+        """TC UT_AS_01: Tên có hash đổi theo nội dung file, hash cũ/sai hoặc đường dẫn ra ngoài bị từ chối"""
+        tmp = tempfile.mkdtemp()
+        try:
+            os.makedirs(os.path.join(tmp, 'css'))
+            path = os.path.join(tmp, 'css', 'site.css')
+            with open(path, 'w') as f:
+                f.write("body { color: red; }")
+            manifest = assets.AssetManifest(tmp)
+            first = manifest.fingerprinted('css/site.css')
+            self.assertRegex(first, r'^css/site\.[0-9a-f]{12}\.css$')
+            self.assertEqual(manifest.resolve(first), 'css/site.css')
+
+            with open(path, 'w') as f:
+                f.write("body { color: blue; }")
+            os.utime(path, ns=(0, 10 ** 9))
+            second = manifest.fingerprinted('css/site.css')
+            self.assertNotEqual(first, second)
+            self.assertIsNone(manifest.resolve(first))
+            self.assertIsNone(manifest.resolve('css/site.css'))
+            self.assertIsNone(manifest.fingerprinted('css/missing.css'))
+            self.assertIsNone(manifest.resolve('../site.' + second.split('.')[1] + '.css'))
+        finally:
+            shutil.rmtree(tmp)
+
+
+class TestAvailabilityFanOut(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'availability.db')
+        seed_data.generate(self.path, restaurants=4, tables_per_restaurant=3, customers=5, reservations_per_day=6,
+                           days=3, log=None)
+        self.service = availability.AvailabilityService(self.path, workers=2)
+
+    def tearDown(self):
+        self.service.close()
+        shutil.rmtree(self.tmp)
+
+    def test_UT_AV_FAN_01_matches_assign_tables(self):
+        """TC UT_AV_FAN_01: Kết quả tra cứu song song giống assign_tables chạy tuần tự"""
+        db = sqlite3.connect(self.path)
+        db.row_factory = sqlite3.Row
+        dates = [row[0] for row in db.execute("SELECT DISTINCT reservation_date FROM Reservations ORDER BY 1")]
+        lookups = [availability.Lookup(rid, date, time_, 2) for rid in range(1, 5) for date in dates
+                   for time_ in ('12:00', '19:00')]
+        result = self.service.check_many(lookups, timeout=10)
+        self.assertIs(result, lookups)
+        self.assertTrue(all(lookup.done for lookup in lookups))
+        for lookup in lookups:
+            self.assertEqual(lookup.table_ids,
+                             assignment.assign_tables(db, lookup.restaurant_id, lookup.date, lookup.time, 2))
+        db.close()
+        self.assertEqual((self.service.lookups, self.service.timeouts), (len(lookups), 0))
+        with self.assertRaises(sqlite3.OperationalError):
+            db = self.service.pool.acquire()
+            try:
+                db.execute("DELETE FROM Reservations")
+            finally:
+                self.service.pool.release(db)
+
+    def test_UT_AV_FAN_02_deadline_returns_partial_results(self):
+        """TC UT_AV_FAN_02: Hết hạn chót thì trả về kết quả dở dang và ngắt câu lệnh đang chạy"""
+        started = threading.Event()
+        release = threading.Event()
+        run = self.service._run
+
+        def slow_run(lookup):
+            if lookup.restaurant_id == 1:
+                started.set()
+                release.wait(5)
+            return run(lookup)
+
+        lookups = [availability.Lookup(rid, '2030-01-01', '19:00', 2) for rid in (1, 2, 3)]
+        with patch.object(self.service, '_run', slow_run):
+            began = time.perf_counter()
+            self.service.check_many(lookups, timeout=0.2)
+            self.assertLess(time.perf_counter() - began, 2)
+        self.assertTrue(started.is_set())
+        self.assertFalse(lookups[0].done)
+        self.assertTrue(lookups[0].cancelled)
+        self.assertEqual(self.service.timeouts, sum(not lookup.done for lookup in lookups))
+        release.set()
+        # Luồng bị giữ được trả lại, lượt đã hủy không chạy câu lệnh
+        self.assertTrue(all(l.done for l in self.service.check_many(
+            [availability.Lookup(1, '2030-01-01', '19:00', 2)], timeout=5)))
+
+
+class ListSink:
+    """Sink giả: ghi lại thông báo; fail_times lần gửi đầu ném lỗi."""
+
+    def __init__(self, fail_times=0):
+        self.sent = []
+        self.fail_times = fail_times
+
+    def send(self, message):
+        if self.fail_times:
+            self.fail_times -= 1
+            raise ConnectionError('mail server down')
+        self.sent.append(message)
+
+    def close(self):
+        pass
+
+
+class TestNotificationOutbox(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = clone_database(self.tmp)
+        self.db = sqlite3.connect(self.path)
+        self.db.row_factory = sqlite3.Row
+        self.dispatchers = []
+
+    def tearDown(self):
+        for dispatcher in self.dispatchers:
+            dispatcher.close()
+        self.db.close()
+        shutil.rmtree(self.tmp)
+
+    def dispatcher(self, sink, **kwargs):
+        dispatcher = outbox.OutboxDispatcher(self.path, sink, **kwargs)
+        self.dispatchers.append(dispatcher)
+        return dispatcher
+
+    def book(self, date='2030-01-01', time_='19:00', guests=2):
+        cur = self.db.execute("""
+            INSERT INTO Reservations (customer_id, restaurant_id, table_id, reservation_date, reservation_time, guests, status)
+            VALUES (1, 1, 4, ?, ?, ?, 'pending')
+        """, (date, time_, guests))
+        self.db.commit()
+        return cur.lastrowid
+
+    def events(self):
+        return [tuple(row) for row in self.db.execute(
+            "SELECT reservation_id, event FROM NotificationOutbox ORDER BY outbox_id")]
+
+    def test_UT_OB_01_outbox_written_in_reservation_transaction(self):
+        """TC UT_OB_01: Tạo/sửa/đổi trạng thái lượt đặt ghi outbox trong cùng giao dịch; rollback thì không có gì"""
+        self.db.execute("""
+            INSERT INTO Reservations (customer_id, restaurant_id, table_id, reservation_date, reservation_time, guests, status)
+            VALUES (1, 1, 4, '2030-01-01', '19:00', 2, 'pending')
+        """)
+        self.db.rollback()
+        self.assertEqual(self.events(), [])
+
+        res_id = self.book()
+        self.db.execute("UPDATE Reservations SET status = 'confirmed' WHERE reservation_id = ?", (res_id,))
+        self.db.execute("UPDATE Reservations SET status = 'confirmed' WHERE reservation_id = ?", (res_id,))
+        self.db.execute("UPDATE Reservations SET table_id = 5 WHERE reservation_id = ?", (res_id,))
+        self.db.execute("UPDATE Reservations SET reservation_time = '20:00', status = 'pending' WHERE reservation_id = ?",
+                        (res_id,))
+        self.db.execute("UPDATE Reservations SET status = 'cancelled' WHERE reservation_id = ?", (res_id,))
+        self.db.commit()
+        self.assertEqual(self.events(), [(res_id, 'created'), (res_id, 'confirmed'), (res_id, 'modified'),
+                                         (res_id, 'cancelled')])
+        payload = json.loads(self.db.execute(
+            "SELECT payload FROM NotificationOutbox WHERE event = 'modified'").fetchone()[0])
+        self.assertEqual((payload['restaurant'], payload['previous_time'], payload['time'], payload['status']),
+                         ('Pizza Palace', '19:00', '20:00', 'pending'))
+
+        sink = ListSink()
+        self.assertEqual(self.dispatcher(sink).deliver_pending(), 4)
+        self.assertEqual([m['event'] for m in sink.sent], ['created', 'confirmed', 'modified', 'cancelled'])
+        self.assertEqual(sink.sent[0]['to'], 'john@example.com')
+        self.assertEqual(sink.sent[1]['subject'], 'Reservation confirmed: Pizza Palace')
+        self.assertIn('from 2030-01-01 at 19:00 to 2030-01-01 at 20:00', sink.sent[2]['body'])
+        self.assertEqual(outbox.outbox_backlog(self.db)[:2], (0, 0))
+
+    def test_UT_OB_02_failed_delivery_is_retried_with_backoff(self):
+        """TC UT_OB_02: Gửi lỗi thì thử lại sau backoff; hết max_attempts thì dừng và giữ last_error"""
+        res_id = self.book()
+        sink = ListSink(fail_times=2)
+        dispatcher = self.dispatcher(sink, max_attempts=3, backoff=60)
+        self.assertEqual(dispatcher.deliver_pending(), 0)
+        row = self.db.execute("SELECT * FROM NotificationOutbox").fetchone()
+        self.assertEqual(row['attempts'], 1)
+        self.assertIn('mail server down', row['last_error'])
+        self.assertIsNone(row['delivered_at'])
+        # Chưa tới hạn thử lại
+        self.assertEqual(dispatcher.deliver_pending(), 0)
+        self.assertEqual((dispatcher.failed, outbox.outbox_backlog(self.db)[0]), (1, 1))
+
+        for expected_attempts in (2, 2):
+            self.db.execute("UPDATE NotificationOutbox SET next_attempt_at = '2000-01-01 00:00:00'")
+            self.db.commit()
+            dispatcher.deliver_pending()
+            self.assertEqual(self.db.execute("SELECT attempts FROM NotificationOutbox").fetchone()[0],
+                             expected_attempts)
+        self.assertEqual([m['reservation_id'] for m in sink.sent], [res_id])
+        self.assertEqual(dispatcher.delivered, 1)
+
+        self.book(time_='12:00')
+        sink.fail_times = 3
+        for _ in range(3):
+            self.db.execute("UPDATE NotificationOutbox SET next_attempt_at = '2000-01-01 00:00:00'")
+            self.db.commit()
+            dispatcher.deliver_pending()
+        pending, gave_up, _age = outbox.outbox_backlog(self.db, max_attempts=3)
+        self.assertEqual((pending, gave_up), (0, 1))
+        self.db.execute("UPDATE NotificationOutbox SET next_attempt_at = '2000-01-01 00:00:00'")
+        self.db.commit()
+        self.assertEqual(dispatcher.deliver_pending(), 0)
+        self.assertEqual(len(sink.sent), 1)
+
+    def test_UT_OB_03_at_least_once_after_crash(self):
+        """TC UT_OB_03: Worker chết sau khi nhận lô thì lease hết hạn và thông báo được gửi lại"""
+        self.book()
+        crashed = self.dispatcher(ListSink())
+        db = crashed.pool.acquire()
+        claimed = crashed.claim(db)
+        crashed.pool.release(db)
+        self.assertEqual(len(claimed), 1)
+
+        sink = ListSink()
+        dispatcher = self.dispatcher(sink)
+        self.assertEqual(dispatcher.deliver_pending(), 0)
+        self.db.execute("UPDATE NotificationOutbox SET locked_until = '2000-01-01 00:00:00'")
+        self.db.commit()
+        self.assertEqual(dispatcher.deliver_pending(), 1)
+        self.assertEqual(sink.sent[0]['id'], claimed[0]['outbox_id'])
+
+        # Khách đã bị xóa: đóng dòng mà không gửi
+        self.book(time_='12:00')
+        self.db.execute("UPDATE Customers SET deleted_at = DATETIME('now') WHERE customer_id = 1")
+        self.db.commit()
+        self.assertEqual(dispatcher.deliver_pending(), 1)
+        self.assertEqual(len(sink.sent), 1)
+        self.assertEqual(self.db.execute("SELECT last_error FROM NotificationOutbox ORDER BY outbox_id DESC").fetchone()[0],
+                         'customer deleted')
+
+    def test_UT_OB_04_worker_pool_delivers_each_row_once(self):
+        """TC UT_OB_04: Nhiều luồng gửi cùng lúc, mỗi thông báo chỉ được gửi một lần"""
+        for hour in range(11, 21):
+            for minute in ('00', '30'):
+                self.book(time_=f"{hour}:{minute}")
+        sink = ListSink()
+        dispatcher = self.dispatcher(sink, workers=3, interval=60, batch_size=4)
+        dispatcher.wake()
+        deadline = time.time() + 5
+        while len(sink.sent) < 20 and time.time() < deadline:
+            time.sleep(0.02)
+        self.assertEqual(sorted(m['id'] for m in sink.sent), list(range(1, 21)))
+        time.sleep(0.1)
+        self.assertEqual(len(sink.sent), 20)
+        self.assertEqual(dispatcher.backlog()[:2], (0, 0))
+
+    def test_UT_OB_05_smtp_sink(self):
+        """TC UT_OB_05: SmtpSink gửi email tới máy chủ SMTP (stub) với Message-ID theo outbox_id"""
+        server = StubSMTPServer()
+        try:
+            self.book()
+            sink = outbox.SmtpSink('127.0.0.1', server.port, sender='reservations@reso.test')
+            self.assertEqual(self.dispatcher(sink).deliver_pending(), 1)
+            sender, recipients, email = server.messages[0]
+            self.assertEqual((sender, recipients), ('reservations@reso.test', ['john@example.com']))
+            self.assertEqual(email['Subject'], 'Reservation received: Pizza Palace')
+            self.assertEqual(email['Message-ID'], '<outbox-1@reso.test>')
+            self.assertIn('is pending', email.get_payload())
+            sink.close()
+        finally:
+            server.close()
+        # Máy chủ ngừng: lần gửi lỗi được hẹn thử lại
+        self.book(time_='12:00')
+        dispatcher = self.dispatchers[0]
+        self.assertEqual(dispatcher.deliver_pending(), 0)
+        self.assertEqual(dispatcher.failed, 1)
+
+
+
+class TestCliDatabasePath(unittest.TestCase):
+    """
+    Các công cụ dòng lệnh (cron) dùng RESTAURANT_DB_PATH như app.py khi không có --db
+    Tương ứng với các TC ID: UT_CLI_01
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db_path = clone_database(self.tmpdir, 'prod.db')
+        self.cwd = os.path.join(self.tmpdir, 'cwd')
+        os.mkdir(self.cwd)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _run(self, module, *args):
+        env = dict(os.environ, RESTAURANT_DB_PATH=self.db_path,
+                   PYTHONPATH=os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+        return subprocess.run([sys.executable, '-m', f'restaurant_app.{module}', *args], cwd=self.cwd, env=env,
+                              capture_output=True, text=True, timeout=60)
+
+    def test_UT_CLI_01_maintenance_clis_default_to_env_db_path(self):
+        """TC UT_CLI_01: stats/analytics/sweeper/outbox chạy trên RESTAURANT_DB_PATH, không tạo file CSDL trong thư mục hiện tại"""
+        for module, args, expected in [('stats', (), 'Statistics are consistent.'),
+                                       ('analytics', ('--refresh',), 'Pending source rows: 0'),
+                                       ('sweeper', (), 'Swept 0 reservations'),
+                                       ('outbox', ('status',), 'pending=0')]:
+            with self.subTest(module=module):
+                result = self._run(module, *args)
+                self.assertEqual(result.returncode, 0, result.stderr)
+                self.assertIn(expected, result.stdout)
+        self.assertEqual(os.listdir(self.cwd), [])
+
+
 if __name__ == '__main__':
     unittest.main(verbosity=2)
\ No newline at end of file